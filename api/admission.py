@@ -0,0 +1,124 @@
+import math
+import time
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.core import signing
+from django.db import connection, transaction, IntegrityError
+from django.db.models import F, Q
+from django.utils import timezone
+
+from api.models import AdmissionQueue, AdmissionTokenUse
+
+
+TOKEN_SALT = 'api.admission'
+
+
+class AdmissionError(Exception):
+    pass
+
+class InvalidToken(AdmissionError):
+    pass
+
+class NotAdmitted(AdmissionError):
+    def __init__(self, status):
+        super().__init__(status)
+        self.status = status
+
+
+def join(pk):
+    """ Function which queues client for reservation of given ticket kind.
+    Returns signed token holding client's position along with queue status. """
+    AdmissionQueue.objects.get_or_create(ticket_info_id=pk)
+    with transaction.atomic():
+        AdmissionQueue.objects.filter(pk=pk).update(tail=F('tail') + 1)
+        position = AdmissionQueue.objects.values_list('tail', flat=True).get(pk=pk)
+    token = signing.dumps({'ticket_info': int(pk), 'position': position}, salt=TOKEN_SALT)
+    return token, get_status(pk, position)
+
+
+def get_status(pk, position):
+    """ Function which returns number of clients ahead of given position in queue
+    of ticket kind, whether it is admitted and estimated seconds of waiting. """
+    ahead = max(position - _advance(pk), 0)
+    return {
+        "position": position,
+        "ahead": ahead,
+        "admitted": ahead == 0,
+        "eta": math.ceil(ahead / settings.ADMISSION_RATE),
+    }
+
+
+def read_token(token):
+    """ Function which returns ticket kind primary key and position held by token.
+    Raises InvalidToken for malformed, forged or expired tokens. """
+    try:
+        data = signing.loads(token, salt=TOKEN_SALT, max_age=settings.ADMISSION_TOKEN_TTL)
+        return data['ticket_info'], data['position']
+    except (signing.BadSignature, KeyError, TypeError):
+        raise InvalidToken()
+
+
+def admit(tokens, ticket_info_ids):
+    """ Function which checks given tokens admit reserving every given ticket kind
+    and uses them up, returning their uses. Raises InvalidToken when token of
+    some kind is missing, invalid or already used, NotAdmitted with queue status
+    when its holder has to keep waiting. """
+    positions = dict(read_token(token) for token in tokens)
+    for pk in ticket_info_ids:
+        if pk not in positions:
+            raise InvalidToken()
+        status = get_status(pk, positions[pk])
+        if not status["admitted"]:
+            raise NotAdmitted(status)
+
+    uses = [AdmissionTokenUse(ticket_info_id=pk, position=positions[pk]) for pk in ticket_info_ids]
+    try:
+        # Tokens of other kinds stay usable when one was already used.
+        with transaction.atomic():
+            AdmissionTokenUse.objects.bulk_create(uses)
+    except IntegrityError:
+        raise InvalidToken()
+    return uses
+
+
+def restore(uses):
+    """ Function which makes tokens used up by admit usable again, e.g. when
+    their reservation failed. """
+    if uses:
+        AdmissionTokenUse.objects.filter(reduce(or_, (
+            Q(ticket_info_id=use.ticket_info_id, position=use.position) for use in uses
+        ))).delete()
+
+
+def delete_expired_uses():
+    """ Function which deletes uses of tokens already expired, which can't be
+    used again anyway, and returns their number. """
+    expire_time = timezone.now() - timezone.timedelta(seconds=settings.ADMISSION_TOKEN_TTL)
+    deleted, _ = AdmissionTokenUse.objects.filter(create_time__lt=expire_time).delete()
+    return deleted
+
+
+def _advance(pk):
+    """ Function which admits clients queued for ticket kind in order, ADMISSION_RATE
+    per second, and returns position of the last admitted one. Admissions are
+    saved up for at most a second while queue is empty, so spike after quiet
+    period is admitted at the same rate. Where database supports it, only one
+    caller advances the queue at a time, others read its last state. """
+    queues = AdmissionQueue.objects.filter(pk=pk)
+    with transaction.atomic():
+        if connection.features.has_select_for_update_skip_locked:
+            queue = queues.select_for_update(skip_locked=True).first()
+        else:
+            queue = queues.first()
+        if queue is None:
+            return queues.values_list('head', flat=True).first() or 0
+        now = time.time()
+        head_time = max(queue.head_time, now - 1)
+        admitted = min(int((now - head_time) * settings.ADMISSION_RATE), queue.tail - queue.head)
+        if admitted > 0:
+            queue.head, head_time = queue.head + admitted, head_time + admitted / settings.ADMISSION_RATE
+        queue.head_time = head_time
+        queue.save(update_fields=['head', 'head_time'])
+        return queue.head
@@ -0,0 +1,355 @@
+import atexit
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import ExitStack
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connection, transaction, DatabaseError, IntegrityError
+from django.db.models import Q
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from api.models import TicketInfo, Ticket, Reservation, TicketInfoStats, ProcessLease, get_reservation_stats
+from api.reservations import reserve_tickets, get_expire_time, get_free_tickets, NoTicketsAvailable
+from api.tasks import schedule_reservations_release
+
+
+logger = logging.getLogger(__name__)
+
+LEASE_NAME = 'reservation_allocator'
+
+
+class AllocatorUnavailable(Exception):
+    """ Raised when inventory of ticket kind is owned by allocator of other process. """
+
+
+def acquire_lease(name, owner, ttl):
+    """ Function which makes 'owner' holder of lease of given name for 'ttl'
+    seconds, unless other owner holds it, and returns whether it succeeded. """
+    now = timezone.now()
+    expire_time = now + timezone.timedelta(seconds=ttl)
+    leases = ProcessLease.objects.filter(Q(owner=owner) | Q(expire_time__lte=now), name=name)
+    if leases.update(owner=owner, expire_time=expire_time):
+        return True
+    try:
+        with transaction.atomic():
+            ProcessLease.objects.create(name=name, owner=owner, expire_time=expire_time)
+        return True
+    except IntegrityError:
+        return False
+
+
+class Shard:
+    """ Free tickets pool of single ticket kind along with its reservations
+    waiting for flush. Lock makes every shard single writer. Stale shard
+    reloads its ticket kind before next reservation. Lease of the kind is
+    trusted until monotonic 'lease_deadline'. """
+    def __init__(self, ticket_info):
+        self.ticket_info = ticket_info
+        self.lock = threading.Lock()
+        self.free = deque()
+        self.pending = []
+        self.in_flight = set()
+        self.stale = False
+        self.lease_deadline = 0
+
+    @property
+    def lease_name(self):
+        return f'{LEASE_NAME}:{self.ticket_info.pk}'
+
+
+class Allocator:
+    """ Allocator reserving tickets from in-memory pools and persisting reservations
+    in batches, every 'flush_interval' seconds or once 'flush_size' of them wait.
+    Pools are loaded from database on first use, so after crash they are rebuilt
+    from persisted reservations, while reservations not flushed yet are lost and
+    their tickets get free again. Allocator has to be the only one reserving
+    tickets of its kinds. Given 'lease_ttl', it takes lease of every kind on its
+    first use, renews it every third of TTL and refuses to reserve the kind once
+    lease is lost, so allocators of other processes raise AllocatorUnavailable
+    instead of handing out the same tickets, while kinds are spread over processes.
+    Counter inventory is reserved in database. """
+
+    def __init__(self, flush_interval=None, flush_size=500, refill_size=10000, lease_ttl=None):
+        self.flush_size = flush_size
+        self.refill_size = refill_size
+        self.shards = {}
+        self._shards_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = threading.Event()
+        self._flusher = None
+        self.lease_ttl = lease_ttl
+        self.key = uuid.uuid4().hex[:8]
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{self.key}"
+        self._lease_lock = threading.Lock()
+        if flush_interval is not None:
+            self._flusher = threading.Thread(target=self._run_flusher, args=(flush_interval,), daemon=True)
+            self._flusher.start()
+
+    def reserve(self, ticket_info_id):
+        """ Function which reserves free ticket of given kind and returns its
+        reservation, persisted by following flush. Raises TicketInfo.DoesNotExist
+        for not existing kind and NoTicketsAvailable when it is sold out. """
+        return self.reserve_many({ticket_info_id: 1})[0]
+
+    def reserve_many(self, quantities):
+        """ Function which reserves given numbers of free tickets of ticket kinds,
+        passed as dictionary mapping TicketInfo primary keys to quantities, all
+        or none of them, and returns their reservations. """
+        shards = [self._get_shard(pk) for pk in sorted(quantities)]
+        for shard in shards:
+            self._check_lease(shard)
+        with ExitStack() as stack:
+            # Shards are locked in primary key order, so concurrent calls never deadlock.
+            for shard in shards:
+                stack.enter_context(shard.lock)
+                if shard.stale:
+                    shard.ticket_info = TicketInfo.objects.select_related('event').get(pk=shard.ticket_info.pk)
+                    shard.stale = False
+            counter = {}
+            for shard in shards:
+                quantity = quantities[shard.ticket_info.pk]
+                if shard.ticket_info.inventory_mode == TicketInfo.InventoryMode.COUNTER:
+                    counter[shard.ticket_info] = quantity
+                    continue
+                if len(shard.free) < quantity:
+                    self._refill(shard, quantity)
+                if len(shard.free) < quantity:
+                    raise NoTicketsAvailable(f"No available tickets of kind '{shard.ticket_info.kind}'")
+
+            reservations = reserve_tickets(counter) if counter else []
+            create_time = timezone.now()
+            is_full = False
+            for shard in shards:
+                if shard.ticket_info in counter:
+                    continue
+                for _ in range(quantities[shard.ticket_info.pk]):
+                    reservation = Reservation(
+                        ticket_id=shard.free.popleft(),
+                        ticket_info=shard.ticket_info,
+                        create_time=create_time,
+                        expire_time=get_expire_time(create_time),
+                        token=f'{shard.ticket_info.pk}-{self.key}-{uuid.uuid4().hex}',
+                    )
+                    shard.pending.append(reservation)
+                    reservations.append(reservation)
+                is_full = is_full or len(shard.pending) >= self.flush_size
+        if is_full:
+            self._wake.set()
+        return reservations
+
+    def flush(self):
+        """ Function which persists reservations waiting in all shards and returns
+        number of persisted ones. Batches failing on database errors are kept
+        for next flush. """
+        with self._flush_lock:
+            batches = []
+            for shard in list(self.shards.values()):
+                with shard.lock:
+                    if shard.pending:
+                        batches.append((shard, shard.pending))
+                        shard.in_flight.update(reservation.ticket_id for reservation in shard.pending)
+                        shard.pending = []
+
+            persisted = 0
+            for shard, reservations in batches:
+                try:
+                    persisted += self._persist(shard, reservations)
+                except DatabaseError:
+                    logger.exception("Unable to persist %d reservations of %r", len(reservations), shard.ticket_info)
+                    with shard.lock:
+                        shard.pending[:0] = reservations
+                finally:
+                    with shard.lock:
+                        shard.in_flight.difference_update(reservation.ticket_id for reservation in reservations)
+            return persisted
+
+    def invalidate(self, ticket_info_id):
+        """ Function which empties pool of given ticket kind and reloads the kind
+        before next reservation, e.g. after its quantity or inventory mode changed.
+        Reservations waiting for flush are kept. """
+        shard = self.shards.get(ticket_info_id)
+        if shard is not None:
+            with shard.lock:
+                shard.free.clear()
+                shard.stale = True
+
+    def close(self):
+        """ Function which stops flushing thread, persists remaining reservations
+        and gives up leases. Closing again does nothing. """
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        self._wake.set()
+        if self._flusher is not None:
+            self._flusher.join()
+        self.flush()
+        if self.lease_ttl is not None:
+            try:
+                ProcessLease.objects.filter(name__startswith=f'{LEASE_NAME}:', owner=self.owner).delete()
+            except DatabaseError:
+                # Leases expire by themselves.
+                logger.exception("Giving up leases of allocator failed")
+
+    def _check_lease(self, shard):
+        """ Function which raises AllocatorUnavailable unless lease of shard's kind is held. """
+        if self.lease_ttl is not None and time.monotonic() >= shard.lease_deadline:
+            self._renew_lease(shard)
+
+    def _renew_lease(self, shard):
+        """ Function which renews lease of shard's kind, raising AllocatorUnavailable
+        when it is held by other process. Lease is trusted for half of its TTL, so it
+        is never used after other process may have taken it over. Pool of lost or
+        lapsed lease is emptied, as other process may have reserved its tickets. """
+        with self._lease_lock:
+            start = time.monotonic()
+            lapsed = shard.lease_deadline and start >= shard.lease_deadline + self.lease_ttl / 2
+            if not acquire_lease(shard.lease_name, self.owner, self.lease_ttl):
+                if shard.lease_deadline:
+                    shard.lease_deadline = 0
+                    self.invalidate(shard.ticket_info.pk)
+                raise AllocatorUnavailable(f"Reservations of ticket kind '{shard.ticket_info.kind}' "
+                                           f"are served by allocator of other process")
+            if lapsed:
+                self.invalidate(shard.ticket_info.pk)
+            shard.lease_deadline = start + self.lease_ttl / 2
+
+    def _get_shard(self, ticket_info_id):
+        """ Function which returns shard of given ticket kind, loading it and
+        taking lease of the kind on first use. """
+        shard = self.shards.get(ticket_info_id)
+        if shard is None:
+            with self._shards_lock:
+                shard = self.shards.get(ticket_info_id)
+                if shard is None:
+                    shard = Shard(TicketInfo.objects.select_related('event').get(pk=ticket_info_id))
+                    if self.lease_ttl is not None:
+                        self._renew_lease(shard)
+                    self.shards[ticket_info_id] = shard
+        return shard
+
+    def _refill(self, shard, needed=1):
+        """ Function which loads next free tickets of shard's kind from database, at
+        least 'needed' of them when available, skipping ones already in pool or of
+        reservations not persisted yet. Must hold shard lock. """
+        taken = shard.in_flight.union((reservation.ticket_id for reservation in shard.pending), shard.free)
+        limit = max(self.refill_size, needed - len(shard.free)) + len(taken)
+        ticket_ids = get_free_tickets(shard.ticket_info).values_list('pk', flat=True)[:limit]
+        shard.free.extend(ticket_id for ticket_id in ticket_ids if ticket_id not in taken)
+
+    def _persist(self, shard, reservations):
+        """ Function which inserts reservations of single shard in one transaction,
+        updating available tickets counter and statistics of its kind, and returns
+        number of persisted ones. Reservations whose tickets were reserved elsewhere
+        or deleted are inserted released, so their tokens tell clients they failed.
+        Shard is invalidated when its kind changed since it was loaded. """
+        ticket_info_id = shard.ticket_info.pk
+        with transaction.atomic():
+            # Locking the row holds off provisioning, which deletes free tickets.
+            current = TicketInfo.objects.select_for_update().filter(pk=ticket_info_id).values('quantity', 'inventory_mode').first()
+            if current != {'quantity': shard.ticket_info.quantity, 'inventory_mode': shard.ticket_info.inventory_mode}:
+                self.invalidate(ticket_info_id)
+            if current is None:
+                logger.warning("Dropped %d reservations of %r, their ticket kind was deleted",
+                               len(reservations), shard.ticket_info)
+                return 0
+
+            ticket_ids = [reservation.ticket_id for reservation in reservations]
+            claimed = set(Reservation.objects.filter(ticket_id__in=ticket_ids).values_list('ticket_id', flat=True))
+            if claimed:
+                logger.warning("Dropped %d reservations of %r, their tickets were reserved by other process",
+                               len(claimed), shard.ticket_info)
+            existing = set(Ticket.objects.filter(pk__in=ticket_ids).values_list('pk', flat=True))
+            if len(existing) < len(ticket_ids):
+                logger.warning("Dropped %d reservations of %r, their tickets were deleted",
+                               len(ticket_ids) - len(existing), shard.ticket_info)
+            dropped = [
+                reservation for reservation in reservations
+                if reservation.ticket_id not in existing or reservation.ticket_id in claimed
+            ]
+            for reservation in dropped:
+                reservation.ticket_id = None
+            reservations = [reservation for reservation in reservations if reservation.ticket_id is not None]
+            Reservation.objects.bulk_create(reservations + dropped)
+            TicketInfo.objects.change_available({ticket_info_id: -len(reservations)})
+            valid = get_reservation_stats(is_valid=True, is_paid=False, price=0, count=len(reservations))
+            invalid = get_reservation_stats(is_valid=False, is_paid=False, price=0, count=len(dropped))
+            TicketInfoStats.objects.change({ticket_info_id: {field: valid[field] + invalid[field] for field in valid}})
+            if settings.RESERVATION_EXPIRY_MODE == 'eta':
+                persisted = list(Reservation.objects.filter(ticket_id__in=[reservation.ticket_id for reservation in reservations]))
+                transaction.on_commit(lambda: schedule_reservations_release(persisted))
+        return len(reservations)
+
+    def _run_flusher(self, flush_interval):
+        """ Function run by flushing thread until allocator is closed,
+        renewing leases of held kinds along with flushes. """
+        try:
+            while not self._closed.is_set():
+                self._wake.wait(flush_interval)
+                self._wake.clear()
+                try:
+                    self.flush()
+                except Exception:
+                    logger.exception("Flushing reservations failed")
+                if self.lease_ttl is not None:
+                    self._renew_leases()
+        finally:
+            connection.close()
+
+    def _renew_leases(self):
+        """ Function which renews held leases due in a third of TTL. Kinds whose
+        lease was lost are left, until their next reservation tries to take it. """
+        for shard in list(self.shards.values()):
+            if not shard.lease_deadline or time.monotonic() < shard.lease_deadline - self.lease_ttl / 3:
+                continue
+            try:
+                self._renew_lease(shard)
+            except AllocatorUnavailable:
+                logger.error("Lease of %r was taken over by other process", shard.ticket_info)
+            except DatabaseError:
+                logger.exception("Renewing lease of %r failed", shard.ticket_info)
+
+
+def is_pending(token):
+    """ Function which returns whether reservation handed out with given token
+    may still be persisted, i.e. lease of its ticket kind is held by allocator
+    which handed it out. Reservations of allocator which lost it are lost. """
+    ticket_info_id, _, rest = token.partition('-')
+    key = rest.partition('-')[0]
+    if not ticket_info_id.isdigit() or not key:
+        return False
+    return ProcessLease.objects.filter(
+        name=f'{LEASE_NAME}:{ticket_info_id}', owner__endswith=f':{key}', expire_time__gt=timezone.now()
+    ).exists()
+
+
+@receiver(post_save, sender=TicketInfo)
+@receiver(post_delete, sender=TicketInfo)
+def invalidate_ticket_info(sender, instance, **kwargs):
+    """ Receiver which invalidates pool of changed or deleted ticket kind,
+    when allocator of the process is running. Changes made by other
+    processes are noticed by its next flush. """
+    if get_allocator.cache_info().currsize:
+        get_allocator().invalidate(instance.pk)
+
+
+@lru_cache(maxsize=None)
+def get_allocator():
+    """ Function which returns allocator shared by whole process. Remaining
+    reservations are flushed when process exits gracefully. """
+    allocator = Allocator(
+        flush_interval=settings.ALLOCATOR_FLUSH_INTERVAL,
+        flush_size=settings.ALLOCATOR_FLUSH_SIZE,
+        refill_size=settings.ALLOCATOR_REFILL_SIZE,
+        lease_ttl=settings.ALLOCATOR_LEASE_TTL,
+    )
+    atexit.register(allocator.close)
+    return allocator
@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class ApiConfig(AppConfig):
     name = 'api'
+
+    def ready(self):
+        # Connect signal receivers.
+        from api import allocator, cache, database, http_cache, stats  # noqa
@@ -0,0 +1,49 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+
+from api.views import EventViewSet, TicketInfoViewSet, ReservationViewSet
+
+
+# Under ASGI Django runs synchronous views one at a time on a single thread,
+# views below are run concurrently by this pool, bounding database connections.
+executor = ThreadPoolExecutor(max_workers=settings.ASYNC_VIEWS_THREADS, thread_name_prefix='async-views')
+
+
+def run_view(view, request, kwargs):
+    """ Function which runs synchronous view and renders its response,
+    managing database connection as request signals would. Queries are
+    measured by request's metrics, as they run on connection of this thread. """
+    close_old_connections()
+    try:
+        with ExitStack() as stack:
+            if hasattr(request, 'measurements'):
+                stack.enter_context(connection.execute_wrapper(request.measurements))
+            response = view(request, **kwargs)
+            if hasattr(response, 'render'):
+                response.render()
+        return response
+    finally:
+        close_old_connections()
+
+
+def async_view(view):
+    """ Function which returns async variant of synchronous view, run in bounded thread pool. """
+    async def wrapper(request, **kwargs):
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(executor, run_view, view, request, kwargs)
+
+    # DRF views enforce CSRF checks on their own.
+    wrapper.csrf_exempt = True
+    return wrapper
+
+
+# Options of actions, e.g. their throttles, are passed along as router does.
+event_summary = async_view(EventViewSet.as_view({'get': 'summary'}, **EventViewSet.summary.kwargs))
+event_bulk_summary = async_view(EventViewSet.as_view({'get': 'bulk_summary'}, **EventViewSet.bulk_summary.kwargs))
+ticket_info_summary = async_view(TicketInfoViewSet.as_view({'get': 'summary'}, **TicketInfoViewSet.summary.kwargs))
+ticket_info_reserve = async_view(TicketInfoViewSet.as_view({'get': 'reserve'}, **TicketInfoViewSet.reserve.kwargs))
+reservation_pay = async_view(ReservationViewSet.as_view({'post': 'pay'}, **ReservationViewSet.pay.kwargs))
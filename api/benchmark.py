@@ -0,0 +1,88 @@
+import json
+import os
+import random
+import tempfile
+from contextlib import contextmanager, ExitStack
+
+from django.db import connection
+from django.utils import timezone
+
+from api import stats
+from api.models import Event, TicketInfo, Reservation
+
+
+@contextmanager
+def scratch_database():
+    """ Context manager which runs benchmark against freshly created test
+    database, so development data is never touched. SQLite test database
+    is kept in file, as in-memory one fails concurrent writes at once
+    instead of waiting for lock. """
+    test_settings = connection.settings_dict['TEST']
+    with ExitStack() as stack:
+        if connection.vendor == 'sqlite' and not test_settings['NAME']:
+            directory = stack.enter_context(tempfile.TemporaryDirectory())
+            test_settings['NAME'] = os.path.join(directory, 'benchmark.sqlite3')
+            stack.callback(test_settings.__setitem__, 'NAME', None)
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            yield
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+def seed_data(events, kinds, tickets, reserved=0.6, paid=0.7, released=0.3):
+    """ Function which creates events with ticket kinds, 'reserved' fraction of
+    their tickets reserved within last hour, 'paid' fraction of reservations
+    paid and 'released' fraction of them repeated by released ones. """
+    now = timezone.now()
+    for number in range(events):
+        event = Event.objects.create(name=f'Benchmark {number}', date=now)
+        for kind in range(kinds):
+            ticket_info = TicketInfo.objects.create(kind=f'Kind {kind}', price=10, quantity=tickets, event=event)
+            reservations = []
+            for ticket_id in ticket_info.tickets.order_by('pk').values_list('pk', flat=True)[:int(tickets * reserved)]:
+                create_time = now - timezone.timedelta(minutes=random.uniform(0, 60))
+                reservations.append(Reservation(
+                    ticket_id=ticket_id, ticket_info=ticket_info, is_paid=random.random() < paid,
+                    create_time=create_time, expire_time=create_time + timezone.timedelta(minutes=15),
+                ))
+                if random.random() < released:
+                    reservations.append(Reservation(ticket_info=ticket_info, create_time=create_time, expire_time=create_time))
+            Reservation.objects.bulk_create(reservations, batch_size=5000)
+            TicketInfo.objects.change_available({ticket_info.pk: -int(tickets * reserved)})
+    stats.rebuild()
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+
+
+def summarize(samples):
+    """ Function which returns count, mean, percentiles and maximum
+    of given samples, expressed in milliseconds. """
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+    def percentile(point):
+        return ordered[min(len(ordered) - 1, int(len(ordered) * point / 100))]
+    return {
+        "count": len(ordered),
+        "mean": round(sum(ordered) / len(ordered) * 1000, 3),
+        "p50": round(percentile(50) * 1000, 3),
+        "p95": round(percentile(95) * 1000, 3),
+        "p99": round(percentile(99) * 1000, 3),
+        "max": round(ordered[-1] * 1000, 3),
+    }
+
+
+def add_output_argument(parser):
+    """ Function which adds option choosing file of benchmark report. """
+    parser.add_argument('--output', help="Write JSON report to file instead of standard output.")
+
+
+def write_report(command, report, output=None):
+    """ Function which writes benchmark report as JSON. """
+    data = json.dumps(report, indent=2)
+    if output:
+        with open(output, 'w') as report_file:
+            report_file.write(data)
+    else:
+        command.stdout.write(data)
@@ -0,0 +1,98 @@
+import time
+from hashlib import md5
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from api.models import Event, TicketInfo
+from api.signals import inventory_changed
+
+
+VERSION_KEY = 'availability:version'
+LIST_KEY = 'availability:list:{version}:{digest}'
+LEFT_KEY = 'availability:left:{pk}'
+STATS_KEY = 'availability:stats:{name}'
+
+
+def get_cache():
+    """ Function which returns cache backend configured for availability. """
+    return caches[settings.AVAILABILITY_CACHE]
+
+
+def get_available_list(url, render):
+    """ Function which returns cached available tickets listing of given URL,
+    rendering it with 'render' function on miss. Listings are keyed with
+    version bumped on every inventory change, so all of them get invalid at once.
+    Evicted version restarts from current time, never reaching earlier versions. """
+    cache = get_cache()
+    version = cache.get_or_set(VERSION_KEY, time.time_ns, None)
+    key = LIST_KEY.format(version=version, digest=md5(url.encode()).hexdigest())
+    data = cache.get(key)
+    if data is None:
+        _count('misses')
+        data = render()
+        cache.set(key, data, settings.AVAILABILITY_CACHE_TTL)
+    else:
+        _count('hits')
+    return data
+
+
+def get_left(pk):
+    """ Function which returns cached number of tickets left of given kind.
+    Raises TicketInfo.DoesNotExist for not existing kind. """
+    cache = get_cache()
+    key = LEFT_KEY.format(pk=pk)
+    left = cache.get(key)
+    if left is None:
+        _count('misses')
+        left = TicketInfo.objects.values_list('available', flat=True).get(pk=pk)
+        cache.set(key, left, settings.AVAILABILITY_CACHE_TTL)
+    else:
+        _count('hits')
+    return left
+
+
+def invalidate(ticket_info_ids=()):
+    """ Function which invalidates all available tickets listings and
+    numbers of tickets left of given kinds. """
+    cache = get_cache()
+    _increase(cache, VERSION_KEY, time.time_ns())
+    cache.delete_many([LEFT_KEY.format(pk=pk) for pk in ticket_info_ids])
+
+
+def get_stats():
+    """ Function which returns numbers of availability cache hits and misses. """
+    stats = get_cache().get_many([STATS_KEY.format(name=name) for name in ('hits', 'misses')])
+    return {name: stats.get(STATS_KEY.format(name=name), 0) for name in ('hits', 'misses')}
+
+
+def _count(name):
+    """ Function which increases cache statistics counter. """
+    _increase(get_cache(), STATS_KEY.format(name=name))
+
+
+def _increase(cache, key, initial=1):
+    """ Function which atomically increases integer stored in cache,
+    storing 'initial' when it is missing. """
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, initial, None)
+
+
+@receiver(inventory_changed)
+def invalidate_changed_inventory(sender, ticket_info_ids, **kwargs):
+    invalidate(ticket_info_ids)
+
+
+@receiver(post_save, sender=TicketInfo)
+@receiver(post_delete, sender=TicketInfo)
+def invalidate_ticket_info(sender, instance, **kwargs):
+    invalidate([instance.pk])
+
+
+@receiver(post_save, sender=Event)
+def invalidate_event(sender, instance, **kwargs):
+    invalidate()
@@ -0,0 +1,73 @@
+from hashlib import md5
+
+from django.db.models import Count, Max, Sum
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+from api.models import Event, TicketInfo
+
+
+class ConditionalGetMixin:
+    """ Viewset mixin adding ETag and Last-Modified headers, computed from versions
+    of listed objects, to list and retrieve responses. Requests of clients holding
+    current copy are answered with 304 Not Modified before objects are loaded
+    and serialized. 'cache_control' directives are added to responses. """
+    cache_control = {}
+
+    def list(self, request, *args, **kwargs):
+        validators = self.filter_queryset(self.get_queryset()).order_by().aggregate(
+            count=Count('pk'), version=Sum('version'), modified_time=Max('modified_time')
+        )
+        return self.get_conditional_response(request, validators, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            validators = self.get_queryset().model.objects.filter(pk=kwargs.get('pk')).values('version', 'modified_time').first()
+        except ValueError:
+            validators = None
+        if validators is None:
+            return super().retrieve(request, *args, **kwargs)
+        return self.get_conditional_response(request, validators, super().retrieve, *args, **kwargs)
+
+    def get_conditional_response(self, request, validators, render, *args, **kwargs):
+        """ Function which returns 304 response when request's conditional headers
+        match given validators, otherwise response rendered by 'render'. """
+        digest = md5(f"{request.get_full_path()}:{sorted(validators.items())}".encode()).hexdigest()
+        etag = quote_etag(digest)
+        modified_time = validators['modified_time']
+        last_modified = int(modified_time.timestamp()) if modified_time else None
+
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = render(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(last_modified)
+            patch_cache_control(response, **self.cache_control)
+        return response
+
+
+@receiver(post_save, sender=TicketInfo)
+def touch_event_of_saved_ticket_info(sender, instance, created, raw=False, **kwargs):
+    listing = instance.get_listing()
+    previous = getattr(instance, '_stored_listing', None)
+    if not raw and listing != previous:
+        event_ids = {listing[1], previous[1]} if previous else {listing[1]}
+        Event.objects.filter(pk__in=event_ids).touch()
+    instance._stored_listing = listing
+
+
+@receiver(post_delete, sender=TicketInfo)
+def touch_event_of_deleted_ticket_info(sender, instance, **kwargs):
+    Event.objects.filter(pk=instance.event_id).touch()
+
+
+@receiver(post_save, sender=Event)
+def touch_ticket_infos_of_renamed_event(sender, instance, created, raw=False, **kwargs):
+    # Ticket kinds are listed along with name of their event.
+    if not created and not raw and instance.name != getattr(instance, '_stored_name', None):
+        TicketInfo.objects.filter(event=instance).touch()
+    instance._stored_name = instance.name
@@ -0,0 +1,103 @@
+import hashlib
+import json
+from functools import wraps
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction, IntegrityError
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from api.models import IdempotencyKey
+
+
+HEADER = 'Idempotency-Key'
+
+# Responses asking client to try again are not replayed.
+RETRYABLE_STATUS_CODES = (status.HTTP_409_CONFLICT, status.HTTP_429_TOO_MANY_REQUESTS)
+
+REPLAYED_HEADERS = ('Location',)
+
+
+def idempotent(view):
+    """ Decorator of viewset actions, which stores response of request sent with
+    'Idempotency-Key' header and returns it to requests repeating the key,
+    without running the action again. Requests without the header run as usual.
+    Response of request taken over as abandoned is not stored. """
+    @wraps(view)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if key is None:
+            return view(self, request, *args, **kwargs)
+        if not key or len(key) > IdempotencyKey._meta.get_field('key').max_length:
+            data = {"error": "Invalid idempotency key", "message": f"{HEADER} must have 1 to 255 characters"}
+            return Response(data=data, status=status.HTTP_400_BAD_REQUEST)
+
+        record, created = get_or_create_key(key, request)
+        if not created:
+            return replay(record, request)
+
+        try:
+            response = view(self, request, *args, **kwargs)
+        except Exception:
+            record.delete()
+            raise
+        if response.status_code >= 500 or response.status_code in RETRYABLE_STATUS_CODES:
+            record.delete()
+        else:
+            IdempotencyKey.objects.filter(pk=record.pk).update(
+                status_code=response.status_code,
+                response_data=response.data,
+                response_headers={name: response[name] for name in REPLAYED_HEADERS if response.has_header(name)},
+            )
+        return response
+    return wrapper
+
+
+def get_fingerprint(request):
+    """ Function which returns hash of request's method, path and data. """
+    data = request.data
+    if hasattr(data, 'lists'):
+        data = dict(data.lists())
+    payload = json.dumps([request.method, request.path, data], sort_keys=True, cls=DjangoJSONEncoder)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def get_or_create_key(key, request):
+    """ Function which returns stored key of request, replacing expired one or one
+    of request in progress for longer than IDEMPOTENCY_LOCK_TIMEOUT, whose worker
+    is assumed dead, and whether it was created by this request. """
+    fields = {'key': key, 'method': request.method, 'path': request.path}
+    fingerprint = get_fingerprint(request)
+    abandoned = Q(status_code__isnull=True, create_time__lt=timezone.now() - timezone.timedelta(seconds=settings.IDEMPOTENCY_LOCK_TIMEOUT))
+    IdempotencyKey.objects.filter(Q(create_time__lt=get_expire_time()) | abandoned, **fields).delete()
+    while True:
+        try:
+            with transaction.atomic():
+                return IdempotencyKey.objects.create(**fields, fingerprint=fingerprint), True
+        except IntegrityError:
+            try:
+                return IdempotencyKey.objects.get(**fields), False
+            except IdempotencyKey.DoesNotExist:
+                # Concurrent request deleted its key meanwhile, e.g. on failure.
+                continue
+
+
+def replay(record, request):
+    """ Function which returns response stored for repeated request. """
+    if record.fingerprint != get_fingerprint(request):
+        data = {"error": "Invalid idempotency key", "message": f"{HEADER} was used for different request"}
+        return Response(data=data, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+    if record.status_code is None:
+        data = {"error": "Request in progress", "message": f"Request with this {HEADER} is still processed"}
+        return Response(data=data, status=status.HTTP_409_CONFLICT)
+    response = Response(data=record.response_data, status=record.status_code, headers=record.response_headers)
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def get_expire_time():
+    """ Function which returns creation time before which keys are expired. """
+    return timezone.now() - timezone.timedelta(hours=settings.IDEMPOTENCY_KEY_TTL_HOURS)
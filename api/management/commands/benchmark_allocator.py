@@ -0,0 +1,89 @@
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from api.allocator import Allocator
+from api.benchmark import scratch_database, summarize, add_output_argument, write_report
+from api.models import Event, TicketInfo, Reservation
+from api.reservations import reserve_ticket, ReservationConflict
+
+
+class Command(BaseCommand):
+    """ Command which compares latency and throughput of reserving tickets in
+    database, as reserve endpoint does by default, with in-memory allocator
+    persisting reservations by write-behind flushes. """
+    help = "Benchmark reservations in database against in-memory allocator with write-behind persistence."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=8, help="Concurrent threads reserving tickets.")
+        parser.add_argument('--reservations', type=int, default=2000, help="Reservations made by all clients.")
+        parser.add_argument('--flush-interval', type=float, default=0.05)
+        parser.add_argument('--flush-size', type=int, default=500)
+        add_output_argument(parser)
+
+    def handle(self, *args, **options):
+        with scratch_database():
+            event = Event.objects.create(name='Benchmark')
+            database_kind = TicketInfo.objects.create(kind='Database', price=10, quantity=options['reservations'], event=event)
+            allocator_kind = TicketInfo.objects.create(kind='Allocator', price=10, quantity=options['reservations'], event=event)
+            connection.close()
+
+            def reserve_in_database():
+                try:
+                    reserve_ticket(database_kind)
+                except ReservationConflict:
+                    return False
+                return True
+
+            database = self.run(reserve_in_database, options)
+
+            allocator = Allocator(options['flush_interval'], options['flush_size'])
+            allocated = self.run(lambda: allocator.reserve(allocator_kind.pk) is not None, options)
+            start = time.perf_counter()
+            allocator.close()
+            allocated["final_flush_ms"] = round((time.perf_counter() - start) * 1000, 3)
+            allocated["persisted"] = Reservation.objects.filter(ticket_info=allocator_kind).count()
+            database["persisted"] = Reservation.objects.filter(ticket_info=database_kind).count()
+
+            report = {
+                "database": connection.vendor,
+                "clients": options['clients'],
+                "reservations": options['reservations'],
+                "paths": {"database": database, "allocator": allocated},
+            }
+        write_report(self, report, options['output'])
+
+    def run(self, reserve, options):
+        """ Function which makes reservations from concurrent clients
+        and returns their latencies and throughput. """
+        samples, failures = [], []
+        per_client = options['reservations'] // options['clients']
+        barrier = threading.Barrier(options['clients'])
+
+        def client():
+            barrier.wait()
+            try:
+                for _ in range(per_client):
+                    start = time.perf_counter()
+                    if reserve():
+                        samples.append(time.perf_counter() - start)
+                    else:
+                        failures.append(1)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=client) for _ in range(options['clients'])]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        return {
+            "reserved": len(samples),
+            "conflicts": len(failures),
+            "throughput_rps": round(len(samples) / elapsed, 1),
+            "latency_ms": summarize(samples),
+        }
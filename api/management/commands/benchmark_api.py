@@ -0,0 +1,152 @@
+import queue
+import random
+import threading
+import time
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, close_old_connections
+from django.test import Client
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.urls import reverse
+
+from api import cache as availability_cache
+from api.benchmark import scratch_database, seed_data, summarize, add_output_argument, write_report
+from api.models import Event, TicketInfo, Reservation
+
+
+DEFAULT_MIX = 'events=10,tickets=20,available=15,reserve=20,pay=10,summary=25'
+
+
+class Command(BaseCommand):
+    """ Command which seeds synthetic data and replays mix of API calls from
+    concurrent clients, reporting latency, throughput and queries per endpoint. """
+    help = ("Benchmark API endpoints under concurrent load with realistic mix of calls. "
+            "Requests are handled in process, so server and network overhead is not included.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--events', type=int, default=10)
+        parser.add_argument('--kinds', type=int, default=5, help="Ticket kinds of every event.")
+        parser.add_argument('--tickets', type=int, default=1000, help="Tickets of every kind.")
+        parser.add_argument('--clients', type=int, default=8, help="Concurrent clients.")
+        parser.add_argument('--requests', type=int, default=2000, help="Requests sent by all clients.")
+        parser.add_argument('--mix', default=DEFAULT_MIX, help="Comma separated endpoint=weight pairs.")
+        parser.add_argument('--seed', type=int, help="Seed of random choices, for repeatable runs.")
+        add_output_argument(parser)
+
+    def handle(self, *args, **options):
+        mix = self.parse_mix(options['mix'])
+        random.seed(options['seed'])
+        setup_test_environment()
+        try:
+            with scratch_database():
+                seed_data(options['events'], options['kinds'], options['tickets'])
+                availability_cache.get_cache().clear()
+                samples, elapsed = self.run(mix, options)
+                report = {
+                    "database": connection.vendor,
+                    "tickets": options['events'] * options['kinds'] * options['tickets'],
+                    "clients": options['clients'],
+                    "requests": sum(len(endpoint_samples) for endpoint_samples in samples.values()),
+                    "elapsed_s": round(elapsed, 3),
+                    "throughput_rps": round(sum(len(endpoint_samples) for endpoint_samples in samples.values()) / elapsed, 1),
+                    "endpoints": {name: self.get_result(samples[name], elapsed) for name in mix if samples[name]},
+                }
+        finally:
+            teardown_test_environment()
+        write_report(self, report, options['output'])
+
+    def parse_mix(self, value):
+        """ Function which returns mapping of endpoint names to their weights. """
+        try:
+            mix = {name: int(weight) for name, weight in (pair.split('=') for pair in value.split(','))}
+        except ValueError:
+            raise CommandError(f"Invalid mix '{value}', expected comma separated endpoint=weight pairs")
+        unknown = set(mix) - set(self.get_requests())
+        if unknown:
+            raise CommandError(f"Unknown endpoints: {', '.join(sorted(unknown))}")
+        return mix
+
+    def get_requests(self):
+        """ Function which returns mapping of endpoint names to functions
+        sending their request with given client and returning response. """
+        return {
+            'events': lambda client: client.get(reverse('event-list')),
+            'tickets': lambda client: client.get(reverse('ticketinfo-list'), {'event': random.choice(self.event_ids)}),
+            'available': lambda client: client.get(reverse('ticketinfo-available')),
+            'reserve': lambda client: client.get(reverse('ticketinfo-reserve', args=[random.choice(self.ticket_info_ids)])),
+            'pay': self.pay,
+            'summary': lambda client: client.get(reverse('event-summary', args=[random.choice(self.event_ids)])),
+        }
+
+    def pay(self, client):
+        """ Function which pays next unpaid reservation. """
+        try:
+            reservation_id = self.unpaid.get_nowait()
+        except queue.Empty:
+            return None
+        return client.post(reverse('reservation-pay', args=[reservation_id]), {'amount': 10})
+
+    def run(self, mix, options):
+        """ Function which sends requests from concurrent clients and returns
+        samples of (status code, seconds, queries) by endpoint and elapsed time. """
+        self.event_ids = list(Event.objects.values_list('pk', flat=True))
+        self.ticket_info_ids = list(TicketInfo.objects.values_list('pk', flat=True))
+        unpaid_ids = list(Reservation.objects.filter(is_paid=False, ticket__isnull=False).values_list('pk', flat=True))
+        random.shuffle(unpaid_ids)
+        self.unpaid = queue.Queue()
+        for reservation_id in unpaid_ids:
+            self.unpaid.put(reservation_id)
+
+        requests = self.get_requests()
+        names = [random.choices(list(mix), weights=list(mix.values()))[0] for _ in range(options['requests'])]
+        pending = queue.Queue()
+        for name in names:
+            pending.put(name)
+        samples = defaultdict(list)
+
+        def client():
+            http = Client(raise_request_exception=False)
+            queries = []
+
+            def count(execute, sql, params, many, context):
+                queries.append(sql)
+                return execute(sql, params, many, context)
+
+            try:
+                with connection.execute_wrapper(count):
+                    while True:
+                        try:
+                            name = pending.get_nowait()
+                        except queue.Empty:
+                            return
+                        queries.clear()
+                        start = time.perf_counter()
+                        response = requests[name](http)
+                        if response is not None:
+                            samples[name].append((response.status_code, time.perf_counter() - start, len(queries)))
+            finally:
+                close_old_connections()
+
+        clients = [threading.Thread(target=client) for _ in range(options['clients'])]
+        start = time.perf_counter()
+        for thread in clients:
+            thread.start()
+        for thread in clients:
+            thread.join()
+        return samples, time.perf_counter() - start
+
+    def get_result(self, samples, elapsed):
+        """ Function which returns throughput, status codes, latencies and query counts of endpoint. """
+        status_codes = defaultdict(int)
+        for status_code, _, _ in samples:
+            status_codes[str(status_code)] += 1
+        queries = [query_count for _, _, query_count in samples]
+        return {
+            "requests": len(samples),
+            "throughput_rps": round(len(samples) / elapsed, 1),
+            "errors": sum(status_code >= 500 for status_code, _, _ in samples),
+            "status_codes": dict(status_codes),
+            "latency_ms": summarize([latency for _, latency, _ in samples]),
+            "queries": {"mean": round(sum(queries) / len(queries), 2), "max": max(queries)},
+        }
@@ -0,0 +1,108 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connection, close_old_connections
+from django.db.backends.signals import connection_created
+from django.test import Client, AsyncClient
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.urls import reverse
+
+from api.benchmark import scratch_database, summarize, add_output_argument, write_report
+from api.models import Event, TicketInfo
+
+
+class Command(BaseCommand):
+    """ Command which compares concurrent request capacity of summary endpoint
+    served by WSGI worker threads, by synchronous view under ASGI and by its
+    async variant. Every query waits given latency, as remote database would. """
+    help = ("Benchmark concurrent request capacity of WSGI and ASGI deployments. "
+            "Requests are handled in process, so server and network overhead is not included.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument('--concurrency', type=int, default=50, help="Requests in flight under ASGI.")
+        parser.add_argument('--wsgi-threads', type=int, default=8, help="Worker threads of WSGI deployment.")
+        parser.add_argument('--latency', type=float, default=0.005, help="Seconds every query waits.")
+        add_output_argument(parser)
+
+    def handle(self, *args, **options):
+        def delay(execute, sql, params, many, context):
+            time.sleep(options['latency'])
+            return execute(sql, params, many, context)
+
+        def add_latency(sender, connection, **kwargs):
+            # Signal is sent again whenever closed connection reconnects.
+            if delay not in connection.execute_wrappers:
+                connection.execute_wrappers.append(delay)
+
+        setup_test_environment()
+        try:
+            with scratch_database():
+                event = Event.objects.create(name='Benchmark')
+                ticket_info = TicketInfo.objects.create(kind='Normal', price=10, quantity=100, event=event)
+                sync_url = reverse('ticketinfo-summary', args=[ticket_info.id])
+                async_url = reverse('async-ticketinfo-summary', args=[ticket_info.id])
+
+                connection_created.connect(add_latency)
+                connection.execute_wrappers.append(delay)
+                try:
+                    results = {
+                        "wsgi": self.run_wsgi(sync_url, options),
+                        "asgi_sync_view": self.run_asgi(sync_url, options),
+                        "asgi_async_view": self.run_asgi(async_url, options),
+                    }
+                finally:
+                    connection.execute_wrappers.remove(delay)
+                    connection_created.disconnect(add_latency)
+        finally:
+            teardown_test_environment()
+
+        report = {
+            "requests": options['requests'],
+            "concurrency": options['concurrency'],
+            "wsgi_threads": options['wsgi_threads'],
+            "query_latency_s": options['latency'],
+            "results": results,
+        }
+        write_report(self, report, options['output'])
+
+    def run_wsgi(self, url, options):
+        """ Function which sends requests from as many threads as WSGI deployment has workers. """
+        def request(_):
+            start = time.perf_counter()
+            try:
+                return Client().get(url).status_code, time.perf_counter() - start
+            finally:
+                close_old_connections()
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['wsgi_threads']) as executor:
+            responses = list(executor.map(request, range(options['requests'])))
+        return self.get_result(responses, time.perf_counter() - start)
+
+    def run_asgi(self, url, options):
+        """ Function which sends requests keeping given number of them in flight. """
+        async def send_requests():
+            semaphore = asyncio.Semaphore(options['concurrency'])
+
+            async def request():
+                async with semaphore:
+                    start = time.perf_counter()
+                    response = await AsyncClient().get(url)
+                    return response.status_code, time.perf_counter() - start
+
+            return await asyncio.gather(*(request() for _ in range(options['requests'])))
+
+        start = time.perf_counter()
+        responses = asyncio.run(send_requests())
+        return self.get_result(responses, time.perf_counter() - start)
+
+    def get_result(self, responses, elapsed):
+        """ Function which returns throughput, latencies and errors of responses. """
+        return {
+            "throughput_rps": round(len(responses) / elapsed, 1),
+            "errors": sum(code != 200 for code, _ in responses),
+            "latency_ms": summarize([latency for _, latency in responses]),
+        }
@@ -0,0 +1,92 @@
+import random
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, OperationalError
+from django.utils import timezone
+
+from api.benchmark import scratch_database, summarize, add_output_argument, write_report
+from api.models import Event, TicketInfo, Reservation
+from api.reservations import reserve_tickets
+from api.tasks import release_expired_reservations, release_reservation
+
+
+class Command(BaseCommand):
+    """ Command which compares inventory recovery latency, i.e. time between
+    reservation expiry and release of its ticket, of both expiry modes. """
+    help = ("Benchmark inventory recovery latency of 'poll' and 'eta' expiry modes. "
+            "Tasks run in process, so broker latency is not included.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reservations', type=int, default=200)
+        parser.add_argument('--window', type=float, default=5.0, help="Seconds over which expiries are spread.")
+        parser.add_argument('--poll-interval', type=float, default=2.0, help="Seconds between periodic task runs.")
+        add_output_argument(parser)
+
+    def handle(self, *args, **options):
+        with scratch_database():
+            event = Event.objects.create(name='Benchmark')
+            report = {
+                "reservations": options['reservations'],
+                "window_s": options['window'],
+                "poll_interval_s": options['poll_interval'],
+                "recovery_latency_ms": {
+                    "poll": summarize(self.run_poll(event, options)),
+                    "eta": summarize(self.run_eta(event, options)),
+                },
+            }
+        write_report(self, report, options['output'])
+
+    def create_expiring_reservations(self, event, kind, options):
+        """ Function which reserves tickets expiring randomly within the window
+        and returns mapping of reservations pks to their expire timestamps. """
+        ticket_info = TicketInfo.objects.create(kind=kind, price=10, quantity=options['reservations'], event=event)
+        reservations = reserve_tickets({ticket_info: options['reservations']})
+        start = timezone.now() + timezone.timedelta(seconds=0.5)
+        for reservation in reservations:
+            reservation.expire_time = start + timezone.timedelta(seconds=random.uniform(0, options['window']))
+        Reservation.objects.bulk_update(reservations, ['expire_time'])
+        return {reservation.pk: reservation.expire_time.timestamp() for reservation in reservations}
+
+    def run_poll(self, event, options):
+        """ Function which releases reservations by periodic task run every poll interval. """
+        pending = self.create_expiring_reservations(event, 'Poll', options)
+        deadline = max(pending.values()) + 2 * options['poll_interval']
+        latencies = []
+        while pending and time.time() < deadline:
+            time.sleep(options['poll_interval'])
+            release_expired_reservations()
+            released_time = time.time()
+            released = Reservation.objects.filter(pk__in=list(pending), ticket__isnull=True).values_list('pk', flat=True)
+            for pk in released:
+                latencies.append(released_time - pending.pop(pk))
+        return latencies
+
+    def run_eta(self, event, options):
+        """ Function which releases every reservation by task scheduled at its expire time. """
+        pending = self.create_expiring_reservations(event, 'ETA', options)
+        latencies = []
+
+        def release(pk, expire_timestamp):
+            try:
+                for _ in range(10):
+                    try:
+                        if release_reservation(pk):
+                            latencies.append(time.time() - expire_timestamp)
+                        return
+                    except OperationalError:
+                        # Database was locked by concurrent release, retry as worker would.
+                        time.sleep(0.01)
+            finally:
+                connection.close()
+
+        timers = [
+            threading.Timer(max(0, expire_timestamp - time.time()) + 0.001, release, args=(pk, expire_timestamp))
+            for pk, expire_timestamp in pending.items()
+        ]
+        for timer in timers:
+            timer.start()
+        for timer in timers:
+            timer.join()
+        return latencies
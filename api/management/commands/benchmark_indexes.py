@@ -0,0 +1,84 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+from api.benchmark import scratch_database, seed_data, summarize, add_output_argument, write_report
+from api.models import Event, TicketInfo, Ticket, Reservation
+from api.reservations import get_free_tickets
+from api.tasks import get_expired_reservations
+
+
+# Indexes serving hot query shapes, dropped to measure queries without them.
+INDEXES = (
+    (Reservation, 'reservation_expiry_idx'),
+    (Reservation, 'reservation_summary_idx'),
+    (Ticket, 'ticket_free_seat_idx'),
+)
+
+
+class Command(BaseCommand):
+    """ Command which seeds large synthetic data and reports query plans
+    and timings of hot queries without and with their indexes. """
+    help = "Benchmark summary, sweeper and free ticket queries without and with indexes."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--events', type=int, default=10)
+        parser.add_argument('--kinds', type=int, default=5, help="Ticket kinds of every event.")
+        parser.add_argument('--tickets', type=int, default=5000, help="Tickets of every kind.")
+        parser.add_argument('--repeat', type=int, default=20, help="Runs of every query.")
+        add_output_argument(parser)
+
+    def handle(self, *args, **options):
+        with scratch_database():
+            start = time.perf_counter()
+            seed_data(options['events'], options['kinds'], options['tickets'])
+            seed_time = time.perf_counter() - start
+
+            queries = self.get_queries()
+            self.set_indexes(enabled=False)
+            before = {name: self.measure(queryset, options['repeat']) for name, queryset in queries.items()}
+            self.set_indexes(enabled=True)
+            after = {name: self.measure(queryset, options['repeat']) for name, queryset in queries.items()}
+
+            report = {
+                "database": connection.vendor,
+                "tickets": Ticket.objects.count(),
+                "reservations": Reservation.objects.count(),
+                "seed_s": round(seed_time, 3),
+                "queries": {name: {"before": before[name], "after": after[name]} for name in queries},
+            }
+        write_report(self, report, options['output'])
+
+    def get_queries(self):
+        """ Function which returns hot querysets by names. """
+        event = Event.objects.order_by('pk').first()
+        ticket_info = TicketInfo.objects.order_by('pk').first()
+        return {
+            "event_summary": Event.objects.filter(pk=event.pk).summarize_reservations(),
+            "ticket_info_summary": TicketInfo.objects.filter(pk=ticket_info.pk).summarize_reservations(),
+            "sweeper_batch": get_expired_reservations(timezone.now()).values_list('pk', 'ticket_info_id', 'expire_time')[:500],
+            "free_tickets": get_free_tickets(ticket_info).values_list('pk', flat=True)[:10],
+        }
+
+    def set_indexes(self, enabled):
+        """ Function which creates or drops benchmarked indexes and refreshes statistics. """
+        with connection.schema_editor() as editor:
+            for model, name in INDEXES:
+                index = next(index for index in model._meta.indexes if index.name == name)
+                if enabled:
+                    editor.add_index(model, index)
+                else:
+                    editor.remove_index(model, index)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def measure(self, queryset, repeat):
+        """ Function which returns query plan and timings of queryset. """
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            list(queryset.all())
+            timings.append(time.perf_counter() - start)
+        return {"plan": queryset.explain().splitlines(), "ms": summarize(timings)}
@@ -0,0 +1,46 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.benchmark import scratch_database, summarize, add_output_argument, write_report
+from api.models import Event, TicketInfo
+from api.reservations import reserve_ticket
+
+
+class Command(BaseCommand):
+    """ Command which measures cost of creating ticket kinds and reserving
+    their tickets for both inventory modes at growing numbers of seats. """
+    help = "Benchmark create and reserve cost of 'tickets' and 'counter' inventory modes."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 50000, 500000])
+        parser.add_argument('--reservations', type=int, default=100, help="Reservations made for every size.")
+        add_output_argument(parser)
+
+    def handle(self, *args, **options):
+        results = []
+        with scratch_database():
+            event = Event.objects.create(name='Benchmark')
+            for size in options['sizes']:
+                for mode in TicketInfo.InventoryMode.values:
+                    results.append(self.run(event, mode, size, options['reservations']))
+        write_report(self, {"results": results}, options['output'])
+
+    def run(self, event, mode, size, reservations):
+        """ Function which creates ticket kind of given size and reserves its tickets. """
+        start = time.perf_counter()
+        ticket_info = TicketInfo.objects.create(kind=f'{mode}-{size}', price=10, quantity=size, event=event, inventory_mode=mode)
+        create_time = time.perf_counter() - start
+
+        latencies = []
+        for _ in range(min(reservations, size)):
+            start = time.perf_counter()
+            reserve_ticket(ticket_info)
+            latencies.append(time.perf_counter() - start)
+
+        return {
+            "mode": mode,
+            "seats": size,
+            "create_ms": round(create_time * 1000, 3),
+            "reserve_ms": summarize(latencies),
+        }
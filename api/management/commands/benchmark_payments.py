@@ -0,0 +1,99 @@
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.test import Client, override_settings
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.urls import reverse
+
+from api.benchmark import scratch_database, summarize, add_output_argument, write_report
+from api.models import Event, TicketInfo, Payment
+from api.payment_gateway import get_gateway_client
+from api.reservations import reserve_tickets
+from api.tasks import charge_payment
+
+
+class Command(BaseCommand):
+    """ Command which compares payment throughput of 'inline' and 'queue'
+    payment modes against fake gateway with given latency. """
+    help = ("Benchmark payment throughput of 'inline' and 'queue' payment modes. "
+            "Tasks run in process, so broker latency is not included.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--payments', type=int, default=100)
+        parser.add_argument('--latency', type=float, default=0.3, help="Seconds every charge takes.")
+        parser.add_argument('--web-threads', type=int, default=4, help="Threads handling requests.")
+        parser.add_argument('--workers', type=int, default=8, help="Threads running queued charges.")
+        add_output_argument(parser)
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        try:
+            with scratch_database():
+                event = Event.objects.create(name='Benchmark')
+                results = {mode: self.run(event, mode, options) for mode in ('inline', 'queue')}
+        finally:
+            teardown_test_environment()
+            get_gateway_client.cache_clear()
+
+        report = {
+            "payments": options['payments'],
+            "gateway_latency_s": options['latency'],
+            "web_threads": options['web_threads'],
+            "workers": options['workers'],
+            "results": results,
+        }
+        write_report(self, report, options['output'])
+
+    def run(self, event, mode, options):
+        """ Function which pays reservations from web threads, while worker
+        threads charge enqueued payments, and measures both. """
+        ticket_info = TicketInfo.objects.create(kind=mode, price=10, quantity=options['payments'], event=event)
+        reservations = reserve_tickets({ticket_info: options['payments']})
+        pending = queue.Queue()
+
+        def pay(reservation):
+            start = time.perf_counter()
+            try:
+                response = Client(raise_request_exception=False).post(reverse('reservation-pay', args=[reservation.pk]), {'amount': 10})
+                return response.status_code, time.perf_counter() - start
+            finally:
+                close_old_connections()
+
+        def work():
+            try:
+                for payment_id in iter(pending.get, None):
+                    charge_payment(payment_id)
+            finally:
+                close_old_connections()
+
+        get_gateway_client.cache_clear()
+        with override_settings(PAYMENT_MODE=mode, PAYMENT_GATEWAY_LATENCY=options['latency']), \
+                mock.patch.object(charge_payment, 'delay', side_effect=pending.put):
+            workers = [threading.Thread(target=work) for _ in range(options['workers'])]
+            for worker in workers:
+                worker.start()
+            start = time.perf_counter()
+            try:
+                with ThreadPoolExecutor(max_workers=options['web_threads']) as executor:
+                    responses = list(executor.map(pay, reservations))
+                responded = time.perf_counter() - start
+            finally:
+                for _ in workers:
+                    pending.put(None)
+                for worker in workers:
+                    worker.join()
+            completed = time.perf_counter() - start
+
+        succeeded = Payment.objects.filter(reservation__ticket_info=ticket_info, status=Payment.Status.SUCCEEDED).count()
+        return {
+            "requests_per_s": round(len(responses) / responded, 1),
+            "payments_per_s": round(succeeded / completed, 1),
+            "succeeded": succeeded,
+            "errors": sum(code not in (200, 202) for code, _ in responses),
+            "response_ms": summarize([latency for _, latency in responses]),
+        }
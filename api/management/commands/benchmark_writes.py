@@ -0,0 +1,103 @@
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, OperationalError
+from django.test.utils import override_settings
+
+from api.benchmark import scratch_database, summarize, add_output_argument, write_report
+from api.models import Event, TicketInfo
+from api.reservations import reserve_ticket, ReservationConflict
+from api.stats import get_event_summaries
+
+
+# Profiles of SQLite pragmas, and whether clients reconnect after every operation,
+# as without CONN_MAX_AGE every request does.
+SQLITE_PROFILES = {
+    'rollback_journal': ({'journal_mode': 'DELETE', 'synchronous': 'FULL'}, True),
+    'wal': ({'journal_mode': 'WAL', 'synchronous': 'NORMAL', 'busy_timeout': 20000}, True),
+    'wal_persistent': ({'journal_mode': 'WAL', 'synchronous': 'NORMAL', 'busy_timeout': 20000}, False),
+}
+
+SERVER_PROFILES = {
+    'reconnect': ({}, True),
+    'persistent': ({}, False),
+}
+
+
+class Command(BaseCommand):
+    """ Command which measures throughput of concurrent reservations, with concurrent
+    summary reads, under database connection profiles. SQLite is measured with
+    rollback journal and write-ahead log, every database with and without reusing
+    connections. Configured database is benchmarked, so run it with production
+    settings to measure PostgreSQL. """
+    help = "Benchmark concurrent writes and reads under database journal and connection profiles."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=8, help="Threads reserving tickets.")
+        parser.add_argument('--readers', type=int, default=4, help="Threads reading event summaries.")
+        parser.add_argument('--duration', type=float, default=5.0, help="Seconds every profile runs.")
+        add_output_argument(parser)
+
+    def handle(self, *args, **options):
+        with scratch_database():
+            event = Event.objects.create(name='Benchmark')
+            profiles = SQLITE_PROFILES if connection.vendor == 'sqlite' else SERVER_PROFILES
+            report = {
+                "database": connection.vendor,
+                "writers": options['writers'],
+                "readers": options['readers'],
+                "duration_s": options['duration'],
+                "profiles": {},
+            }
+            for name, (pragmas, reconnect) in profiles.items():
+                ticket_info = TicketInfo.objects.create(
+                    kind=name, price=10, quantity=10**9, event=event, inventory_mode=TicketInfo.InventoryMode.COUNTER
+                )
+                # Pragmas are applied by connections opened from now on.
+                connection.close()
+                with override_settings(SQLITE_PRAGMAS=pragmas):
+                    report["profiles"][name] = self.run(event, ticket_info, reconnect, options)
+        write_report(self, report, options['output'])
+
+    def run(self, event, ticket_info, reconnect, options):
+        """ Function which runs writers and readers for the duration
+        and returns their throughput and latencies. """
+        write_samples, read_samples, errors = [], [], []
+        deadline = time.perf_counter() + options['duration']
+        barrier = threading.Barrier(options['writers'] + options['readers'])
+
+        def client(operation, samples):
+            barrier.wait()
+            try:
+                while time.perf_counter() < deadline:
+                    start = time.perf_counter()
+                    try:
+                        operation()
+                        samples.append(time.perf_counter() - start)
+                    except (OperationalError, ReservationConflict) as error:
+                        errors.append(type(error).__name__)
+                    if reconnect:
+                        connection.close()
+            finally:
+                connection.close()
+
+        threads = [
+            threading.Thread(target=client, args=(lambda: reserve_ticket(ticket_info), write_samples))
+            for _ in range(options['writers'])
+        ] + [
+            threading.Thread(target=client, args=(lambda: get_event_summaries([event.pk]), read_samples))
+            for _ in range(options['readers'])
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        return {
+            "writes_per_s": round(len(write_samples) / options['duration'], 1),
+            "reads_per_s": round(len(read_samples) / options['duration'], 1),
+            "errors": len(errors),
+            "write_latency_ms": summarize(write_samples),
+            "read_latency_ms": summarize(read_samples),
+        }
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.models import TicketInfo, Ticket
+
+
+class Command(BaseCommand):
+    """ Command which converts existing ticket kinds between inventory modes.
+    Converting to counter inventory deletes tickets objects of free seats,
+    converting back creates them. """
+    help = "Convert ticket kinds between 'tickets' and 'counter' inventory modes."
+
+    def add_arguments(self, parser):
+        parser.add_argument('mode', choices=TicketInfo.InventoryMode.values)
+        parser.add_argument('ids', nargs='*', type=int, help="Ticket kinds to convert, all when omitted.")
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        tickets_info = TicketInfo.objects.exclude(inventory_mode=options['mode'])
+        if options['ids']:
+            tickets_info = tickets_info.filter(pk__in=options['ids'])
+
+        for pk in tickets_info.values_list('pk', flat=True):
+            with transaction.atomic():
+                # Locking the row holds off reservations of converted kind.
+                ticket_info = TicketInfo.objects.select_for_update().get(pk=pk)
+                if options['mode'] == TicketInfo.InventoryMode.COUNTER:
+                    changed, _ = Ticket.objects.filter(ticket_info=ticket_info, reservation__isnull=True).delete()
+                else:
+                    changed = ticket_info.available
+                    Ticket.objects.bulk_create(
+                        (Ticket(ticket_info=ticket_info) for _ in range(changed)), batch_size=options['batch_size']
+                    )
+                TicketInfo.objects.filter(pk=pk).touch(inventory_mode=options['mode'])
+            self.stdout.write(f"{ticket_info!r}: converted to {options['mode']}, {changed} tickets changed")
+
+        self.stdout.write(self.style.SUCCESS("Inventory converted"))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from api import stats
+from api.models import STATS_FIELDS, EventStats, TicketInfoStats
+
+
+class Command(BaseCommand):
+    """ Command which recomputes reservations statistics of ticket kinds
+    and events from reservations and replaces the maintained ones. """
+    help = "Rebuild reservations statistics of ticket kinds and events."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Only report drifted statistics.")
+
+    def handle(self, *args, **options):
+        stored = {
+            model: {row.pop('pk'): row for row in model.objects.values('pk', *STATS_FIELDS)}
+            for model in (TicketInfoStats, EventStats)
+        }
+        computed = stats.compute() if options['dry_run'] else stats.rebuild()
+
+        drifted = 0
+        for model, objects in zip((TicketInfoStats, EventStats), computed):
+            for obj in objects:
+                expected = {field: getattr(obj, field) for field in STATS_FIELDS}
+                if stored[model].get(obj.pk) != expected:
+                    self.stdout.write(f"{model.__name__} {obj.pk}: stored {stored[model].get(obj.pk)}, actually {expected}")
+                    drifted += 1
+
+        verb = "Found" if options['dry_run'] else "Rebuilt"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {drifted} drifted statistics"))
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Case, Count, F, OuterRef, Subquery, Value, When
+from django.db.models.functions import Coalesce
+
+from api.models import TicketInfo, Ticket, Reservation
+
+
+class Command(BaseCommand):
+    """ Command which recomputes available tickets counters of TicketInfo
+    objects from their related tickets and fixes the drifted ones. """
+    help = "Recompute available tickets counters of ticket kinds."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Only report drifted counters.")
+
+    def handle(self, *args, **options):
+        free_tickets = Coalesce(Subquery(
+            Ticket.objects.filter(ticket_info=OuterRef('pk'), reservation__isnull=True)
+            .order_by().values('ticket_info').annotate(count=Count('pk')).values('count')
+        ), Value(0))
+        valid_reservations = Coalesce(Subquery(
+            Reservation.objects.filter(ticket_info=OuterRef('pk'), ticket__isnull=False)
+            .order_by().values('ticket_info').annotate(count=Count('pk')).values('count')
+        ), Value(0))
+        available = Case(
+            When(inventory_mode=TicketInfo.InventoryMode.COUNTER, then=F('quantity') - valid_reservations),
+            default=free_tickets
+        )
+
+        drifted = TicketInfo.objects.annotate(expected=available).exclude(available=F('expected'))
+        fixed = 0
+        for ticket_info in drifted.only('pk', 'kind', 'available'):
+            self.stdout.write(f"{ticket_info!r}: counter {ticket_info.available}, actually {ticket_info.expected}")
+            if not options['dry_run']:
+                # Counter is recomputed in the UPDATE itself, so reservations
+                # made since the check above are not lost.
+                fixed += TicketInfo.objects.filter(pk=ticket_info.pk).update(available=available)
+
+        self.stdout.write(self.style.SUCCESS(f"Reconciled {fixed} ticket kinds"))
@@ -0,0 +1,125 @@
+import threading
+from collections import defaultdict
+
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+QUERIES_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+
+class Histogram:
+    """ Histogram of observed values by labels, rendered in Prometheus text format. """
+    def __init__(self, name, help_text, label_names, buckets=DURATION_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """ Function which forgets all observations. """
+        with self.lock:
+            self.counts = defaultdict(lambda: [0] * (len(self.buckets) + 1))
+            self.sums = defaultdict(float)
+
+    def observe(self, labels, value):
+        """ Function which counts value in the first bucket holding it. """
+        index = next((index for index, bound in enumerate(self.buckets) if value <= bound), len(self.buckets))
+        with self.lock:
+            self.counts[labels][index] += 1
+            self.sums[labels] += value
+
+    def render(self):
+        """ Function which returns lines of cumulative buckets, sums and counts. """
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self.lock:
+            for labels, counts in sorted(self.counts.items()):
+                pairs = list(zip(self.label_names, labels))
+                total = 0
+                for bound, count in zip(self.buckets + ('+Inf',), counts):
+                    total += count
+                    lines.append(f'{self.name}_bucket{format_labels(pairs + [("le", bound)])} {total}')
+                lines.append(f'{self.name}_sum{format_labels(pairs)} {self.sums[labels]}')
+                lines.append(f'{self.name}_count{format_labels(pairs)} {total}')
+        return lines
+
+
+class Counter:
+    """ Counter of events by labels, rendered in Prometheus text format. """
+    def __init__(self, name, help_text, label_names):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """ Function which forgets all counted events. """
+        with self.lock:
+            self.values = defaultdict(int)
+
+    def increase(self, labels, value=1):
+        """ Function which counts events of given labels. """
+        with self.lock:
+            self.values[labels] += value
+
+    def render(self):
+        """ Function which returns lines of counted values. """
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} counter']
+        with self.lock:
+            for labels, value in sorted(self.values.items()):
+                lines.append(f'{self.name}{format_labels(list(zip(self.label_names, labels)))} {value}')
+        return lines
+
+
+def format_labels(pairs):
+    """ Function which returns (name, value) label pairs in Prometheus text format. """
+    return '{' + ','.join(f'{name}="{escape(value)}"' for name, value in pairs) + '}'
+
+
+def escape(value):
+    """ Function which escapes label value. """
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+request_duration = Histogram(
+    'api_request_duration_seconds', 'Wall time of requests.', ('view', 'method', 'status'))
+request_queries = Histogram(
+    'api_request_queries', 'Number of SQL queries of requests.', ('view',), QUERIES_BUCKETS)
+request_sql_duration = Histogram(
+    'api_request_sql_duration_seconds', 'Time of SQL queries of requests.', ('view',))
+request_serialization_duration = Histogram(
+    'api_request_serialization_duration_seconds', 'Time of rendering responses.', ('view',))
+
+HISTOGRAMS = (request_duration, request_queries, request_sql_duration, request_serialization_duration)
+
+throttled_requests = Counter(
+    'api_throttled_requests_total', 'Requests rejected by throttles.', ('scope', 'store'))
+
+COUNTERS = (throttled_requests,)
+
+
+def observe_request(view, method, status, duration, queries, sql_duration, serialization_duration):
+    """ Function which records measurements of single request. """
+    request_duration.observe((view, method, str(status)), duration)
+    request_queries.observe((view,), queries)
+    request_sql_duration.observe((view,), sql_duration)
+    request_serialization_duration.observe((view,), serialization_duration)
+
+
+def reset():
+    """ Function which forgets all recorded measurements. """
+    for metric in HISTOGRAMS + COUNTERS:
+        metric.reset()
+
+
+def render(extra_counters=()):
+    """ Function which returns all metrics in Prometheus text format. 'extra_counters'
+    are (name, help text, value) tuples of counters recorded elsewhere. """
+    lines = []
+    for metric in HISTOGRAMS + COUNTERS:
+        lines.extend(metric.render())
+    for name, help_text, value in extra_counters:
+        lines.extend([f'# HELP {name} {help_text}', f'# TYPE {name} counter', f'{name} {value}'])
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,75 @@
+import logging
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.utils.deprecation import MiddlewareMixin
+
+from api import metrics
+
+
+logger = logging.getLogger(__name__)
+
+
+class RequestMeasurements:
+    """ Measurements of single request. Called as database execute wrapper,
+    it counts and times queries. """
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.queries = 0
+        self.sql_duration = 0.0
+        self.serialization_duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.sql_duration += time.perf_counter() - start
+
+
+class RequestMetricsMiddleware(MiddlewareMixin):
+    """ Middleware recording wall time, number and time of queries and time of
+    rendering response of every request by view, exposed by metrics endpoint.
+    Requests slower than REQUEST_METRICS_SLOW_MS are logged. Enabled by
+    REQUEST_METRICS_ENABLED setting. """
+    def __init__(self, get_response=None):
+        if not settings.REQUEST_METRICS_ENABLED:
+            raise MiddlewareNotUsed()
+        super().__init__(get_response)
+
+    def process_request(self, request):
+        """ Function which starts measuring request. """
+        request.measurements = RequestMeasurements()
+        connection.execute_wrappers.append(request.measurements)
+
+    def process_template_response(self, request, response):
+        """ Function which starts timing of rendering response, run right before it. """
+        start = time.perf_counter()
+
+        def rendered(response):
+            request.measurements.serialization_duration += time.perf_counter() - start
+
+        response.add_post_render_callback(rendered)
+        return response
+
+    def process_response(self, request, response):
+        """ Function which records and, when slow, logs measurements of request. """
+        measurements = request.measurements
+        connection.execute_wrappers.remove(measurements)
+        duration = time.perf_counter() - measurements.start
+
+        view = request.resolver_match.view_name if request.resolver_match else 'unresolved'
+        metrics.observe_request(
+            view, request.method, response.status_code, duration,
+            measurements.queries, measurements.sql_duration, measurements.serialization_duration,
+        )
+        if duration * 1000 >= settings.REQUEST_METRICS_SLOW_MS:
+            logger.warning(
+                "Slow request %s %s (%s) took %.1f ms, %d queries took %.1f ms, rendering took %.1f ms",
+                request.method, request.path, view, duration * 1000, measurements.queries,
+                measurements.sql_duration * 1000, measurements.serialization_duration * 1000,
+            )
+        return response
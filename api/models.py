@@ -1,9 +1,193 @@
-from django.db import models
+import uuid
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, models, transaction
+from django.db.models import Count, F, Q, Sum, Value
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 
+from api.signals import inventory_changed
+
+
+SUMMARY_FIELDS = ('total', 'valid', 'invalid', 'paid', 'unpaid')
+
+STATS_FIELDS = SUMMARY_FIELDS + ('revenue',)
+
+
+def get_reservation_stats(is_valid, is_paid, price, count=1):
+    """ Function which returns contribution of 'count' reservations in given
+    state to reservations statistics. Released reservations are never paid. """
+    is_paid = is_valid and is_paid
+    return {
+        'total': count,
+        'valid': count if is_valid else 0,
+        'invalid': 0 if is_valid else count,
+        'paid': count if is_paid else 0,
+        'unpaid': count if is_valid and not is_paid else 0,
+        'revenue': price * count if is_paid else 0,
+    }
+
+
+def get_reservations_summary_aggregates(path=None):
+    """ Function which returns conditional aggregates computing whole
+    reservations summary in a single query. 'path' is the lookup from
+    the queried model to Reservation objects. """
+    field = path or 'pk'
+    prefix = f'{path}__' if path else ''
+    valid = Q(**{f'{prefix}ticket__isnull': False})
+    invalid = Q(**{f'{prefix}ticket__isnull': True})
+    paid = Q(**{f'{prefix}is_paid': True})
+    unpaid = Q(**{f'{prefix}is_paid': False})
+    return {
+        'total': Count(field),
+        'valid': Count(field, filter=valid),
+        'invalid': Count(field, filter=invalid),
+        'paid': Count(field, filter=valid & paid),
+        'unpaid': Count(field, filter=valid & unpaid),
+    }
+
+
+class VersionedQuerySet(models.QuerySet):
+    """ Queryset of versioned objects. """
+
+    def touch(self, **updates):
+        """ Function which increases versions of objects in queryset, along
+        with applying given field updates, and returns number of them. """
+        return self.update(version=F('version') + 1, modified_time=timezone.now(), **updates)
+
+
+class ReservationsSummaryQuerySet(models.QuerySet):
+    """ Queryset computing reservations summaries of related objects. """
+    reservations_path = None
+    price_path = None
+
+    def summarize_reservations(self):
+        """ Function which returns rows of objects primary keys
+        annotated with their reservations summary. """
+        aggregates = get_reservations_summary_aggregates(self.reservations_path)
+        return self.order_by().values('pk').annotate(**aggregates)
+
+    def get_reservations_summaries(self):
+        """ Function which returns dictionary mapping objects primary keys
+        to their reservations summary, computed in a single query. """
+        return {row.pop('pk'): row for row in self.summarize_reservations()}
+
+    def summarize_stats(self):
+        """ Function which returns rows of objects primary keys annotated with
+        their reservations summary and revenue of paid reservations. """
+        paid = Q(**{f'{self.reservations_path}__ticket__isnull': False, f'{self.reservations_path}__is_paid': True})
+        revenue = Coalesce(Sum(self.price_path, filter=paid), Value(0), output_field=models.DecimalField(max_digits=12, decimal_places=2))
+        return self.summarize_reservations().annotate(revenue=revenue)
+
+
+class EventQuerySet(ReservationsSummaryQuerySet, VersionedQuerySet):
+    reservations_path = 'tickets_info__reservations'
+    price_path = 'tickets_info__price'
+
+
+class TicketInfoQuerySet(ReservationsSummaryQuerySet, VersionedQuerySet):
+    reservations_path = 'reservations'
+    price_path = 'price'
+
+    def change_available(self, changes):
+        """ Function which atomically changes available tickets counters,
+        passed as dictionary mapping TicketInfo primary keys to differences.
+        Listeners of 'inventory_changed' signal are notified after commit. """
+        changed = [pk for pk, difference in changes.items() if difference]
+        for pk in changed:
+            self.filter(pk=pk).touch(available=F('available') + changes[pk])
+        if changed:
+            transaction.on_commit(lambda: inventory_changed.send(sender=TicketInfo, ticket_info_ids=changed))
+
+    def take_available(self, pk, count):
+        """ Function which atomically takes 'count' tickets from available tickets
+        counter of ticket kind unless fewer are left, and returns whether it did.
+        Listeners of 'inventory_changed' signal are notified after commit. """
+        taken = self.filter(pk=pk, available__gte=count).touch(available=F('available') - count)
+        if taken:
+            transaction.on_commit(lambda: inventory_changed.send(sender=TicketInfo, ticket_info_ids=[pk]))
+        return bool(taken)
+
+
+class TicketInfoStatsQuerySet(models.QuerySet):
+
+    def change(self, changes):
+        """ Function which atomically adds differences to statistics of ticket kinds
+        and of their events, passed as dictionary mapping TicketInfo primary keys
+        to dictionaries of differences of statistics fields. """
+        for pk, differences in changes.items():
+            updates = {field: F(field) + value for field, value in differences.items() if value}
+            if updates:
+                self.filter(ticket_info_id=pk).update(**updates)
+                EventStats.objects.filter(event__tickets_info=pk).update(**updates)
+
+
+class ReservationQuerySet(models.QuerySet):
+    """ Custom queryset for Reservation objects. """
+
+    def release(self):
+        """ Function which releases tickets of valid, unpaid reservations in queryset,
+        updating available tickets counters, and returns number of released ones.
+        Lazily created tickets of counter inventory are deleted. """
+        # Reservations being paid keep their tickets until payment completes
+        # or its PAYMENT_PENDING_TIMEOUT passes.
+        paying = Payment.objects.in_progress().values('reservation_id')
+        reservations = self.filter(is_paid=False, ticket__isnull=False).exclude(pk__in=paying)
+        if connection.features.has_select_for_update_skip_locked:
+            reservations = reservations.select_for_update(skip_locked=True, of=('self',))
+
+        with transaction.atomic():
+            pks = defaultdict(list)
+            lazy_ticket_ids = []
+            for pk, ticket_id, ticket_info_id, inventory_mode in reservations.values_list(
+                    'pk', 'ticket_id', 'ticket_info_id', 'ticket_info__inventory_mode'):
+                pks[ticket_info_id].append(pk)
+                if inventory_mode == TicketInfo.InventoryMode.COUNTER:
+                    lazy_ticket_ids.append(ticket_id)
+
+            # Reservations paid in the meantime are skipped by the updates.
+            changes = {
+                ticket_info_id: Reservation.objects.filter(pk__in=ticket_info_pks, is_paid=False, ticket__isnull=False)
+                    .exclude(pk__in=paying).update(ticket=None)
+                for ticket_info_id, ticket_info_pks in pks.items()
+            }
+            if lazy_ticket_ids:
+                Ticket.objects.filter(pk__in=lazy_ticket_ids, reservation__isnull=True).delete()
+            TicketInfo.objects.change_available(changes)
+            TicketInfoStats.objects.change({
+                ticket_info_id: {'valid': -released, 'invalid': released, 'unpaid': -released}
+                for ticket_info_id, released in changes.items()
+            })
+        return sum(changes.values())
+
+
+class VersionedModel(models.Model):
+    """ Abstract model with version increased on every change of object
+    and time of the change, validating cached HTTP responses. """
+    class Meta:
+        abstract = True
+
+    version = models.PositiveIntegerField(default=1, editable=False)
+    modified_time = models.DateTimeField(default=timezone.now, editable=False)
 
-class Event(models.Model):
+    def save(self, **kwargs):
+        """ Overwriting behavior of built-in 'save' method to increase version. """
+        is_adding = self._state.adding
+        if not is_adding:
+            self.version = F('version') + 1
+            self.modified_time = timezone.now()
+        super(VersionedModel, self).save(**kwargs)
+        if not is_adding:
+            # Version was increased by database, so it is loaded again on access.
+            del self.__dict__['version']
+
+
+class Event(VersionedModel):
     """ Events model class. """
+    objects = EventQuerySet.as_manager()
+
     name = models.CharField(max_length=100)
     date = models.DateTimeField(blank=True, null=True)
 
@@ -13,6 +197,15 @@ class Event(models.Model):
     def __repr__(self):
         return f"<Event(name='{self.name}', date='{self.date}')>"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """ Overwriting behavior of built-in 'from_db' method to remember
+        name stored in database, shown in listings of ticket kinds. """
+        instance = super(Event, cls).from_db(db, field_names, values)
+        if 'name' in field_names:
+            instance._stored_name = instance.name
+        return instance
+
     def get_total_reservations_count(self):
         """ Function which returns total number of related reservation objects. """
         return Reservation.objects.filter(ticket_info__event=self).count()
@@ -33,16 +226,42 @@ class Event(models.Model):
         """ Function which returns number of unpaid but valid reservations. """
         return Reservation.objects.filter(ticket_info__event=self, ticket__isnull=False, is_paid=False).count()
 
+    def get_reservations_summary(self):
+        """ Function which returns all reservations statistics at once. """
+        return Event.objects.filter(pk=self.pk).get_reservations_summaries()[self.pk]
+
 
-class TicketInfo(models.Model):
+class TicketInfo(VersionedModel):
     """ Tickets description model class. """
     class Meta:
         ordering = ('event', 'kind')
+        indexes = [
+            models.Index(fields=['event', 'kind', 'id'], name='ticketinfo_keyset_idx'),
+            models.Index(fields=['modified_time'], name='ticketinfo_modified_idx'),
+        ]
+
+    class InventoryMode(models.TextChoices):
+        TICKETS = 'tickets', 'Ticket object created for every seat'
+        COUNTER = 'counter', 'Ticket object created on reservation'
+
+    class ProvisioningStatus(models.TextChoices):
+        READY = 'ready'
+        PROVISIONING = 'provisioning'
+
+    objects = TicketInfoQuerySet.as_manager()
 
     kind = models.CharField(max_length=50)
     price = models.DecimalField(max_digits=8, decimal_places=2)
     quantity = models.IntegerField(null=False, blank=False)
     event = models.ForeignKey(Event, related_name='tickets_info', on_delete=models.PROTECT)
+    available = models.IntegerField(default=0, editable=False)
+    inventory_mode = models.CharField(max_length=10, choices=InventoryMode.choices, default=InventoryMode.TICKETS)
+    provisioning_status = models.CharField(
+        max_length=12, choices=ProvisioningStatus.choices, default=ProvisioningStatus.READY, editable=False
+    )
+
+    # Fields changed only by atomic updates, never written by 'save'.
+    counter_fields = ('available', 'provisioning_status')
 
     def __str__(self):
         return f"Ticket {self.kind}, price: {self.price}"
@@ -50,12 +269,31 @@ class TicketInfo(models.Model):
     def __repr__(self):
         return f"<TicketInfo(kind='{self.kind}', price='{self.price}', quantity='{self.quantity}')>"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """ Overwriting behavior of built-in 'from_db' method to remember
+        quantity, kind and event stored in database. """
+        instance = super(TicketInfo, cls).from_db(db, field_names, values)
+        if 'quantity' in field_names:
+            instance._stored_quantity = instance.quantity
+        if 'kind' in field_names and 'event_id' in field_names:
+            instance._stored_listing = instance.get_listing()
+        return instance
+
+    def get_listing(self):
+        """ Function which returns kind and event of ticket kind, shown in listing of events. """
+        return self.kind, self.event_id
+
     def get_total_tickets_count(self):
         """ Function which returns total number of related ticket objects. """
+        if self.inventory_mode == self.InventoryMode.COUNTER:
+            return self.quantity
         return self.tickets.all().count()
 
     def get_available_tickets_count(self):
         """ Function which returns number of available tickets. """
+        if self.inventory_mode == self.InventoryMode.COUNTER:
+            return self.quantity - self.get_valid_reservations_count()
         return self.tickets.filter(reservation__isnull=True).count()
 
     def get_total_reservations_count(self):
@@ -78,37 +316,135 @@ class TicketInfo(models.Model):
         """ Function which returns number of unpaid but valid reservations. """
         return self.reservations.filter(ticket__isnull=False, is_paid=False).count()
 
+    def get_reservations_summary(self):
+        """ Function which returns all reservations statistics at once. """
+        return TicketInfo.objects.filter(pk=self.pk).get_reservations_summaries()[self.pk]
+
     def save(self, **kwargs):
         """ Overwriting behavior of built-in 'save' method. """ 
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.counter_fields
+            ]
+        stored_quantity = self._get_stored_quantity()
+        is_queued = (self.quantity != stored_quantity and self.inventory_mode == self.InventoryMode.TICKETS
+                     and settings.TICKETS_PROVISIONING_MODE == 'queue')
+        if is_queued:
+            self.provisioning_status = self.ProvisioningStatus.PROVISIONING
+            if not self._state.adding:
+                TicketInfo.objects.filter(pk=self.pk).update(provisioning_status=self.provisioning_status)
         super(TicketInfo, self).save(**kwargs)
-        self._create_tickets()
-
-    def _create_tickets(self):
-        """ Function which creates related ticket objects in accordance
-        to model's own 'quanity' parameter. """
-        tickets_total = self.get_total_tickets_count()
-        if tickets_total < self.quantity:
-            Ticket.objects.bulk_create([Ticket(ticket_info=self) for _ in range(self.quantity-tickets_total)])
+        self._stored_quantity = self.quantity
+
+        if self.quantity == stored_quantity:
+            return
+        if self.inventory_mode == self.InventoryMode.COUNTER:
+            # Counter inventory creates tickets on reservation, so only its counter changes.
+            TicketInfo.objects.change_available({self.pk: self.quantity-stored_quantity})
+            self.refresh_from_db(fields=['available'])
+        elif is_queued:
+            from api.tasks import provision_tickets  # Tasks module imports models.
+            transaction.on_commit(lambda: provision_tickets.delay(self.pk))
+        else:
+            self.provision_tickets()
+
+    def _get_stored_quantity(self):
+        """ Function which returns quantity currently stored in database. """
+        if self._state.adding:
+            return 0
+        if not hasattr(self, '_stored_quantity'):
+            self._stored_quantity = TicketInfo.objects.values_list('quantity', flat=True).get(pk=self.pk)
+        return self._stored_quantity
+
+    def provision_tickets(self):
+        """ Function which creates or deletes related ticket objects in batches
+        until their number matches stored quantity, then marks ticket kind ready.
+        Every batch is committed separately, so created tickets can be reserved
+        at once and neither memory nor locks grow with quantity. """
+        while self._provision_tickets_batch():
+            pass
+        TicketInfo.objects.filter(pk=self.pk).touch(provisioning_status=self.ProvisioningStatus.READY)
+        self.refresh_from_db(fields=['available', 'provisioning_status'])
+
+    def _provision_tickets_batch(self):
+        """ Function which creates missing or deletes surplus free tickets,
+        at most TICKETS_BATCH_SIZE of them, and returns their number.
+        Reserved tickets are never deleted. """
+        with transaction.atomic():
+            # Locking the row serializes provisioning of the same ticket kind and holds off
+            # reservations' counter updates, so no claimed ticket is deleted meanwhile.
+            quantity = TicketInfo.objects.select_for_update().values_list('quantity', flat=True).get(pk=self.pk)
+            missing = quantity - self.get_total_tickets_count()
+            count = 0
+            if missing > 0:
+                count = min(missing, settings.TICKETS_BATCH_SIZE)
+                Ticket.objects.bulk_create((Ticket(ticket_info_id=self.pk) for _ in range(count)), batch_size=count)
+            elif missing < 0:
+                surplus_ids = list(
+                    Ticket.objects.filter(ticket_info_id=self.pk, reservation__isnull=True)
+                    .order_by('-pk').values_list('pk', flat=True)[:min(-missing, settings.TICKETS_BATCH_SIZE)]
+                )
+                Ticket.objects.filter(pk__in=surplus_ids).delete()
+                count = -len(surplus_ids)
+            if count:
+                TicketInfo.objects.change_available({self.pk: count})
+        return abs(count)
     
 
 class Ticket(models.Model):
     """ Tickets vessel model class. """
+    class Meta:
+        indexes = [
+            # Free tickets are looked up of ticket kind in primary key order.
+            models.Index(fields=['ticket_info', 'id'], name='ticket_free_seat_idx'),
+        ]
+
     ticket_info = models.ForeignKey(TicketInfo, related_name='tickets', on_delete=models.CASCADE)
 
     def __repr__(self):
         return "<Ticket>"
 
+    def delete(self, **kwargs):
+        """ Overwriting behavior of built-in 'delete' method to keep
+        available tickets counter of related TicketInfo up to date. """
+        with transaction.atomic():
+            is_reserved = Reservation.objects.filter(ticket=self).exists()
+            result = super(Ticket, self).delete(**kwargs)
+            # Seat of counter inventory returns to the pool with its reservation,
+            # while deleted seat of tickets inventory is gone for good.
+            if self.ticket_info.inventory_mode == TicketInfo.InventoryMode.COUNTER:
+                difference = 1 if is_reserved else 0
+            else:
+                difference = 0 if is_reserved else -1
+            TicketInfo.objects.change_available({self.ticket_info_id: difference})
+        return result
+
 
 class Reservation(models.Model):
     """ Reservations model class. """
     class Meta:
         ordering = ('create_time', 'pk')
+        indexes = [
+            # Sweeper walks only reservations still holding unpaid tickets.
+            models.Index(
+                fields=['expire_time', 'id'], name='reservation_expiry_idx',
+                condition=Q(is_paid=False, ticket__isnull=False),
+            ),
+            models.Index(fields=['create_time', 'id'], name='reservation_keyset_idx'),
+            # Summaries count reservations of ticket kind by state from index alone.
+            models.Index(fields=['ticket_info', 'is_paid', 'ticket'], name='reservation_summary_idx'),
+        ]
+
+    objects = ReservationQuerySet.as_manager()
 
     create_time = models.DateTimeField(default=timezone.now)
     expire_time = models.DateTimeField(blank=True, null=True)
     is_paid = models.BooleanField(default=False)
     ticket = models.OneToOneField(Ticket, on_delete=models.CASCADE, null=True, blank=True)
     ticket_info = models.ForeignKey(TicketInfo, related_name='reservations', on_delete=models.CASCADE)
+    # Handle of reservation accepted by allocator before it was persisted.
+    token = models.CharField(max_length=50, unique=True, null=True, blank=True)
 
     def __str__(self):
         return f"Reservation created at {self.create_time} expires at {self.expire_time}, was paid {self.is_paid}"
@@ -116,9 +452,33 @@ class Reservation(models.Model):
     def __repr__(self):
         return f"<Reservation(create_time='{self.create_time}', expire_time='{self.expire_time}', is_paid='{self.is_paid}')>"
 
+    def delete(self, **kwargs):
+        """ Overwriting behavior of built-in 'delete' method to release
+        reserved ticket in available tickets counter. """
+        with transaction.atomic():
+            result = super(Reservation, self).delete(**kwargs)
+            if self.ticket_id:
+                if self.ticket_info.inventory_mode == TicketInfo.InventoryMode.COUNTER:
+                    Ticket.objects.filter(pk=self.ticket_id).delete()
+                TicketInfo.objects.change_available({self.ticket_info_id: 1})
+        return result
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """ Overwriting behavior of built-in 'from_db' method to remember
+        state stored in database, counted in reservations statistics. """
+        instance = super(Reservation, cls).from_db(db, field_names, values)
+        if 'ticket_id' in field_names and 'is_paid' in field_names:
+            instance._stored_state = instance.get_state()
+        return instance
+
+    def get_state(self):
+        """ Function which returns whether reservation is valid and whether it is paid. """
+        return self.ticket_id is not None, self.is_paid
+
     def check_is_valid(self):
         """ Function which returns True when reservation have relation to Ticket object. """
-        return True if self.ticket else False
+        return self.ticket_id is not None
 
     def get_event_name(self):
         """ Function which returns name of related Event object. """
@@ -127,3 +487,148 @@ class Reservation(models.Model):
     def get_ticket_kind(self):
         """ Function which returns kind of related TicketInfo object. """
         return self.ticket_info.kind
+
+
+class EventStats(models.Model):
+    """ Reservations statistics of event, maintained on every reservation change. """
+    event = models.OneToOneField(Event, primary_key=True, related_name='stats', on_delete=models.CASCADE)
+    total = models.IntegerField(default=0)
+    valid = models.IntegerField(default=0)
+    invalid = models.IntegerField(default=0)
+    paid = models.IntegerField(default=0)
+    unpaid = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    def __repr__(self):
+        return f"<EventStats(total='{self.total}', paid='{self.paid}', revenue='{self.revenue}')>"
+
+
+class TicketInfoStats(models.Model):
+    """ Reservations statistics of ticket kind, maintained on every reservation change. """
+    objects = TicketInfoStatsQuerySet.as_manager()
+
+    ticket_info = models.OneToOneField(TicketInfo, primary_key=True, related_name='stats', on_delete=models.CASCADE)
+    total = models.IntegerField(default=0)
+    valid = models.IntegerField(default=0)
+    invalid = models.IntegerField(default=0)
+    paid = models.IntegerField(default=0)
+    unpaid = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    def __repr__(self):
+        return f"<TicketInfoStats(total='{self.total}', paid='{self.paid}', revenue='{self.revenue}')>"
+
+
+def get_pending_payment_deadline():
+    """ Function which returns last update time of payments still in progress,
+    older pending payments are considered lost, e.g. with their worker. """
+    return timezone.now() - timezone.timedelta(minutes=settings.PAYMENT_PENDING_TIMEOUT)
+
+
+class PaymentQuerySet(models.QuerySet):
+
+    def in_progress(self):
+        """ Function which returns pending payments updated before their deadline. """
+        return self.filter(status=Payment.Status.PENDING, update_time__gt=get_pending_payment_deadline())
+
+    def fail_stale(self):
+        """ Function which marks pending payments past their deadline failed
+        and returns number of them. """
+        return self.filter(status=Payment.Status.PENDING, update_time__lte=get_pending_payment_deadline()).update(
+            status=Payment.Status.FAILED, error="Payment timed out", update_time=timezone.now()
+        )
+
+
+class Payment(models.Model):
+    """ Payments model class. Every charge is sent to payment gateway with
+    payment's idempotency key, so retried charge never bills twice. """
+    class Status(models.TextChoices):
+        PENDING = 'pending'
+        SUCCEEDED = 'succeeded'
+        FAILED = 'failed'
+
+    objects = PaymentQuerySet.as_manager()
+
+    reservation = models.ForeignKey(Reservation, related_name='payments', on_delete=models.CASCADE)
+    idempotency_key = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    amount = models.DecimalField(max_digits=8, decimal_places=2)
+    currency = models.CharField(max_length=10, default='EUR')
+    token = models.CharField(max_length=20, blank=True)
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.PENDING)
+    error = models.CharField(max_length=200, blank=True)
+    create_time = models.DateTimeField(default=timezone.now)
+    update_time = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"Payment of {self.amount} {self.currency} created at {self.create_time}, status: {self.status}"
+
+    def __repr__(self):
+        return f"<Payment(amount='{self.amount}', currency='{self.currency}', status='{self.status}')>"
+
+
+class IdempotencyKey(models.Model):
+    """ Responses of requests sent with 'Idempotency-Key' header, replayed
+    to retried requests. Response is empty while request is processed. """
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['key', 'method', 'path'], name='idempotency_key_unique'),
+        ]
+
+    key = models.CharField(max_length=255)
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(blank=True, null=True)
+    response_data = models.JSONField(encoder=DjangoJSONEncoder, blank=True, null=True)
+    response_headers = models.JSONField(default=dict)
+    create_time = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __repr__(self):
+        return f"<IdempotencyKey(key='{self.key}', method='{self.method}', path='{self.path}', status_code='{self.status_code}')>"
+
+
+class SweeperCheckpoint(models.Model):
+    """ High-water marks of periodic tasks walking tables in batches. """
+    name = models.CharField(max_length=100, unique=True)
+    position = models.DateTimeField(blank=True, null=True)
+
+    def __repr__(self):
+        return f"<SweeperCheckpoint(name='{self.name}', position='{self.position}')>"
+
+
+class ProcessLease(models.Model):
+    """ Leases making single process owner of work which must not be shared,
+    until it stops renewing them. """
+    name = models.CharField(max_length=100, unique=True)
+    owner = models.CharField(max_length=100)
+    expire_time = models.DateTimeField()
+
+    def __repr__(self):
+        return f"<ProcessLease(name='{self.name}', owner='{self.owner}', expire_time='{self.expire_time}')>"
+
+
+class AdmissionQueue(models.Model):
+    """ Admission queue of ticket kind, holding positions of last joined and
+    last admitted clients and time admissions were handed out up to. """
+    ticket_info = models.OneToOneField(TicketInfo, primary_key=True, related_name='admission_queue', on_delete=models.CASCADE)
+    tail = models.PositiveIntegerField(default=0)
+    head = models.PositiveIntegerField(default=0)
+    head_time = models.FloatField(default=0)
+
+    def __repr__(self):
+        return f"<AdmissionQueue(tail='{self.tail}', head='{self.head}')>"
+
+
+class AdmissionTokenUse(models.Model):
+    """ Positions in admission queue whose tokens were used up by reservations. """
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['ticket_info', 'position'], name='admission_token_use_unique'),
+        ]
+
+    ticket_info = models.ForeignKey(TicketInfo, related_name='admission_token_uses', on_delete=models.CASCADE)
+    position = models.PositiveIntegerField()
+    create_time = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __repr__(self):
+        return f"<AdmissionTokenUse(ticket_info='{self.ticket_info_id}', position='{self.position}')>"
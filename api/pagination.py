@@ -0,0 +1,128 @@
+import json
+from datetime import date
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """ Keyset pagination, which seeks rows following the cursor instead of
+    skipping them with OFFSET, so every page costs the same. Cursor holds
+    values of all 'ordering' fields of boundary row, so the last of them
+    must be unique. Only ascending ordering is supported. """
+    ordering = ('pk',)
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        """ Function which returns rows of page pointed by request's cursor. """
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.fields = [self.get_field(queryset.model, field) for field in self.ordering]
+        self.attnames = [field.attname for field in self.fields]
+        values, reverse = self.decode_cursor(request)
+
+        queryset = queryset.order_by(*(f'-{field}' if reverse else field for field in self.ordering))
+        if values is not None:
+            queryset = queryset.filter(self.get_keyset_filter(values, reverse))
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if reverse:
+            results.reverse()
+
+        self.has_next = values is not None if reverse else has_more
+        self.has_previous = has_more if reverse else values is not None
+        self.page = results
+        return results
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_page_size(self, request):
+        """ Function which returns page size requested by client, limited to maximum. """
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(page_size, self.max_page_size) if page_size > 0 else self.page_size
+
+    def get_field(self, model, field):
+        """ Function which returns model field of ordering field. """
+        return model._meta.pk if field == 'pk' else model._meta.get_field(field)
+
+    def get_keyset_filter(self, values, reverse):
+        """ Function which returns filter of rows following given values of
+        ordering fields. Leading range condition lets database seek the index. """
+        lookup = 'lt' if reverse else 'gt'
+        keyset = Q()
+        for index, field in enumerate(self.ordering):
+            equal = {ordering_field: value for ordering_field, value in zip(self.ordering[:index], values)}
+            keyset |= Q(**equal, **{f'{field}__{lookup}': values[index]})
+        return Q(**{f'{self.ordering[0]}__{lookup}e': values[0]}) & keyset
+
+    def decode_cursor(self, request):
+        """ Function which returns ordering values and direction held by request's cursor. """
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None, False
+        try:
+            cursor = json.loads(urlsafe_b64decode(encoded.encode('ascii')))
+            values, reverse = cursor['v'], bool(cursor['r'])
+        except (TypeError, ValueError, KeyError, UnicodeEncodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(self.ordering) or None in values:
+            raise NotFound(self.invalid_cursor_message)
+        try:
+            values = [field.to_python(value) for field, value in zip(self.fields, values)]
+        except (ValidationError, TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        return values, reverse
+
+    def encode_cursor(self, instance, reverse):
+        """ Function which returns URL of page following or preceding given row. """
+        values = [getattr(instance, attname) for attname in self.attnames]
+        cursor = json.dumps({'v': values, 'r': int(reverse)}, default=self.encode_value, separators=(',', ':'))
+        encoded = urlsafe_b64encode(cursor.encode('ascii')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    @staticmethod
+    def encode_value(value):
+        """ Function which encodes ordering value without losing precision. """
+        return value.isoformat() if isinstance(value, date) else str(value)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.page[0], reverse=True)
+
+
+class EventPagination(KeysetPagination):
+    ordering = ('pk',)
+
+
+class TicketInfoPagination(KeysetPagination):
+    ordering = ('event', 'kind', 'pk')
+
+
+class ReservationPagination(KeysetPagination):
+    ordering = ('create_time', 'pk')
@@ -1,4 +1,11 @@
+import queue
+import threading
+import time
 from collections import namedtuple
+from contextlib import contextmanager
+from functools import lru_cache
+
+from django.conf import settings
 
 
 class CardError(Exception):
@@ -7,6 +14,9 @@ class CardError(Exception):
 class PaymentError(Exception):
     pass
 
+class GatewayTimeout(PaymentError):
+    pass
+
 class CurrencyError(Exception):
     pass
 
@@ -14,13 +24,109 @@ class CurrencyError(Exception):
 PaymentResult = namedtuple('PaymentResult', ('amount', 'currency'))
 
 class PaymentGateway:
+    """ Fake payment gateway, every instance stands for connection to it.
+    Every charge takes 'latency' seconds. Charges are remembered by
+    idempotency key, so repeated charge is returned instead of billed again. """
     supported_currencies = ('EUR',)
-    def charge(self, amount, token, currency='EUR'):
-        if token == 'card_error':
-            raise CardError("Your card has been declined")
-        elif token == 'payment_error':
-            raise PaymentError("Something went wrong with your transaction")
-        elif currency not in self.supported_currencies:
-            raise CurrencyError(f"Currency {currency} not supported")
-        else:
-            return PaymentResult(amount, currency)
\ No newline at end of file
+    charges = {}
+    charges_lock = threading.Lock()
+
+    def __init__(self, latency=0, timeout=None):
+        self.latency = latency
+        self.timeout = timeout
+
+    def charge(self, amount, token, currency='EUR', idempotency_key=None):
+        if self.timeout is not None and self.latency > self.timeout:
+            time.sleep(self.timeout)
+            raise GatewayTimeout(f"Payment gateway did not respond in {self.timeout}s")
+        time.sleep(self.latency)
+        with self.charges_lock:
+            if idempotency_key is not None and idempotency_key in self.charges:
+                return self.charges[idempotency_key]
+
+            if token == 'card_error':
+                raise CardError("Your card has been declined")
+            elif token == 'payment_error':
+                raise PaymentError("Something went wrong with your transaction")
+            elif currency not in self.supported_currencies:
+                raise CurrencyError(f"Currency {currency} not supported")
+            else:
+                result = PaymentResult(amount, currency)
+                if idempotency_key is not None:
+                    self.charges[idempotency_key] = result
+                return result
+
+    def refund(self, idempotency_key):
+        """ Function which refunds charge made with given idempotency key. """
+        time.sleep(self.latency)
+        with self.charges_lock:
+            if self.charges.pop(idempotency_key, None) is None:
+                raise PaymentError("Charge to refund does not exist")
+
+
+class GatewayClient:
+    """ Thread safe payment gateway client, which reuses at most 'pool_size'
+    connections and retries transient errors with exponential backoff. """
+    def __init__(self, pool_size=10, timeout=5, retries=3, backoff=0.1, latency=0):
+        self.pool = queue.LifoQueue()
+        self.slots = threading.BoundedSemaphore(pool_size)
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.latency = latency
+
+    def connect(self):
+        """ Function which opens new connection to payment gateway. """
+        return PaymentGateway(latency=self.latency, timeout=self.timeout)
+
+    @contextmanager
+    def connection(self):
+        """ Context manager which borrows pooled connection, waiting
+        at most 'timeout' seconds for one to be returned. """
+        if not self.slots.acquire(timeout=self.timeout):
+            raise GatewayTimeout(f"No payment gateway connection available in {self.timeout}s")
+        try:
+            try:
+                gateway = self.pool.get_nowait()
+            except queue.Empty:
+                gateway = self.connect()
+            yield gateway
+            self.pool.put(gateway)
+        finally:
+            self.slots.release()
+
+    def charge(self, amount, token, currency='EUR', idempotency_key=None):
+        """ Function which charges through pooled connection, retrying on PaymentError.
+        Retries are safe only when 'idempotency_key' is given. """
+        for attempt in range(self.retries + 1):
+            try:
+                with self.connection() as gateway:
+                    return gateway.charge(amount, token, currency, idempotency_key=idempotency_key)
+            except PaymentError:
+                if attempt == self.retries:
+                    raise
+                time.sleep(self.backoff * 2 ** attempt)
+
+    def refund(self, idempotency_key):
+        """ Function which refunds charge made with given idempotency key
+        through pooled connection, retrying on PaymentError. """
+        for attempt in range(self.retries + 1):
+            try:
+                with self.connection() as gateway:
+                    return gateway.refund(idempotency_key)
+            except PaymentError:
+                if attempt == self.retries:
+                    raise
+                time.sleep(self.backoff * 2 ** attempt)
+
+
+@lru_cache(maxsize=None)
+def get_gateway_client():
+    """ Function which returns gateway client shared by whole process. """
+    return GatewayClient(
+        pool_size=settings.PAYMENT_GATEWAY_POOL_SIZE,
+        timeout=settings.PAYMENT_GATEWAY_TIMEOUT,
+        retries=settings.PAYMENT_GATEWAY_RETRIES,
+        backoff=settings.PAYMENT_GATEWAY_BACKOFF,
+        latency=settings.PAYMENT_GATEWAY_LATENCY,
+    )
@@ -0,0 +1,59 @@
+import random
+import time
+
+from django.conf import settings
+from django.db import transaction, OperationalError
+
+from api.models import Reservation, Payment
+from api.tasks import charge_payment
+
+
+class PaymentRejected(Exception):
+    """ Raised when reservation can not be paid. """
+
+
+class PaymentInProgress(PaymentRejected):
+    """ Raised when reservation already has pending payment. """
+
+
+def create_payment(reservation, amount, currency=None, token=None):
+    """ Function which creates pending payment of reservation. Reservation is
+    locked, so concurrent requests never create two payments of it. """
+    with transaction.atomic():
+        reservation = Reservation.objects.select_for_update().get(pk=reservation.pk)
+        if reservation.is_paid:
+            raise PaymentRejected("Reservation is already paid")
+        if not reservation.check_is_valid():
+            raise PaymentRejected("Reservation is not longer valid")
+        reservation.payments.fail_stale()
+        if reservation.payments.in_progress().exists():
+            raise PaymentInProgress("Payment of reservation is in progress")
+        return Payment.objects.create(
+            reservation=reservation, amount=amount, currency=currency or 'EUR', token=token or ''
+        )
+
+
+def pay_reservation(reservation, amount, currency=None, token=None):
+    """ Function which creates payment of reservation and charges it within
+    the call, or enqueues the charge when 'queue' payment mode is enabled.
+    Returns the payment. """
+    payment = _retry(create_payment, reservation, amount, currency, token)
+    if settings.PAYMENT_MODE == 'queue':
+        transaction.on_commit(lambda: charge_payment.delay(payment.pk))
+    else:
+        # Charge is idempotent, so it is safely repeated as queued task would be.
+        _retry(charge_payment, payment.pk)
+        payment.refresh_from_db()
+    return payment
+
+
+def _retry(function, *args):
+    """ Function which runs 'function', retrying it with backoff when database was locked. """
+    retries = settings.RESERVATION_CLAIM_RETRIES
+    for attempt in range(retries + 1):
+        try:
+            return function(*args)
+        except OperationalError:
+            if attempt == retries:
+                raise
+            time.sleep(random.uniform(0, 0.005 * 2 ** attempt))
@@ -0,0 +1,46 @@
+import csv
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from rest_framework.renderers import BaseRenderer
+
+
+class EchoBuffer:
+    """ File-like object returning written value, used to stream CSV rows. """
+    def write(self, value):
+        return value
+
+
+class CSVRenderer(BaseRenderer):
+    """ Renderer streaming rows as CSV. """
+    media_type = 'text/csv'
+    format = 'csv'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        """ Function which renders non streamed data, e.g. errors, as rows of keys and values. """
+        items = data.items() if isinstance(data, dict) else [(None, data)]
+        return ''.join(self.stream(('key', 'value'), items))
+
+    def stream(self, columns, rows):
+        """ Function which yields header and rows as CSV lines. """
+        writer = csv.writer(EchoBuffer())
+        yield writer.writerow(columns)
+        for row in rows:
+            yield writer.writerow(row)
+
+
+class NDJSONRenderer(BaseRenderer):
+    """ Renderer streaming rows as newline delimited JSON objects. """
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        """ Function which renders non streamed data, e.g. errors, as single line. """
+        return json.dumps(data, cls=DjangoJSONEncoder) + '\n'
+
+    def stream(self, columns, rows):
+        """ Function which yields rows as JSON lines. """
+        for row in rows:
+            yield json.dumps(dict(zip(columns, row))) + '\n'
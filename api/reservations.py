@@ -0,0 +1,140 @@
+import random
+import time
+
+from django.conf import settings
+from django.db import connection, transaction, IntegrityError, OperationalError
+from django.utils import timezone
+
+from api.models import TicketInfo, Ticket, Reservation, TicketInfoStats, get_reservation_stats
+from api.tasks import schedule_reservations_release
+
+
+# Number of free tickets among which claimers without row locking pick
+# randomly, so concurrent requests rarely race for the same row.
+CLAIM_WINDOW = 10
+
+
+class ReservationError(Exception):
+    pass
+
+class NoTicketsAvailable(ReservationError):
+    pass
+
+class ReservationConflict(ReservationError):
+    pass
+
+
+def get_expire_time(create_time):
+    """ Function which returns expire time of reservation created at given time. """
+    return create_time + timezone.timedelta(minutes=settings.RESERVATION_EXPIRE_MINUTES)
+
+
+def reserve_ticket(ticket_info, retries=None):
+    """ Function which atomically claims free ticket of given kind and creates
+    reservation for it. Claim is retried on conflicts with concurrent requests
+    at most 'retries' times, then ReservationConflict is raised. """
+    def reserve():
+        ticket_id, = _claim_tickets(ticket_info, 1)
+        create_time = timezone.now()
+        reservation = Reservation.objects.create(
+            ticket_id=ticket_id,
+            ticket_info=ticket_info,
+            create_time=create_time,
+            expire_time=get_expire_time(create_time)
+        )
+        transaction.on_commit(lambda: schedule_reservations_release([reservation]))
+        return reservation
+
+    return _claim(reserve, retries)
+
+
+def reserve_tickets(quantities, retries=None):
+    """ Function which reserves many tickets all-or-nothing in single transaction.
+    'quantities' is dictionary mapping TicketInfo objects to numbers of tickets
+    to reserve. Returns list of created reservations. """
+    def reserve():
+        create_time = timezone.now()
+        reservations = [
+            Reservation(
+                ticket_id=ticket_id,
+                ticket_info=ticket_info,
+                create_time=create_time,
+                expire_time=get_expire_time(create_time)
+            )
+            for ticket_info, quantity in quantities.items()
+            for ticket_id in _claim_tickets(ticket_info, quantity)
+        ]
+        Reservation.objects.bulk_create(reservations)
+        # Bulk created reservations send no signals, so statistics are counted here.
+        TicketInfoStats.objects.change({
+            ticket_info.pk: get_reservation_stats(is_valid=True, is_paid=False, price=0, count=quantity)
+            for ticket_info, quantity in quantities.items()
+        })
+        return [reservation.ticket_id for reservation in reservations]
+
+    ticket_ids = _claim(reserve, retries)
+    reservations = list(Reservation.objects.filter(ticket_id__in=ticket_ids).select_related('ticket_info__event'))
+    schedule_reservations_release(reservations)
+    return reservations
+
+
+def _claim(reserve, retries):
+    """ Function which runs 'reserve' in transaction, retrying it when claimed
+    tickets were taken by concurrent request or database was locked. """
+    retries = settings.RESERVATION_CLAIM_RETRIES if retries is None else retries
+    for attempt in range(retries + 1):
+        try:
+            with transaction.atomic():
+                return reserve()
+        except (IntegrityError, OperationalError):
+            time.sleep(random.uniform(0, 0.005 * 2 ** attempt))
+    raise ReservationConflict(f"Unable to claim tickets after {retries} retries")
+
+
+def _claim_tickets(ticket_info, count):
+    """ Function which claims 'count' tickets of given kind, decreasing its
+    available tickets counter, and returns their primary keys. Must be run
+    in transaction. """
+    if ticket_info.inventory_mode == TicketInfo.InventoryMode.COUNTER:
+        return _allocate_tickets(ticket_info, count)
+
+    ticket_ids = _get_free_ticket_ids(ticket_info, count)
+    TicketInfo.objects.change_available({ticket_info.pk: -count})
+    return ticket_ids
+
+
+def _allocate_tickets(ticket_info, count):
+    """ Function which takes 'count' seats from available tickets counter
+    of counter inventory and creates tickets objects for them. """
+    if not TicketInfo.objects.take_available(ticket_info.pk, count):
+        raise NoTicketsAvailable(f"Not enough available tickets of kind '{ticket_info.kind}'")
+
+    tickets = [Ticket(ticket_info=ticket_info) for _ in range(count)]
+    if connection.features.can_return_rows_from_bulk_insert:
+        Ticket.objects.bulk_create(tickets)
+    else:
+        for ticket in tickets:
+            ticket.save()
+    return [ticket.pk for ticket in tickets]
+
+
+def get_free_tickets(ticket_info):
+    """ Function which returns not reserved tickets of given kind in primary key order. """
+    return Ticket.objects.filter(ticket_info=ticket_info, reservation__isnull=True).order_by('pk')
+
+
+def _get_free_ticket_ids(ticket_info, count):
+    """ Function which returns primary keys of 'count' free tickets of given kind,
+    claimed with row lock where database supports it. Must be run in transaction. """
+    tickets = get_free_tickets(ticket_info)
+    if connection.features.has_select_for_update_skip_locked:
+        ticket_ids = list(tickets.select_for_update(skip_locked=True, of=('self',)).values_list('pk', flat=True)[:count])
+    else:
+        # Without row locking the unique constraint on Reservation.ticket settles
+        # the claim, so concurrent requests spread among first free tickets.
+        ticket_ids = list(tickets.values_list('pk', flat=True)[:count + CLAIM_WINDOW])
+        ticket_ids = random.sample(ticket_ids, min(count, len(ticket_ids)))
+
+    if len(ticket_ids) < count:
+        raise NoTicketsAvailable(f"Not enough available tickets of kind '{ticket_info.kind}'")
+    return ticket_ids
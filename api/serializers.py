@@ -1,6 +1,7 @@
+from django.conf import settings
 from rest_framework import serializers
 
-from api.models import Event, TicketInfo, Ticket, Reservation
+from api.models import Event, TicketInfo, Ticket, Reservation, Payment
 
 
 class EventSerializer(serializers.ModelSerializer):
@@ -15,11 +16,30 @@ class EventSerializer(serializers.ModelSerializer):
 class TicketInfoSerializer(serializers.ModelSerializer):
     """ Serializer for TicketInfo objects. """
     event = serializers.SlugRelatedField(queryset=Event.objects.all(), slug_field='name')
-    left = serializers.IntegerField(source='get_available_tickets_count', read_only=True)
+    left = serializers.IntegerField(source='available', read_only=True)
+    status = serializers.CharField(source='provisioning_status', read_only=True)
 
     class Meta:
         model = TicketInfo
-        fields = ['kind', 'event', 'price', 'quantity', 'left']
+        fields = ['kind', 'event', 'price', 'quantity', 'left', 'inventory_mode', 'status']
+
+    def validate_quantity(self, value):
+        """ Function which prevents reducing quantity below number of reserved
+        tickets, as only free tickets are deleted. """
+        if value < 0:
+            raise serializers.ValidationError("Quantity can't be negative")
+        if self.instance is not None and value < self.instance.quantity:
+            reserved = self.instance.get_valid_reservations_count()
+            if value < reserved:
+                raise serializers.ValidationError(f"Quantity can't be lower than {reserved} reserved tickets")
+        return value
+
+    def validate_inventory_mode(self, value):
+        """ Function which prevents changing inventory mode of existing tickets,
+        as it requires converting tickets objects. """
+        if self.instance is not None and value != self.instance.inventory_mode:
+            raise serializers.ValidationError("Inventory mode can be changed only by 'convert_inventory' command")
+        return value
 
         
 class TicketSerializer(serializers.ModelSerializer):
@@ -40,8 +60,37 @@ class ReservationSerializer(serializers.ModelSerializer):
         fields = ['event', 'kind', 'create_time', 'expire_time', 'is_paid', 'is_valid']
 
 
+class BulkReservationItemSerializer(serializers.Serializer):
+    """ Serializer for single ticket kind of bulk reservation. """
+    ticket = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=1)
+
+
+class BulkReservationSerializer(serializers.Serializer):
+    """ Serializer for handling bulk reservation of many tickets. """
+    tickets = BulkReservationItemSerializer(many=True, allow_empty=False)
+
+    def validate_tickets(self, value):
+        """ Function which merges quantities of repeated ticket kinds
+        and checks total number of reserved tickets. """
+        quantities = {}
+        for item in value:
+            quantities[item['ticket']] = quantities.get(item['ticket'], 0) + item['quantity']
+        if sum(quantities.values()) > settings.RESERVATION_BULK_LIMIT:
+            raise serializers.ValidationError(f"Unable to reserve more than {settings.RESERVATION_BULK_LIMIT} tickets at once")
+        return quantities
+
+
 class PaymentSerializer(serializers.Serializer):
     """ Serializer for handling Payment Gateway. """
-    amount = serializers.IntegerField()
+    amount = serializers.DecimalField(max_digits=8, decimal_places=2)
     currency = serializers.CharField(max_length=10, required=False)
-    token = serializers.CharField(max_length=20, required=False)
\ No newline at end of file
+    token = serializers.CharField(max_length=20, required=False)
+
+
+class PaymentStatusSerializer(serializers.ModelSerializer):
+    """ Serializer for Payment objects. """
+
+    class Meta:
+        model = Payment
+        fields = ['reservation', 'amount', 'currency', 'status', 'error', 'create_time', 'update_time']
@@ -0,0 +1,6 @@
+from django.dispatch import Signal
+
+
+# Sent after commit of transaction which changed availability or state of
+# tickets, with 'ticket_info_ids' argument listing affected ticket kinds.
+inventory_changed = Signal()
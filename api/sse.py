@@ -0,0 +1,203 @@
+import asyncio
+import json
+import logging
+from urllib.parse import parse_qs
+
+from django.conf import settings
+from django.db import close_old_connections, DatabaseError
+from django.utils import timezone
+
+from api.async_views import executor
+from api.models import TicketInfo
+
+
+logger = logging.getLogger(__name__)
+
+
+def run_query(function, *args):
+    """ Function which runs database query in thread pool of async views. """
+    def query():
+        close_old_connections()
+        try:
+            return function(*args)
+        finally:
+            close_old_connections()
+    return asyncio.get_event_loop().run_in_executor(executor, query)
+
+
+def get_changed_available(since):
+    """ Function which returns numbers of tickets left of ticket kinds modified
+    after given time, along with time of the latest modification. """
+    rows = list(TicketInfo.objects.filter(modified_time__gt=since).values_list('pk', 'available', 'modified_time'))
+    latest = max((modified_time for _, _, modified_time in rows), default=since)
+    return {pk: available for pk, available, _ in rows}, latest
+
+
+def get_available(ticket_info_ids):
+    """ Function which returns numbers of tickets left of given ticket kinds, or all of them. """
+    ticket_infos = TicketInfo.objects.all()
+    if ticket_info_ids is not None:
+        ticket_infos = ticket_infos.filter(pk__in=ticket_info_ids)
+    return dict(ticket_infos.values_list('pk', 'available'))
+
+
+class Subscriber:
+    """ Stream subscribed to availability of given ticket kinds, or all of them.
+    Changes are merged into 'pending' until stream sends them, so slow client
+    holds at most one change of every ticket kind. """
+    def __init__(self, ticket_info_ids):
+        self.ticket_info_ids = ticket_info_ids
+        self.pending = {}
+        self.changed = asyncio.Event()
+
+    def add(self, changes):
+        """ Function which merges (left, delta) changes of ticket kinds into pending ones. """
+        for pk, (left, delta) in changes.items():
+            if self.ticket_info_ids is None or pk in self.ticket_info_ids:
+                previous_delta = self.pending[pk][1] if pk in self.pending else 0
+                self.pending[pk] = (left, previous_delta + delta)
+                self.changed.set()
+
+    def take(self):
+        """ Function which returns pending changes and forgets them. """
+        pending, self.pending = self.pending, {}
+        self.changed.clear()
+        return pending
+
+
+class AvailabilityBroadcaster:
+    """ Broadcaster polling ticket kinds modified since its last poll every
+    SSE_POLL_INTERVAL seconds and passing changed numbers of tickets left to
+    subscribers. Single poll serves all streams of the process and runs only
+    while any stream is open. Changes are seen whichever process made them. """
+    def __init__(self):
+        self.subscribers = set()
+        self.available = {}
+        self.task = None
+
+    def subscribe(self, ticket_info_ids):
+        subscriber = Subscriber(ticket_info_ids)
+        self.subscribers.add(subscriber)
+        if self.task is None:
+            self.task = asyncio.ensure_future(self.poll())
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        self.subscribers.discard(subscriber)
+
+    async def poll(self):
+        """ Function which polls changes until all subscribers leave. """
+        # Transactions commit after their modification time, so polls overlap
+        # by SSE_POLL_OVERLAP seconds and unchanged repeated rows are skipped.
+        overlap = timezone.timedelta(seconds=settings.SSE_POLL_OVERLAP)
+        since = timezone.now()
+        self.available = None
+        try:
+            while self.subscribers:
+                try:
+                    if self.available is None:
+                        self.available = await run_query(get_available, None)
+                    else:
+                        available, latest = await run_query(get_changed_available, since - overlap)
+                        since = max(since, latest)
+                        self.broadcast(available)
+                except DatabaseError:
+                    # Streams stay open, changes are picked up by next poll.
+                    logger.exception("Polling availability failed")
+                await asyncio.sleep(settings.SSE_POLL_INTERVAL)
+        finally:
+            self.task = None
+
+    def broadcast(self, available):
+        """ Function which passes changed numbers of tickets left to subscribers. """
+        changes = {}
+        for pk, left in available.items():
+            # Ticket kinds created since previous poll are sent without change.
+            previous = self.available.get(pk)
+            self.available[pk] = left
+            if previous is None:
+                changes[pk] = (left, 0)
+            elif previous != left:
+                changes[pk] = (left, left - previous)
+        if changes:
+            for subscriber in list(self.subscribers):
+                subscriber.add(changes)
+
+
+broadcaster = AvailabilityBroadcaster()
+
+
+def format_event(name, data):
+    """ Function which returns server-sent event of given name and JSON data. """
+    return f"event: {name}\ndata: {json.dumps(data)}\n\n".encode()
+
+
+async def availability_stream(scope, receive, send):
+    """ ASGI application streaming numbers of tickets left of ticket kinds passed
+    as comma separated 'tickets' parameter, or of all of them, as server-sent
+    events. 'snapshot' event holds current numbers, following 'availability'
+    events hold changed ones along with their change since previous event.
+    Changes are debounced, so stream sends at most one event every SSE_DEBOUNCE
+    seconds however many reservations are made. """
+    if scope['type'] != 'http':
+        return
+    try:
+        value = parse_qs(scope['query_string'].decode()).get('tickets', [''])[0]
+        ticket_info_ids = {int(pk) for pk in value.split(',') if pk} or None
+    except ValueError:
+        await send({'type': 'http.response.start', 'status': 400, 'headers': [(b'content-type', b'text/plain')]})
+        await send({'type': 'http.response.body', 'body': b"Parameter 'tickets' must be a list of integers"})
+        return
+
+    await send({'type': 'http.response.start', 'status': 200, 'headers': [
+        (b'content-type', b'text/event-stream'),
+        (b'cache-control', b'no-cache'),
+        # Proxies must pass events at once instead of buffering them.
+        (b'x-accel-buffering', b'no'),
+    ]})
+    subscriber = broadcaster.subscribe(ticket_info_ids)
+    disconnected = asyncio.ensure_future(wait_disconnect(receive))
+    try:
+        snapshot = await run_query(get_available, ticket_info_ids)
+        await send_body(send, format_event('snapshot', {"tickets": format_changes(snapshot)}))
+        while not disconnected.done():
+            changed = asyncio.ensure_future(subscriber.changed.wait())
+            await asyncio.wait([changed, disconnected], timeout=settings.SSE_HEARTBEAT, return_when=asyncio.FIRST_COMPLETED)
+            if disconnected.done():
+                changed.cancel()
+                break
+            if not changed.done():
+                changed.cancel()
+                await send_body(send, b": heartbeat\n\n")
+                continue
+            # Changes coming during debounce are sent along in single event.
+            await asyncio.sleep(settings.SSE_DEBOUNCE)
+            changes = subscriber.take()
+            await send_body(send, format_event('availability', {"tickets": format_changes(changes)}))
+    finally:
+        broadcaster.unsubscribe(subscriber)
+        disconnected.cancel()
+    await send({'type': 'http.response.body', 'body': b''})
+
+
+def format_changes(changes):
+    """ Function which returns list of changes of ticket kinds, given either
+    as numbers of tickets left or as (left, delta) pairs. """
+    items = []
+    for pk, change in sorted(changes.items()):
+        left, delta = change if isinstance(change, tuple) else (change, None)
+        item = {"id": pk, "left": left}
+        if delta is not None:
+            item["delta"] = delta
+        items.append(item)
+    return items
+
+
+async def send_body(send, body):
+    await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+
+
+async def wait_disconnect(receive):
+    """ Function which waits until client disconnects. """
+    while (await receive())['type'] != 'http.disconnect':
+        pass
@@ -0,0 +1,103 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from api.models import (
+    SUMMARY_FIELDS, STATS_FIELDS, get_reservation_stats, Event, TicketInfo, Reservation, EventStats, TicketInfoStats
+)
+
+
+def get_event_summaries(pks):
+    """ Function which returns dictionary mapping primary keys of existing
+    events to their reservations summary and revenue. """
+    return _get_summaries(Event.objects, pks)
+
+
+def get_ticket_info_summaries(pks):
+    """ Function which returns dictionary mapping primary keys of existing
+    ticket kinds to their reservations summary and revenue. """
+    return _get_summaries(TicketInfo.objects, pks)
+
+
+def _get_summaries(manager, pks):
+    """ Function which reads summaries from maintained statistics, joined to objects
+    by primary key. Objects without statistics are summarized from reservations. """
+    rows = manager.filter(pk__in=pks).values_list('pk', *(f'stats__{field}' for field in STATS_FIELDS))
+    summaries = {pk: dict(zip(STATS_FIELDS, values)) for pk, *values in rows if values[0] is not None}
+    missing = [pk for pk, *values in rows if values[0] is None]
+    if missing:
+        summaries.update({row.pop('pk'): row for row in manager.filter(pk__in=missing).summarize_stats()})
+    return {pk: format_summary(summary) for pk, summary in summaries.items()}
+
+
+def format_summary(summary):
+    """ Function which returns summary in form served by API. """
+    return {
+        "reservations": {field: summary[field] for field in SUMMARY_FIELDS},
+        "revenue": str(summary['revenue']),
+    }
+
+
+def compute():
+    """ Function which returns statistics of all ticket kinds and events, computed
+    from reservations, as lists of unsaved TicketInfoStats and EventStats objects. """
+    tickets_info_stats = [
+        TicketInfoStats(ticket_info_id=row.pop('pk'), **row) for row in TicketInfo.objects.summarize_stats()
+    ]
+    events_stats = [EventStats(event_id=row.pop('pk'), **row) for row in Event.objects.summarize_stats()]
+    return tickets_info_stats, events_stats
+
+
+def rebuild():
+    """ Function which replaces maintained statistics by ones computed from reservations.
+    Reservations changed while it runs may be miscounted, so it is meant
+    for quiet periods, e.g. after loading data or deploying statistics. """
+    with transaction.atomic():
+        tickets_info_stats, events_stats = compute()
+        TicketInfoStats.objects.all().delete()
+        EventStats.objects.all().delete()
+        TicketInfoStats.objects.bulk_create(tickets_info_stats, batch_size=1000)
+        EventStats.objects.bulk_create(events_stats, batch_size=1000)
+    return tickets_info_stats, events_stats
+
+
+@receiver(post_save, sender=Event)
+def create_event_stats(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        EventStats.objects.create(event=instance)
+
+
+@receiver(post_save, sender=TicketInfo)
+def create_ticket_info_stats(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        TicketInfoStats.objects.create(ticket_info=instance)
+
+
+@receiver(post_save, sender=Reservation)
+def count_saved_reservation(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    state = instance.get_state()
+    previous = getattr(instance, '_stored_state', None)
+    if created or previous is None:
+        previous = None
+    if state != previous:
+        differences = _get_state_stats(instance, state)
+        if previous is not None:
+            for field, value in _get_state_stats(instance, previous).items():
+                differences[field] -= value
+        TicketInfoStats.objects.change({instance.ticket_info_id: differences})
+    instance._stored_state = state
+
+
+@receiver(post_delete, sender=Reservation)
+def count_deleted_reservation(sender, instance, **kwargs):
+    stats = _get_state_stats(instance, getattr(instance, '_stored_state', instance.get_state()))
+    TicketInfoStats.objects.change({instance.ticket_info_id: {field: -value for field, value in stats.items()}})
+
+
+def _get_state_stats(reservation, state):
+    """ Function which returns contribution of reservation in given state to statistics. """
+    is_valid, is_paid = state
+    price = reservation.ticket_info.price if is_valid and is_paid else 0
+    return get_reservation_stats(is_valid, is_paid, price)
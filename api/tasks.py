@@ -1,18 +1,214 @@
 from __future__ import absolute_import
 
+import logging
+import time
+
 from celery import shared_task
+from django.conf import settings
+from django.db import connection, transaction, OperationalError
 from django.utils import timezone
 
-from .models import Reservation
+from . import admission
+from .idempotency import get_expire_time as get_idempotency_key_expire_time
+from .models import TicketInfo, Reservation, Payment, IdempotencyKey, SweeperCheckpoint, TicketInfoStats
+from .payment_gateway import get_gateway_client, CardError, CurrencyError, PaymentError
+from .signals import inventory_changed
+
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def release_expired_reservations(batch_size=None, max_batches=None, full=False):
+    """ Periodically run task, which releases expired reservations. Reservations
+    are walked by expire time in bounded batches, starting RESERVATION_SWEEP_LOOKBACK
+    minutes before high-water mark persisted by previous run, so every run costs
+    the same regardless of table size, while reservations skipped by previous
+    runs, e.g. locked or pending payment, are retried. Pending payments past
+    PAYMENT_PENDING_TIMEOUT are marked failed first. Pass 'full' to walk all
+    reservations from the beginning, leaving the high-water mark untouched. """
+    batch_size = batch_size or settings.RESERVATION_SWEEP_BATCH_SIZE
+    max_batches = max_batches or settings.RESERVATION_SWEEP_MAX_BATCHES
+    # Reservations of payments lost e.g. with their worker are released below.
+    timed_out_payments = Payment.objects.fail_stale()
+    checkpoint, _ = SweeperCheckpoint.objects.get_or_create(name='release_expired_reservations')
+    position = None
+    if not full and checkpoint.position is not None:
+        position = checkpoint.position - timezone.timedelta(minutes=settings.RESERVATION_SWEEP_LOOKBACK)
+    now = timezone.now()
+    released = 0
+    latencies = []
+
+    while len(latencies) < max_batches:
+        start = time.perf_counter()
+        with transaction.atomic():
+            batch = _get_expired_batch(position, now, batch_size)
+            if batch:
+                released += _release_batch(batch)
+        latencies.append((time.perf_counter() - start) * 1000)
+        if batch:
+            position = batch[-1][2]
+        if len(batch) < batch_size:
+            break
+
+    # Mark only moves forward, full runs would move it back to their last batch.
+    if not full and position is not None and (checkpoint.position is None or position > checkpoint.position):
+        checkpoint.position = position
+        checkpoint.save(update_fields=['position'])
+
+    metrics = {
+        "released": released,
+        "timed_out_payments": timed_out_payments,
+        "batches": len(latencies),
+        "max_batch_ms": round(max(latencies), 3),
+        "mean_batch_ms": round(sum(latencies) / len(latencies), 3),
+    }
+    logger.info("Released %(released)d expired reservations in %(batches)d batches, "
+                "max batch %(max_batch_ms).3f ms", metrics)
+    return metrics
 
 
 @shared_task
-def release_expired_reservations():
-    """ Periodically run task, which releases expired reservations. """
-    reservations = Reservation.objects.filter(expire_time__lt=timezone.now(), ticket__isnull=False, is_paid=False)
-    if reservations:
-        total = reservations.count()
-        reservations.update(ticket=None)
-        return f"Released {total} expired reservations"
-    else:
-        return "No expired reservations"
\ No newline at end of file
+def delete_expired_idempotency_keys():
+    """ Periodically run task, which deletes stored idempotency keys older
+    than their TTL and returns number of deleted ones. """
+    deleted, _ = IdempotencyKey.objects.filter(create_time__lt=get_idempotency_key_expire_time()).delete()
+    logger.info("Deleted %d expired idempotency keys", deleted)
+    return deleted
+
+
+@shared_task
+def delete_expired_admission_token_uses():
+    """ Periodically run task, which deletes uses of admission tokens
+    already expired and returns number of deleted ones. """
+    deleted = admission.delete_expired_uses()
+    logger.info("Deleted %d uses of expired admission tokens", deleted)
+    return deleted
+
+
+@shared_task(autoretry_for=(OperationalError,), retry_backoff=True, max_retries=5)
+def release_reservation(reservation_id):
+    """ Task scheduled at reservation expire time, which releases its ticket
+    unless reservation was paid or released in the meantime. """
+    return bool(Reservation.objects.filter(pk=reservation_id, expire_time__lte=timezone.now()).release())
+
+
+def get_release_task_id(reservation_id):
+    """ Function which returns id of task releasing given reservation. """
+    return f"release-reservation-{reservation_id}"
+
+
+def schedule_reservations_release(reservations):
+    """ Function which schedules release of given reservations exactly
+    at their expire time, when 'eta' expiry mode is enabled. """
+    if settings.RESERVATION_EXPIRY_MODE != 'eta':
+        return
+    for reservation in reservations:
+        release_reservation.apply_async(
+            args=[reservation.pk], eta=reservation.expire_time, task_id=get_release_task_id(reservation.pk)
+        )
+
+
+def cancel_reservation_release(reservation):
+    """ Function which cancels scheduled release of paid reservation. """
+    if settings.RESERVATION_EXPIRY_MODE != 'eta':
+        return
+    release_reservation.AsyncResult(get_release_task_id(reservation.pk)).revoke()
+
+
+@shared_task(autoretry_for=(OperationalError,), retry_backoff=True, max_retries=5)
+def charge_payment(payment_id):
+    """ Task which charges pending payment through pooled gateway client and marks
+    its reservation paid. Charge is sent with payment's idempotency key, so
+    retried task never bills twice. Returns status of the payment. """
+    payment = Payment.objects.select_related('reservation__ticket_info').get(pk=payment_id)
+    if payment.status != Payment.Status.PENDING:
+        return payment.status
+
+    # Payment past its deadline may have released its ticket, so it is never charged.
+    if Payment.objects.filter(pk=payment_id).fail_stale():
+        Reservation.objects.filter(pk=payment.reservation_id, expire_time__lte=timezone.now()).release()
+        return Payment.Status.FAILED
+    # Deadline is counted from the start of the charge.
+    if not Payment.objects.filter(pk=payment_id, status=Payment.Status.PENDING).update(update_time=timezone.now()):
+        return Payment.objects.values_list('status', flat=True).get(pk=payment_id)
+
+    try:
+        get_gateway_client().charge(payment.amount, payment.token, payment.currency,
+                                    idempotency_key=str(payment.idempotency_key))
+    except (CardError, CurrencyError, PaymentError) as error:
+        Payment.objects.filter(pk=payment_id).update(
+            status=Payment.Status.FAILED, error=str(error)[:200], update_time=timezone.now()
+        )
+        # Release held back while payment was pending.
+        Reservation.objects.filter(pk=payment.reservation_id, expire_time__lte=timezone.now()).release()
+        return Payment.Status.FAILED
+
+    with transaction.atomic():
+        # Payment failed or reservation released meanwhile, e.g. by periodic task, is not paid.
+        is_paid = (
+            Payment.objects.filter(pk=payment_id, status=Payment.Status.PENDING)
+            .update(status=Payment.Status.SUCCEEDED, update_time=timezone.now())
+            and Reservation.objects.filter(pk=payment.reservation_id, is_paid=False, ticket__isnull=False)
+            .update(is_paid=True)
+        )
+        if is_paid:
+            TicketInfoStats.objects.change({
+                payment.reservation.ticket_info_id: {'paid': 1, 'unpaid': -1, 'revenue': payment.reservation.ticket_info.price}
+            })
+        else:
+            transaction.set_rollback(True)
+    if not is_paid:
+        return refund_payment(payment)
+
+    cancel_reservation_release(payment.reservation)
+    inventory_changed.send(sender=Reservation, ticket_info_ids=[payment.reservation.ticket_info_id])
+    return Payment.Status.SUCCEEDED
+
+
+def refund_payment(payment):
+    """ Function which refunds charge of payment whose reservation can not be paid
+    anymore and marks it failed. Charges failing to refund are flagged in payment's
+    error, so they are refunded by hand. Returns status of the payment. """
+    try:
+        get_gateway_client().refund(str(payment.idempotency_key))
+        error = "Reservation was released during charge, charge was refunded"
+    except PaymentError:
+        logger.exception("Unable to refund payment %d", payment.pk)
+        error = "Reservation was released during charge, refund failed"
+    Payment.objects.filter(pk=payment.pk).update(status=Payment.Status.FAILED, error=error, update_time=timezone.now())
+    return Payment.Status.FAILED
+
+
+@shared_task(autoretry_for=(OperationalError,), retry_backoff=True, max_retries=5)
+def provision_tickets(ticket_info_id):
+    """ Task which creates or deletes tickets of ticket kind in batches until
+    their number matches its quantity. Kinds deleted meanwhile are skipped. """
+    ticket_info = TicketInfo.objects.filter(pk=ticket_info_id).first()
+    if ticket_info is not None:
+        ticket_info.provision_tickets()
+
+
+def get_expired_reservations(now, position=None):
+    """ Function which returns expired reservations still holding unpaid tickets
+    ordered by expire time, starting from 'position' when given. """
+    reservations = Reservation.objects.filter(is_paid=False, expire_time__lt=now, ticket__isnull=False)
+    if position is not None:
+        reservations = reservations.filter(expire_time__gte=position)
+    return reservations.order_by('expire_time', 'pk')
+
+
+def _get_expired_batch(position, now, batch_size):
+    """ Function which returns list of (pk, ticket_info_id, expire_time) tuples
+    of next batch of expired reservations, locked where database supports it. """
+    reservations = get_expired_reservations(now, position)
+    if connection.features.has_select_for_update_skip_locked:
+        reservations = reservations.select_for_update(skip_locked=True)
+    reservations = reservations.values_list('pk', 'ticket_info_id', 'expire_time')
+    return list(reservations[:batch_size])
+
+
+def _release_batch(batch):
+    """ Function which releases tickets of given reservations batch and returns
+    number of released reservations. Reservations paid in the meantime are skipped. """
+    return Reservation.objects.filter(pk__in=[pk for pk, _, _ in batch]).release()
@@ -0,0 +1,149 @@
+from unittest import mock
+
+from django.urls import reverse
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from api.tests.test_models import create_sample_event, create_sample_ticket_info
+from api.models import Reservation, AdmissionQueue, AdmissionTokenUse
+from api.reservations import ReservationConflict
+from api.tasks import delete_expired_admission_token_uses
+
+
+def ticket_info_queue_url(id_):
+    """ Returns ticket info admission queue URL. """
+    return reverse('ticketinfo-queue', args=[id_])
+
+
+def ticket_info_reserve_url(id_):
+    """ Returns ticket info reserve URL. """
+    return reverse('ticketinfo-reserve', args=[id_])
+
+
+@override_settings(ADMISSION_ENABLED=True, ADMISSION_RATE=2)
+class AdmissionTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.ticket_info = create_sample_ticket_info(event=create_sample_event())
+        self.now = 1000.0
+        patcher = mock.patch('api.admission.time.time', side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+    def join(self):
+        response = self.client.post(ticket_info_queue_url(self.ticket_info.id))
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return response.data
+
+
+    def test_queue_admits_in_order_at_rate(self):
+        """ Test queued clients are admitted in order of joining, at configured rate. """
+        statuses = [self.join() for _ in range(5)]
+        self.assertEqual([status_['position'] for status_ in statuses], [1, 2, 3, 4, 5])
+        self.assertEqual([status_['admitted'] for status_ in statuses], [True, True, False, False, False])
+        self.assertEqual(statuses[4]['eta'], 2)
+
+        self.now += 1
+        response = self.client.get(ticket_info_queue_url(self.ticket_info.id), {'token': statuses[4]['token']})
+        self.assertEqual(response.data['ahead'], 1)
+        self.assertFalse(response.data['admitted'])
+        self.now += 0.5
+        response = self.client.get(ticket_info_queue_url(self.ticket_info.id), {'token': statuses[4]['token']})
+        self.assertTrue(response.data['admitted'])
+
+
+    def test_reserve_requires_admitted_token(self):
+        """ Test reserving is accepted only with admitted, unused token of the ticket kind. """
+        url = ticket_info_reserve_url(self.ticket_info.id)
+        first, second, third = [self.join()['token'] for _ in range(3)]
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_403_FORBIDDEN)
+
+        response = self.client.get(url, HTTP_ADMISSION_TOKEN=third)
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(response['Retry-After'], '1')
+
+        response = self.client.get(url, HTTP_ADMISSION_TOKEN=first)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        response = self.client.get(url, HTTP_ADMISSION_TOKEN=first)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(Reservation.objects.count(), 1)
+
+
+    def test_failed_reservation_keeps_token(self):
+        """ Test token of conflicting reservation admits its retry, sent with the same idempotency key. """
+        url = ticket_info_reserve_url(self.ticket_info.id)
+        token = self.join()['token']
+        with mock.patch('api.views.reserve_ticket', side_effect=ReservationConflict()):
+            response = self.client.get(url, HTTP_ADMISSION_TOKEN=token, HTTP_IDEMPOTENCY_KEY='key')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        response = self.client.get(url, HTTP_ADMISSION_TOKEN=token, HTTP_IDEMPOTENCY_KEY='key')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+
+    def test_bulk_with_used_token_keeps_other_tokens(self):
+        """ Test bulk reservation rejected for used token of one kind does not use up token of other kind. """
+        vip = create_sample_ticket_info(kind='VIP', event=self.ticket_info.event)
+        normal_token = self.join()['token']
+        self.client.post(ticket_info_queue_url(vip.id))
+        vip_token = self.client.post(ticket_info_queue_url(vip.id)).data['token']
+        self.now += 1
+        self.assertEqual(self.client.get(ticket_info_reserve_url(vip.id), HTTP_ADMISSION_TOKEN=vip_token).status_code,
+                         status.HTTP_201_CREATED)
+
+        payload = {'tickets': [{'ticket': self.ticket_info.id, 'quantity': 1}, {'ticket': vip.id, 'quantity': 1}]}
+        response = self.client.post(reverse('reservation-bulk'), payload, format='json',
+                                    HTTP_ADMISSION_TOKEN=f'{normal_token},{vip_token}')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        response = self.client.get(ticket_info_reserve_url(self.ticket_info.id), HTTP_ADMISSION_TOKEN=normal_token)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+
+    def test_token_of_other_ticket_kind(self):
+        """ Test token issued for one ticket kind does not admit to another. """
+        token = self.join()['token']
+        other = create_sample_ticket_info(kind='VIP', event=self.ticket_info.event)
+        response = self.client.get(ticket_info_reserve_url(other.id), HTTP_ADMISSION_TOKEN=token)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        response = self.client.get(ticket_info_queue_url(other.id), {'token': token})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+    def test_empty_queue_does_not_save_up_admissions(self):
+        """ Test clients joining after quiet period are admitted at configured rate. """
+        self.join()
+        self.now += 3600
+        statuses = [self.join() for _ in range(4)]
+        self.assertEqual([status_['admitted'] for status_ in statuses], [True, True, False, False])
+
+
+    def test_positions_are_never_reused(self):
+        """ Test queue positions keep growing, so tokens of new clients are not
+        taken for already used ones. """
+        token = self.join()['token']
+        self.assertEqual(self.client.get(ticket_info_reserve_url(self.ticket_info.id), HTTP_ADMISSION_TOKEN=token).status_code,
+                         status.HTTP_201_CREATED)
+        self.assertEqual(AdmissionQueue.objects.get(pk=self.ticket_info.id).tail, 1)
+        token = self.join()['token']
+        self.assertEqual(self.client.get(ticket_info_reserve_url(self.ticket_info.id), HTTP_ADMISSION_TOKEN=token).status_code,
+                         status.HTTP_201_CREATED)
+
+
+    def test_delete_expired_token_uses(self):
+        """ Test periodic task deletes only uses of expired tokens. """
+        AdmissionTokenUse.objects.create(ticket_info=self.ticket_info, position=1,
+                                         create_time=timezone.now() - timezone.timedelta(hours=2))
+        AdmissionTokenUse.objects.create(ticket_info=self.ticket_info, position=2)
+        self.assertEqual(delete_expired_admission_token_uses(), 1)
+        self.assertEqual(AdmissionTokenUse.objects.get().position, 2)
+
+
+    def test_join_sold_out_ticket_kind(self):
+        """ Test joining queue of ticket kind without available tickets. """
+        self.ticket_info.quantity = 0
+        self.ticket_info.save()
+        response = self.client.post(ticket_info_queue_url(self.ticket_info.id))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,248 @@
+import time
+
+from django.urls import reverse
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from api.allocator import Allocator, AllocatorUnavailable, LEASE_NAME, get_allocator
+from api.tests.test_models import create_sample_event, create_sample_ticket_info
+from api.models import TicketInfo, Reservation, TicketInfoStats, ProcessLease
+from api.reservations import reserve_ticket, NoTicketsAvailable
+
+
+class AllocatorTests(TestCase):
+
+    def setUp(self):
+        self.event = create_sample_event()
+        self.ticket_info = create_sample_ticket_info(event=self.event, quantity=5)
+        self.allocator = Allocator(refill_size=2)
+
+
+    def test_reserve_persisted_on_flush(self):
+        """ Test reservations are handed out at once and persisted by flush. """
+        with self.assertNumQueries(2):
+            reservations = [self.allocator.reserve(self.ticket_info.pk) for _ in range(2)]
+        self.assertNotEqual(reservations[0].ticket_id, reservations[1].ticket_id)
+        self.assertFalse(Reservation.objects.exists())
+
+        self.assertEqual(self.allocator.flush(), 2)
+        self.assertEqual(Reservation.objects.filter(ticket__isnull=False).count(), 2)
+        self.ticket_info.refresh_from_db()
+        self.assertEqual(self.ticket_info.available, 3)
+        self.assertEqual(TicketInfoStats.objects.get(pk=self.ticket_info.pk).valid, 2)
+
+
+    def test_reserve_sold_out(self):
+        """ Test allocator refills pool until all tickets are handed out. """
+        ticket_ids = {self.allocator.reserve(self.ticket_info.pk).ticket_id for _ in range(5)}
+        self.assertEqual(ticket_ids, set(self.ticket_info.tickets.values_list('pk', flat=True)))
+        with self.assertRaises(NoTicketsAvailable):
+            self.allocator.reserve(self.ticket_info.pk)
+
+
+    def test_recovery_skips_persisted_reservations(self):
+        """ Test new allocator, e.g. after restart, hands out only tickets free in database. """
+        reserved = {self.allocator.reserve(self.ticket_info.pk).ticket_id for _ in range(3)}
+        self.allocator.flush()
+        self.allocator.reserve(self.ticket_info.pk)
+        recovered = Allocator()
+        ticket_ids = {recovered.reserve(self.ticket_info.pk).ticket_id for _ in range(2)}
+        self.assertFalse(ticket_ids & reserved)
+
+
+    def test_flush_drops_tickets_claimed_elsewhere(self):
+        """ Test reservation of ticket reserved meanwhile by database path is persisted released. """
+        self.ticket_info.tickets.exclude(pk=self.ticket_info.tickets.order_by('pk').first().pk).delete()
+        reservation = self.allocator.reserve(self.ticket_info.pk)
+        reserve_ticket(TicketInfo.objects.get(pk=self.ticket_info.pk))
+        with self.assertLogs('api.allocator', 'WARNING'):
+            self.assertEqual(self.allocator.flush(), 0)
+        self.assertFalse(Reservation.objects.get(token=reservation.token).check_is_valid())
+        stats = TicketInfoStats.objects.get(pk=self.ticket_info.pk)
+        self.assertEqual((stats.total, stats.valid, stats.invalid), (2, 1, 1))
+
+
+    def test_flush_drops_deleted_tickets(self):
+        """ Test reservation of ticket deleted meanwhile is dropped, while other
+        reservations of its kind are persisted. """
+        reservations = [self.allocator.reserve(self.ticket_info.pk) for _ in range(2)]
+        self.ticket_info.tickets.filter(pk=reservations[0].ticket_id).delete()
+        with self.assertLogs('api.allocator', 'WARNING'):
+            self.assertEqual(self.allocator.flush(), 1)
+        self.assertEqual(Reservation.objects.get(token=reservations[1].token).ticket_id, reservations[1].ticket_id)
+        self.assertIsNone(Reservation.objects.get(token=reservations[0].token).ticket_id)
+        self.assertEqual(self.allocator.flush(), 0)
+
+
+    def test_flush_drops_deleted_ticket_kind(self):
+        """ Test reservations of ticket kind deleted meanwhile are dropped. """
+        self.allocator.reserve(self.ticket_info.pk)
+        TicketInfo.objects.filter(pk=self.ticket_info.pk).delete()
+        with self.assertLogs('api.allocator', 'WARNING'):
+            self.assertEqual(self.allocator.flush(), 0)
+        self.assertFalse(Reservation.objects.exists())
+
+
+    def test_quantity_change_invalidates_pool(self):
+        """ Test ticket kind whose quantity was reduced is no longer reserved from stale pool. """
+        with self.settings(RESERVATION_ALLOCATOR=True, ALLOCATOR_FLUSH_INTERVAL=None):
+            get_allocator.cache_clear()
+            self.addCleanup(get_allocator.cache_clear)
+            allocator = get_allocator()
+            self.addCleanup(allocator.close)
+            allocator.reserve(self.ticket_info.pk)
+            ticket_info = TicketInfo.objects.get(pk=self.ticket_info.pk)
+            ticket_info.quantity = 1
+            ticket_info.save()
+            ticket_info.provision_tickets()
+            with self.assertRaises(NoTicketsAvailable):
+                allocator.reserve(self.ticket_info.pk)
+            self.assertEqual(allocator.flush(), 1)
+
+
+    def test_flush_invalidates_pool_changed_elsewhere(self):
+        """ Test flush notices ticket kind changed by other process and reloads it. """
+        self.allocator.reserve(self.ticket_info.pk)
+        TicketInfo.objects.filter(pk=self.ticket_info.pk).update(quantity=1)
+        self.ticket_info.refresh_from_db()
+        self.ticket_info.provision_tickets()
+        self.assertEqual(self.allocator.flush(), 1)
+        with self.assertRaises(NoTicketsAvailable):
+            self.allocator.reserve(self.ticket_info.pk)
+        self.assertEqual(self.allocator.shards[self.ticket_info.pk].ticket_info.quantity, 1)
+
+
+    def test_reserve_many_all_or_nothing(self):
+        """ Test reserving many kinds at once hands out nothing when any kind is sold out. """
+        vip = create_sample_ticket_info(kind='VIP', event=self.event, quantity=1)
+        with self.assertRaises(NoTicketsAvailable):
+            self.allocator.reserve_many({self.ticket_info.pk: 3, vip.pk: 2})
+        reservations = self.allocator.reserve_many({self.ticket_info.pk: 5, vip.pk: 1})
+        self.assertEqual(len({reservation.ticket_id for reservation in reservations}), 6)
+        self.assertEqual(self.allocator.flush(), 6)
+
+
+    def test_lease_makes_single_owner(self):
+        """ Test allocator of other process refuses to reserve ticket kind while its
+        lease is held, serves other kinds and takes over once owner gives it up. """
+        vip = create_sample_ticket_info(kind='VIP', event=self.event, quantity=2)
+        owner = Allocator(lease_ttl=10)
+        owner.reserve(self.ticket_info.pk)
+        other = Allocator(lease_ttl=10)
+        with self.assertRaises(AllocatorUnavailable):
+            other.reserve(self.ticket_info.pk)
+        other.reserve(vip.pk)
+        with self.assertRaises(AllocatorUnavailable):
+            owner.reserve_many({self.ticket_info.pk: 1, vip.pk: 1})
+        owner.close()
+        other.reserve(self.ticket_info.pk)
+        self.assertEqual(other.flush(), 2)
+        self.assertEqual(Reservation.objects.count(), 3)
+
+
+    def test_lost_lease_stops_reservations(self):
+        """ Test allocator whose lease expired and was taken over stops reserving
+        the kind and drops its pool. """
+        owner = Allocator(lease_ttl=10)
+        owner.reserve(self.ticket_info.pk)
+        ProcessLease.objects.update(expire_time=timezone.now())
+        Allocator(lease_ttl=10).reserve(self.ticket_info.pk)
+        shard = owner.shards[self.ticket_info.pk]
+        shard.lease_deadline = time.monotonic()
+        with self.assertRaises(AllocatorUnavailable):
+            owner.reserve(self.ticket_info.pk)
+        self.assertFalse(shard.free)
+
+
+    def test_leases_are_renewed(self):
+        """ Test leases due for renewal are extended, while lost ones are left. """
+        vip = create_sample_ticket_info(kind='VIP', event=self.event, quantity=2)
+        owner = Allocator(lease_ttl=10)
+        owner.reserve_many({self.ticket_info.pk: 1, vip.pk: 1})
+        soon = timezone.now() + timezone.timedelta(seconds=1)
+        ProcessLease.objects.update(expire_time=soon)
+        ProcessLease.objects.filter(name=f'{LEASE_NAME}:{vip.pk}').update(owner='other')
+        for shard in owner.shards.values():
+            shard.lease_deadline = time.monotonic()
+        owner._renew_leases()
+        self.assertGreater(ProcessLease.objects.get(name=f'{LEASE_NAME}:{self.ticket_info.pk}').expire_time, soon)
+        self.assertEqual(owner.shards[vip.pk].lease_deadline, 0)
+        owner.close()
+        self.assertEqual(list(ProcessLease.objects.values_list('owner', flat=True)), ['other'])
+
+
+    @override_settings(RESERVATION_ALLOCATOR=True, ALLOCATOR_FLUSH_INTERVAL=None)
+    def test_bulk_endpoint_reserves_from_allocator(self):
+        """ Test bulk reservations come from the same pools as single ones,
+        so no ticket handed out by allocator is reserved again. """
+        get_allocator.cache_clear()
+        self.addCleanup(get_allocator.cache_clear)
+        client = APIClient()
+        response = client.get(reverse('ticketinfo-reserve', args=[self.ticket_info.pk]))
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        payload = {'tickets': [{'ticket': self.ticket_info.pk, 'quantity': 4}]}
+        response = client.post(reverse('reservation-bulk'), payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        response = client.post(reverse('reservation-bulk'), payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(get_allocator().flush(), 5)
+        get_allocator().close()
+
+
+    @override_settings(RESERVATION_ALLOCATOR=True, ALLOCATOR_FLUSH_INTERVAL=None)
+    def test_endpoints_of_other_process(self):
+        """ Test process not owning the inventory rejects reservations. """
+        get_allocator.cache_clear()
+        self.addCleanup(get_allocator.cache_clear)
+        owner = Allocator(lease_ttl=10)
+        owner.reserve(self.ticket_info.pk)
+        self.addCleanup(owner.close)
+        client = APIClient()
+        response = client.get(reverse('ticketinfo-reserve', args=[self.ticket_info.pk]))
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        payload = {'tickets': [{'ticket': self.ticket_info.pk, 'quantity': 1}]}
+        response = client.post(reverse('reservation-bulk'), payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertFalse(Reservation.objects.exists())
+        get_allocator().close()
+
+
+    @override_settings(RESERVATION_ALLOCATOR=True)
+    def test_reserve_endpoint(self):
+        """ Test reserve endpoint accepts reservation handed out by allocator. """
+        get_allocator.cache_clear()
+        self.addCleanup(get_allocator.cache_clear)
+        with self.settings(ALLOCATOR_FLUSH_INTERVAL=None):
+            response = APIClient().get(reverse('ticketinfo-reserve', args=[self.ticket_info.pk]))
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data['kind'], self.ticket_info.kind)
+        self.assertEqual(response['Location'], response.data['status'])
+        pending = APIClient().get(response.data['status'])
+        self.assertEqual(pending.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(get_allocator().flush(), 1)
+        persisted = APIClient().get(response.data['status'])
+        self.assertEqual(persisted.status_code, status.HTTP_200_OK)
+        self.assertTrue(persisted.data['is_valid'])
+        reservation = Reservation.objects.get(token=response.data['token'])
+        self.assertTrue(persisted.data['reservation'].endswith(reverse('reservation-detail', args=[reservation.pk])))
+        get_allocator().close()
+
+
+    @override_settings(RESERVATION_ALLOCATOR=True, ALLOCATOR_FLUSH_INTERVAL=None)
+    def test_pending_of_lost_reservation(self):
+        """ Test token of reservation never persisted is unknown once its
+        allocator gives up lease, as well as token of other allocator. """
+        get_allocator.cache_clear()
+        self.addCleanup(get_allocator.cache_clear)
+        response = APIClient().post(reverse('reservation-bulk'), {'tickets': [{'ticket': self.ticket_info.pk, 'quantity': 2}]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        url = response.data[0]['status']
+        allocator = get_allocator()
+        allocator.shards[self.ticket_info.pk].pending.clear()
+        self.assertEqual(APIClient().get(url).status_code, status.HTTP_202_ACCEPTED)
+        other_url = url.replace(f'-{allocator.key}-', '-00000000-')
+        self.assertEqual(APIClient().get(other_url).status_code, status.HTTP_404_NOT_FOUND)
+        allocator.close()
+        self.assertEqual(APIClient().get(url).status_code, status.HTTP_404_NOT_FOUND)
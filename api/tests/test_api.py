@@ -1,3 +1,6 @@
+import json
+from base64 import urlsafe_b64encode
+
 from django.urls import reverse
 from django.test import TestCase
 from rest_framework import status
@@ -7,22 +10,34 @@ from datetime import datetime
 
 from api.tests.test_models import create_sample_event, create_sample_ticket_info, create_sample_reservation
 from api.models import Event, TicketInfo, Ticket, Reservation
+from api.reservations import reserve_ticket
 from api.serializers import EventSerializer, TicketInfoSerializer, TicketSerializer, ReservationSerializer
 
 
 EVENT_URL = reverse('event-list')
 TICKET_INFO_URL = reverse('ticketinfo-list')
 RESERVATION_URL = reverse('reservation-list')
+EVENT_SUMMARY_URL = reverse('event-summary-bulk')
+RESERVATION_BULK_URL = reverse('reservation-bulk')
+RESERVATION_EXPORT_URL = reverse('reservation-export')
 
 
 def event_detail_url(id_):
     """ Returns event detail URL. """
     return reverse('event-detail', args=[id_])
 
+def event_summary_url(id_):
+    """ Returns event summary URL. """
+    return reverse('event-summary', args=[id_])
+
 def ticket_info_detail_url(id_):
     """ Returns ticket info detail URL. """
     return reverse('ticketinfo-detail', args=[id_])
 
+def ticket_info_summary_url(id_):
+    """ Returns ticket info summary URL. """
+    return reverse('ticketinfo-summary', args=[id_])
+
 def reservation_detail_url(id_):
     """ Returns reservation detail URL. """
     return reverse('reservation-detail', args=[id_])
@@ -43,7 +58,7 @@ class EventApiTests(TestCase):
         events = Event.objects.all().order_by('name')
         serializer = EventSerializer(events, many=True)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(response.data, serializer.data)
+        self.assertEqual(response.data['results'], serializer.data)
 
 
     def test_create_valid_event(self):
@@ -75,6 +90,46 @@ class EventApiTests(TestCase):
         self.assertTrue(exists)
 
 
+    def test_event_summary(self):
+        """ Test retrieving reservations summary for event. """
+        event = create_sample_event()
+        ticket_info = create_sample_ticket_info(event=event)
+        create_sample_reservation(ticket=ticket_info.tickets.first(), ticket_info=ticket_info, is_paid=True)
+        create_sample_reservation(ticket=ticket_info.tickets.last(), ticket_info=ticket_info)
+        create_sample_reservation(ticket_info=ticket_info)
+        with self.assertNumQueries(1):
+            response = self.client.get(event_summary_url(event.id))
+        expected = {'total': 3, 'valid': 2, 'invalid': 1, 'paid': 1, 'unpaid': 1}
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['reservations'], expected)
+
+
+    def test_event_summary_not_found(self):
+        """ Test retrieving reservations summary for not existing event. """
+        response = self.client.get(event_summary_url(1))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+    def test_bulk_event_summary(self):
+        """ Test retrieving reservations summaries for many events. """
+        event_one = create_sample_event()
+        event_two = create_sample_event(name='Event Two')
+        ticket_info = create_sample_ticket_info(event=event_one)
+        create_sample_reservation(ticket=ticket_info.tickets.first(), ticket_info=ticket_info)
+        with self.assertNumQueries(1):
+            response = self.client.get(EVENT_SUMMARY_URL, {'ids': f'{event_two.id},{event_one.id},999'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([event['id'] for event in response.data['events']], [event_two.id, event_one.id])
+        self.assertEqual(response.data['events'][0]['reservations']['total'], 0)
+        self.assertEqual(response.data['events'][1]['reservations']['unpaid'], 1)
+
+
+    def test_bulk_event_summary_invalid_ids(self):
+        """ Test retrieving reservations summaries with invalid ids. """
+        response = self.client.get(EVENT_SUMMARY_URL, {'ids': '1,a'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
 class TicketInfoApiTests(TestCase):
 
     def setUp(self):
@@ -89,7 +144,7 @@ class TicketInfoApiTests(TestCase):
         tickets = TicketInfo.objects.all()
         serializer = TicketInfoSerializer(tickets, many=True)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(response.data, serializer.data)
+        self.assertEqual(response.data['results'], serializer.data)
 
 
     def test_create_invalid_event(self):
@@ -112,6 +167,31 @@ class TicketInfoApiTests(TestCase):
         self.assertTrue(exists)
 
 
+    def test_reduce_quantity_below_reserved(self):
+        """ Test reducing quantity of ticket kind below number of reserved tickets. """
+        event = create_sample_event()
+        ticket_info = create_sample_ticket_info(event=event, quantity=3)
+        reserve_ticket(ticket_info)
+        url = ticket_info_detail_url(ticket_info.id)
+        response = self.client.patch(url, {'quantity': 0})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.patch(url, {'quantity': 1})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['left'], 0)
+
+
+    def test_ticket_info_summary(self):
+        """ Test retrieving reservations summary for ticket kind. """
+        event = create_sample_event()
+        ticket_info = create_sample_ticket_info(event=event)
+        create_sample_reservation(ticket=ticket_info.tickets.first(), ticket_info=ticket_info)
+        create_sample_reservation(ticket_info=ticket_info)
+        response = self.client.get(ticket_info_summary_url(ticket_info.id))
+        expected = {'total': 2, 'valid': 1, 'invalid': 1, 'paid': 0, 'unpaid': 1}
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['reservations'], expected)
+
+
 class ReservationApiTests(TestCase):
 
     def setUp(self):
@@ -126,4 +206,125 @@ class ReservationApiTests(TestCase):
         tickets = Reservation.objects.all()
         serializer = ReservationSerializer(tickets, many=True)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(response.data, serializer.data)
+        self.assertEqual(response.data['results'], serializer.data)
+
+
+    def test_bulk_reservation(self):
+        """ Test reserving many tickets of different kinds at once. """
+        event = create_sample_event()
+        normal = create_sample_ticket_info(event=event)
+        vip = create_sample_ticket_info(kind='VIP', event=event, quantity=2)
+        payload = {'tickets': [{'ticket': normal.id, 'quantity': 3}, {'ticket': vip.id, 'quantity': 2}]}
+        response = self.client.post(RESERVATION_BULK_URL, payload, format='json')
+        normal.refresh_from_db()
+        vip.refresh_from_db()
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(response.data), 5)
+        self.assertEqual(Reservation.objects.filter(ticket__isnull=False).count(), 5)
+        self.assertEqual((normal.available, vip.available), (7, 0))
+
+
+    def test_bulk_reservation_all_or_nothing(self):
+        """ Test bulk reservation reserves nothing when any kind is sold out. """
+        event = create_sample_event()
+        normal = create_sample_ticket_info(event=event)
+        vip = create_sample_ticket_info(kind='VIP', event=event, quantity=2)
+        payload = {'tickets': [{'ticket': normal.id, 'quantity': 3}, {'ticket': vip.id, 'quantity': 3}]}
+        response = self.client.post(RESERVATION_BULK_URL, payload, format='json')
+        normal.refresh_from_db()
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Reservation.objects.exists())
+        self.assertEqual(normal.available, 10)
+
+
+    def test_bulk_reservation_not_existing_ticket(self):
+        """ Test bulk reservation of not existing ticket. """
+        payload = {'tickets': [{'ticket': 999, 'quantity': 1}]}
+        response = self.client.post(RESERVATION_BULK_URL, payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+    def test_bulk_reservation_query_count(self):
+        """ Test bulk reservation runs constant number of queries for any quantity. """
+        event = create_sample_event()
+        ticket_info = create_sample_ticket_info(event=event, quantity=20)
+        payload = {'tickets': [{'ticket': ticket_info.id, 'quantity': 10}]}
+        with self.assertNumQueries(9):
+            response = self.client.post(RESERVATION_BULK_URL, payload, format='json')
+        self.assertEqual(len(response.data), 10)
+
+
+    def test_reservations_keyset_pagination(self):
+        """ Test walking reservations pages forth and back with cursors. """
+        event = create_sample_event()
+        ticket_info = create_sample_ticket_info(event=event)
+        create_time = timezone.now()
+        for ticket in ticket_info.tickets.all()[:5]:
+            create_sample_reservation(create_time=create_time, ticket=ticket, ticket_info=ticket_info)
+
+        pages = []
+        response = self.client.get(RESERVATION_URL, {'page_size': 2})
+        pages.append(response.data)
+        while response.data['next']:
+            response = self.client.get(response.data['next'])
+            pages.append(response.data)
+        self.assertEqual([len(page['results']) for page in pages], [2, 2, 1])
+        self.assertIsNone(pages[0]['previous'])
+
+        response = self.client.get(pages[-1]['previous'])
+        self.assertEqual(response.data['results'], pages[1]['results'])
+        response = self.client.get(response.data['previous'])
+        self.assertEqual(response.data['results'], pages[0]['results'])
+        self.assertIsNone(response.data['previous'])
+
+
+    def test_invalid_cursor(self):
+        """ Test retrieving reservations page with invalid cursor. """
+        response = self.client.get(RESERVATION_URL, {'cursor': 'invalid'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+    def test_cursor_with_invalid_values(self):
+        """ Test retrieving pages with cursors holding values not matching ordering fields. """
+        def encode(cursor):
+            return urlsafe_b64encode(json.dumps(cursor).encode()).decode()
+        for url, values in [(RESERVATION_URL, ["abc", 1]), (RESERVATION_URL, [None, 1]),
+                            (EVENT_URL, ["abc"]), (TICKET_INFO_URL, [1, "Normal", [1]])]:
+            response = self.client.get(url, {'cursor': encode({"v": values, "r": 0})})
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND, values)
+
+
+    def test_export_reservations_csv(self):
+        """ Test streaming reservations of event as CSV. """
+        event = create_sample_event()
+        other_event = create_sample_event(name='Event Two')
+        ticket_info = create_sample_ticket_info(event=event)
+        other_ticket_info = create_sample_ticket_info(event=other_event)
+        create_sample_reservation(ticket=ticket_info.tickets.first(), ticket_info=ticket_info)
+        create_sample_reservation(ticket_info=other_ticket_info)
+        response = self.client.get(RESERVATION_EXPORT_URL, {'format': 'csv', 'event': event.id})
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertEqual(lines[0], 'id,event,kind,price,create_time,expire_time,is_paid,is_valid')
+        self.assertEqual(len(lines), 2)
+        self.assertIn('Event One,Normal,55.55', lines[1])
+
+
+    def test_export_reservations_ndjson(self):
+        """ Test streaming reservations as newline delimited JSON. """
+        event = create_sample_event()
+        ticket_info = create_sample_ticket_info(event=event)
+        create_sample_reservation(ticket=ticket_info.tickets.first(), ticket_info=ticket_info)
+        create_sample_reservation(ticket_info=ticket_info)
+        response = self.client.get(RESERVATION_EXPORT_URL, {'format': 'ndjson'})
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([row['is_valid'] for row in rows], [True, False])
+        self.assertEqual(rows[0]['event'], 'Event One')
+
+
+    def test_export_reservations_not_existing_event(self):
+        """ Test exporting reservations of not existing event. """
+        response = self.client.get(RESERVATION_EXPORT_URL, {'format': 'ndjson', 'event': 999})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
@@ -0,0 +1,65 @@
+import asyncio
+
+from django.urls import reverse
+from django.test import TransactionTestCase, AsyncClient, Client, RequestFactory
+from rest_framework import status
+
+from api import async_views
+from api.tests.test_models import create_sample_event, create_sample_ticket_info
+from api.models import TicketInfo, Reservation
+from api.reservations import reserve_ticket
+
+
+class AsyncViewsTests(TransactionTestCase):
+    """ Views run in thread pool with their own database connections,
+    so data must be committed to be visible there. """
+
+    def setUp(self):
+        self.client = AsyncClient()
+        self.event = create_sample_event()
+        self.ticket_info = create_sample_ticket_info(event=self.event, quantity=5)
+
+
+    async def test_event_summary(self):
+        """ Test async event summary returns the same data as sync one. """
+        response = await self.client.get(reverse('async-event-summary', args=[self.event.id]))
+        sync_response = await asyncio.get_event_loop().run_in_executor(
+            None, Client().get, reverse('event-summary', args=[self.event.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json(), sync_response.json())
+
+
+    async def test_ticket_info_summary_not_found(self):
+        """ Test async ticket info summary of non existing ticket info. """
+        response = await self.client.get(reverse('async-ticketinfo-summary', args=[999]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+    async def test_concurrent_summaries(self):
+        """ Test concurrent async requests are all served. """
+        url = reverse('async-ticketinfo-summary', args=[self.ticket_info.id])
+        responses = await asyncio.gather(*(self.client.get(url) for _ in range(10)))
+        self.assertTrue(all(response.status_code == status.HTTP_200_OK for response in responses))
+
+
+    async def test_reserve(self):
+        """ Test async reservations until ticket info is sold out. """
+        url = reverse('async-ticketinfo-reserve', args=[self.ticket_info.id])
+        codes = [(await self.client.get(url)).status_code for _ in range(6)]
+        self.assertEqual(codes, [status.HTTP_201_CREATED] * 5 + [status.HTTP_400_BAD_REQUEST])
+        count = await asyncio.get_event_loop().run_in_executor(None, Reservation.objects.count)
+        self.assertEqual(count, 5)
+
+
+    def test_pay(self):
+        """ Test paying reservation through async view. Request is built by
+        sync factory, as async one of Django 3.1.2 drops request body. """
+        ticket_info = TicketInfo.objects.create(kind='Exact', price=10, quantity=1, event=self.event)
+        reservation = reserve_ticket(ticket_info)
+        url = reverse('async-reservation-pay', args=[reservation.id])
+        payload = {'amount': 10, 'token': 'token', 'currency': 'EUR'}
+        request = RequestFactory().post(url, payload, content_type='application/json')
+        response = asyncio.run(async_views.reservation_pay(request, pk=reservation.id))
+        reservation.refresh_from_db()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(reservation.is_paid)
@@ -0,0 +1,97 @@
+from django.test import TransactionTestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from api.tests.test_models import create_sample_event, create_sample_ticket_info
+from api.cache import VERSION_KEY, get_cache, get_stats
+from api.models import TicketInfo, Reservation
+from api.reservations import reserve_ticket
+
+
+AVAILABLE_URL = reverse('ticketinfo-available')
+
+
+def left_url(id_):
+    """ Returns ticket info left URL. """
+    return reverse('ticketinfo-left', args=[id_])
+
+
+class AvailabilityCacheTests(TransactionTestCase):
+    """ Transactional, as cache is invalidated after commit. """
+
+    def setUp(self):
+        get_cache().clear()
+        self.client = APIClient()
+        self.event = create_sample_event()
+        self.ticket_info = create_sample_ticket_info(event=self.event, quantity=1)
+
+
+    def test_available_list_is_cached(self):
+        """ Test repeated available tickets listing runs no query. """
+        self.client.get(AVAILABLE_URL)
+        with self.assertNumQueries(0):
+            response = self.client.get(AVAILABLE_URL)
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertEqual(get_stats(), {'hits': 1, 'misses': 1})
+
+
+    def test_available_list_invalidated_on_reserve(self):
+        """ Test reserving last ticket removes kind from cached listing. """
+        self.client.get(AVAILABLE_URL)
+        reserve_ticket(self.ticket_info)
+        response = self.client.get(AVAILABLE_URL)
+        self.assertEqual(response.data['results'], [])
+
+
+    def test_available_list_invalidated_on_release(self):
+        """ Test releasing reservation brings kind back to cached listing. """
+        reservation = reserve_ticket(self.ticket_info)
+        self.client.get(AVAILABLE_URL)
+        Reservation.objects.filter(pk=reservation.pk).release()
+        response = self.client.get(AVAILABLE_URL)
+        self.assertEqual(len(response.data['results']), 1)
+
+
+    def test_evicted_version_does_not_serve_stale_list(self):
+        """ Test listing cached under earlier version is not served once version is evicted. """
+        get_cache().delete(VERSION_KEY)
+        self.client.get(AVAILABLE_URL)
+        reserve_ticket(self.ticket_info)
+        get_cache().delete(VERSION_KEY)
+        response = self.client.get(AVAILABLE_URL)
+        self.assertEqual(response.data['results'], [])
+
+
+    def test_left_is_cached(self):
+        """ Test number of tickets left is cached until it changes. """
+        response = self.client.get(left_url(self.ticket_info.id))
+        self.assertEqual(response.data, {'left': 1})
+        with self.assertNumQueries(0):
+            self.client.get(left_url(self.ticket_info.id))
+        reserve_ticket(self.ticket_info)
+        response = self.client.get(left_url(self.ticket_info.id))
+        self.assertEqual(response.data, {'left': 0})
+
+
+    def test_left_invalidated_on_counter_reserve(self):
+        """ Test reserving ticket of counter inventory invalidates number of tickets left. """
+        ticket_info = TicketInfo.objects.create(kind='Counter', price=10, quantity=2, event=self.event, inventory_mode='counter')
+        self.client.get(left_url(ticket_info.id))
+        reserve_ticket(ticket_info)
+        response = self.client.get(left_url(ticket_info.id))
+        self.assertEqual(response.data, {'left': 1})
+
+
+    def test_left_invalidated_on_save(self):
+        """ Test changing quantity invalidates number of tickets left. """
+        self.client.get(left_url(self.ticket_info.id))
+        self.ticket_info.quantity = 3
+        self.ticket_info.save()
+        response = self.client.get(left_url(self.ticket_info.id))
+        self.assertEqual(response.data, {'left': 3})
+
+
+    def test_left_not_found(self):
+        """ Test number of tickets left of not existing kind. """
+        response = self.client.get(left_url(999))
+        self.assertEqual(response.status_code, 404)
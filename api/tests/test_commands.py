@@ -0,0 +1,65 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from api.tests.test_models import create_sample_event, create_sample_ticket_info
+from api.models import TicketInfo
+from api.reservations import reserve_ticket
+
+
+class ReconcileAvailableTests(TestCase):
+
+    def setUp(self):
+        self.event = create_sample_event()
+        self.ticket_info = create_sample_ticket_info(event=self.event)
+
+
+    def test_reconcile_available(self):
+        """ Test reconciling drifted available tickets counter. """
+        TicketInfo.objects.change_available({self.ticket_info.pk: 5})
+        call_command('reconcile_available', stdout=StringIO())
+        self.ticket_info.refresh_from_db()
+        self.assertEqual(self.ticket_info.available, 10)
+
+
+    def test_reconcile_available_dry_run(self):
+        """ Test dry run only reports drifted counters. """
+        TicketInfo.objects.change_available({self.ticket_info.pk: 5})
+        out = StringIO()
+        call_command('reconcile_available', dry_run=True, stdout=out)
+        self.ticket_info.refresh_from_db()
+        self.assertEqual(self.ticket_info.available, 15)
+        self.assertIn('actually 10', out.getvalue())
+
+
+class ConvertInventoryTests(TestCase):
+
+    def setUp(self):
+        self.event = create_sample_event()
+        self.ticket_info = create_sample_ticket_info(event=self.event)
+        reserve_ticket(self.ticket_info)
+
+
+    def test_convert_to_counter_and_back(self):
+        """ Test converting ticket kind between inventory modes keeps availability. """
+        call_command('convert_inventory', 'counter', self.ticket_info.pk, stdout=StringIO())
+        self.ticket_info.refresh_from_db()
+        self.assertEqual(self.ticket_info.inventory_mode, 'counter')
+        self.assertEqual(self.ticket_info.tickets.count(), 1)
+        self.assertEqual(self.ticket_info.get_available_tickets_count(), 9)
+
+        call_command('convert_inventory', 'tickets', stdout=StringIO())
+        self.ticket_info.refresh_from_db()
+        self.assertEqual(self.ticket_info.inventory_mode, 'tickets')
+        self.assertEqual(self.ticket_info.tickets.count(), 10)
+        self.assertEqual(self.ticket_info.get_available_tickets_count(), 9)
+
+
+    def test_reconcile_counter_inventory(self):
+        """ Test reconciling available tickets counter of counter inventory. """
+        call_command('convert_inventory', 'counter', stdout=StringIO())
+        TicketInfo.objects.change_available({self.ticket_info.pk: 5})
+        call_command('reconcile_available', stdout=StringIO())
+        self.ticket_info.refresh_from_db()
+        self.assertEqual(self.ticket_info.available, 9)
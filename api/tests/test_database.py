@@ -0,0 +1,17 @@
+from django.db import connection
+from django.test import TestCase, override_settings
+
+from api.database import apply_sqlite_pragmas
+
+
+class SQLitePragmasTests(TestCase):
+
+    @override_settings(SQLITE_PRAGMAS={'cache_size': -4000, 'busy_timeout': 1234})
+    def test_pragmas_applied_on_connect(self):
+        """ Test configured pragmas are executed on new connection. """
+        apply_sqlite_pragmas(sender=connection.__class__, connection=connection)
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA cache_size')
+            self.assertEqual(cursor.fetchone()[0], -4000)
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 1234)
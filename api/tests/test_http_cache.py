@@ -0,0 +1,113 @@
+from django.urls import reverse
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from api.tests.test_models import create_sample_event, create_sample_ticket_info
+from api.models import Event, TicketInfo
+from api.reservations import reserve_ticket
+
+
+EVENT_URL = reverse('event-list')
+TICKET_INFO_URL = reverse('ticketinfo-list')
+
+
+class ConditionalGetTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.event = create_sample_event()
+        self.ticket_info = create_sample_ticket_info(event=self.event)
+
+
+    def assertNotModified(self, url, **headers):
+        with self.assertNumQueries(1):
+            response = self.client.get(url, **headers)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        return response
+
+
+    def test_list_not_modified(self):
+        """ Test listing with current ETag is answered with 304 after single query. """
+        response = self.client.get(EVENT_URL)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('max-age=60', response['Cache-Control'])
+        not_modified = self.assertNotModified(EVENT_URL, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(not_modified['ETag'], response['ETag'])
+        self.assertNotModified(EVENT_URL, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+
+
+    def test_event_etag_changes_with_ticket_kinds(self):
+        """ Test events listing ETag changes when ticket kinds of event change. """
+        etag = self.client.get(EVENT_URL)['ETag']
+        ticket_info = create_sample_ticket_info(kind='VIP', event=self.event)
+        self.assertNotEqual(self.client.get(EVENT_URL, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_304_NOT_MODIFIED)
+
+        etag = self.client.get(EVENT_URL)['ETag']
+        ticket_info = TicketInfo.objects.get(pk=ticket_info.pk)
+        ticket_info.price = 100
+        ticket_info.save()
+        self.assertNotModified(EVENT_URL, HTTP_IF_NONE_MATCH=etag)
+        ticket_info.delete()
+        response = self.client.get(EVENT_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'][0]['tickets_info'], ['Normal'])
+
+
+    def test_ticket_etag_changes_with_reservations(self):
+        """ Test ticket kinds ETags change when reservation changes tickets left. """
+        url = reverse('ticketinfo-detail', args=[self.ticket_info.pk])
+        list_etag = self.client.get(TICKET_INFO_URL)['ETag']
+        response = self.client.get(url)
+        self.assertIn('no-cache', response['Cache-Control'])
+        self.assertNotModified(url, HTTP_IF_NONE_MATCH=response['ETag'])
+
+        reserve_ticket(self.ticket_info)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['left'], 9)
+        self.assertEqual(self.client.get(TICKET_INFO_URL, HTTP_IF_NONE_MATCH=list_etag).status_code, status.HTTP_200_OK)
+
+
+    def test_ticket_etag_changes_with_event_name(self):
+        """ Test ticket kinds ETags change when their event, listed by name, is renamed. """
+        url = reverse('ticketinfo-detail', args=[self.ticket_info.pk])
+        etag = self.client.get(url)['ETag']
+        list_etag = self.client.get(TICKET_INFO_URL)['ETag']
+        event = Event.objects.get(pk=self.event.pk)
+        event.date = timezone.now()
+        event.save()
+        self.assertNotModified(url, HTTP_IF_NONE_MATCH=etag)
+
+        event.name = 'Renamed'
+        event.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['event'], 'Renamed')
+        self.assertEqual(self.client.get(TICKET_INFO_URL, HTTP_IF_NONE_MATCH=list_etag).status_code, status.HTTP_200_OK)
+
+
+    def test_ticket_etag_changes_with_counter_reservations(self):
+        """ Test ETag of counter inventory ticket kind changes when reservation takes its seat. """
+        ticket_info = TicketInfo.objects.create(kind='Counter', price=10, quantity=5, event=self.event, inventory_mode='counter')
+        url = reverse('ticketinfo-detail', args=[ticket_info.pk])
+        etag = self.client.get(url)['ETag']
+        reserve_ticket(ticket_info)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['left'], 4)
+
+
+    def test_save_increases_version(self):
+        """ Test saving object increases its version. """
+        self.event.name = 'Renamed'
+        self.event.save()
+        self.assertEqual(self.event.version, Event.objects.get(pk=self.event.pk).version)
+        self.assertGreater(self.event.version, 1)
+
+
+    def test_retrieve_not_existing(self):
+        """ Test retrieving not existing event. """
+        response = self.client.get(reverse('event-detail', args=[999]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
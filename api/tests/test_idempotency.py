@@ -0,0 +1,129 @@
+from unittest import mock
+
+from django.urls import reverse
+from django.db import IntegrityError
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from api.tests.test_models import create_sample_event, create_sample_ticket_info
+from api.models import Reservation, Payment, IdempotencyKey
+from api.reservations import reserve_ticket, ReservationConflict
+from api.tasks import delete_expired_idempotency_keys
+
+
+def ticket_info_reserve_url(id_):
+    """ Returns ticket info reserve URL. """
+    return reverse('ticketinfo-reserve', args=[id_])
+
+def reservation_pay_url(id_):
+    """ Returns reservation pay URL. """
+    return reverse('reservation-pay', args=[id_])
+
+
+class IdempotencyKeyTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.ticket_info = create_sample_ticket_info(event=create_sample_event(), quantity=5)
+        self.url = ticket_info_reserve_url(self.ticket_info.id)
+
+
+    def test_repeated_reserve_is_replayed(self):
+        """ Test reserve repeated with the same key returns original response. """
+        first = self.client.get(self.url, HTTP_IDEMPOTENCY_KEY='key')
+        second = self.client.get(self.url, HTTP_IDEMPOTENCY_KEY='key')
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(second.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(Reservation.objects.count(), 1)
+
+
+    def test_reserve_without_key(self):
+        """ Test requests without key are never replayed. """
+        self.client.get(self.url)
+        self.client.get(self.url)
+        self.assertEqual(Reservation.objects.count(), 2)
+
+
+    def test_repeated_pay_charges_once(self):
+        """ Test pay repeated with the same key charges reservation once. """
+        reservation = reserve_ticket(self.ticket_info)
+        url = reservation_pay_url(reservation.id)
+        first = self.client.post(url, {'amount': '55.55'}, HTTP_IDEMPOTENCY_KEY='pay')
+        second = self.client.post(url, {'amount': '55.55'}, HTTP_IDEMPOTENCY_KEY='pay')
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertEqual(Payment.objects.count(), 1)
+
+
+    def test_key_reused_for_different_request(self):
+        """ Test key repeated with different payload is rejected. """
+        reservation = reserve_ticket(self.ticket_info)
+        url = reservation_pay_url(reservation.id)
+        self.client.post(url, {'amount': '10'}, HTTP_IDEMPOTENCY_KEY='pay')
+        response = self.client.post(url, {'amount': '55.55'}, HTTP_IDEMPOTENCY_KEY='pay')
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+
+    def test_request_in_progress(self):
+        """ Test key of request still processed is answered with conflict. """
+        self.client.get(self.url, HTTP_IDEMPOTENCY_KEY='key')
+        IdempotencyKey.objects.update(status_code=None, response_data=None)
+        response = self.client.get(self.url, HTTP_IDEMPOTENCY_KEY='key')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+
+
+    def test_abandoned_request_runs_again(self):
+        """ Test key of request in progress for longer than lock timeout is taken over. """
+        self.client.get(self.url, HTTP_IDEMPOTENCY_KEY='key')
+        IdempotencyKey.objects.update(status_code=None, response_data=None, create_time=timezone.now() - timezone.timedelta(minutes=5))
+        response = self.client.get(self.url, HTTP_IDEMPOTENCY_KEY='key')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertFalse(response.has_header('Idempotent-Replayed'))
+        self.assertEqual(IdempotencyKey.objects.get().status_code, status.HTTP_201_CREATED)
+
+
+    def test_key_deleted_by_concurrent_request(self):
+        """ Test request whose key was taken by concurrent request, which
+        deleted it before it could be read, creates the key again. """
+        create = IdempotencyKey.objects.create
+        def create_taken(**kwargs):
+            create_taken.calls += 1
+            if create_taken.calls == 1:
+                raise IntegrityError
+            return create(**kwargs)
+        create_taken.calls = 0
+        with mock.patch.object(IdempotencyKey.objects, 'create', side_effect=create_taken):
+            response = self.client.get(self.url, HTTP_IDEMPOTENCY_KEY='key')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(IdempotencyKey.objects.get().status_code, status.HTTP_201_CREATED)
+
+
+    def test_retryable_response_is_not_stored(self):
+        """ Test response asking to try again runs the request again when retried. """
+        with mock.patch('api.views.reserve_ticket', side_effect=ReservationConflict):
+            response = self.client.get(self.url, HTTP_IDEMPOTENCY_KEY='key')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        response = self.client.get(self.url, HTTP_IDEMPOTENCY_KEY='key')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+
+    def test_expired_key_is_not_replayed(self):
+        """ Test request repeating expired key runs again. """
+        self.client.get(self.url, HTTP_IDEMPOTENCY_KEY='key')
+        IdempotencyKey.objects.update(create_time=timezone.now() - timezone.timedelta(days=2))
+        response = self.client.get(self.url, HTTP_IDEMPOTENCY_KEY='key')
+        self.assertFalse(response.has_header('Idempotent-Replayed'))
+        self.assertEqual(Reservation.objects.count(), 2)
+
+
+    def test_delete_expired_idempotency_keys(self):
+        """ Test periodic task deletes only expired keys. """
+        self.client.get(self.url, HTTP_IDEMPOTENCY_KEY='old')
+        IdempotencyKey.objects.update(create_time=timezone.now() - timezone.timedelta(days=2))
+        self.client.get(self.url, HTTP_IDEMPOTENCY_KEY='new')
+        self.assertEqual(delete_expired_idempotency_keys(), 1)
+        self.assertEqual(IdempotencyKey.objects.get().key, 'new')
@@ -0,0 +1,72 @@
+from django.urls import reverse
+from django.test import TestCase, TransactionTestCase, AsyncClient, override_settings
+from rest_framework import status
+
+from api import metrics
+from api.cache import get_cache
+from api.tests.test_models import create_sample_event
+
+
+METRICS_URL = reverse('metrics')
+
+
+@override_settings(REQUEST_METRICS_ENABLED=True, REQUEST_METRICS_SLOW_MS=10000)
+class RequestMetricsMiddlewareTests(TestCase):
+
+    def setUp(self):
+        metrics.reset()
+        get_cache().clear()
+        self.event = create_sample_event()
+
+
+    def test_request_is_measured(self):
+        """ Test request's time, queries and rendering are recorded by view. """
+        self.client.get(reverse('event-summary', args=[self.event.id]))
+        response = self.client.get(METRICS_URL)
+        content = response.content.decode()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        self.assertIn('api_request_duration_seconds_count{view="event-summary",method="GET",status="200"} 1', content)
+        self.assertIn('api_request_queries_bucket{view="event-summary",le="1"} 1', content)
+        self.assertIn('api_request_sql_duration_seconds_count{view="event-summary"} 1', content)
+        self.assertIn('api_request_serialization_duration_seconds_count{view="event-summary"} 1', content)
+        self.assertIn('api_availability_cache_hits_total 0', content)
+
+
+    def test_unresolved_request_is_measured(self):
+        """ Test requests not matching any view share single label. """
+        self.client.get('/api/missing/')
+        self.assertIn('view="unresolved",method="GET",status="404"', self.client.get(METRICS_URL).content.decode())
+
+
+    @override_settings(REQUEST_METRICS_SLOW_MS=0)
+    def test_slow_request_is_logged(self):
+        """ Test request slower than threshold is logged. """
+        with self.assertLogs('api.middleware', level='WARNING') as logs:
+            self.client.get(reverse('event-summary', args=[self.event.id]))
+        self.assertIn('event-summary', logs.output[0])
+
+
+    @override_settings(REQUEST_METRICS_ENABLED=False)
+    def test_disabled_middleware(self):
+        """ Test requests are not measured unless enabled. """
+        self.client.get(reverse('event-summary', args=[self.event.id]))
+        self.assertNotIn('event-summary', self.client.get(METRICS_URL).content.decode())
+
+
+@override_settings(REQUEST_METRICS_ENABLED=True, REQUEST_METRICS_SLOW_MS=10000)
+class AsyncRequestMetricsTests(TransactionTestCase):
+    """ Async views run in thread pool with their own database connections,
+    so data must be committed to be visible there. """
+
+    def setUp(self):
+        metrics.reset()
+        self.event = create_sample_event()
+
+
+    async def test_async_view_queries_are_measured(self):
+        """ Test queries run by async view in thread pool are recorded. """
+        await AsyncClient().get(reverse('async-event-summary', args=[self.event.id]))
+        content = metrics.render()
+        self.assertIn('api_request_duration_seconds_count{view="async-event-summary",method="GET",status="200"} 1', content)
+        self.assertIn('api_request_queries_bucket{view="async-event-summary",le="0"} 0', content)
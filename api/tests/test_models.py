@@ -1,8 +1,11 @@
-from django.test import TestCase
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 from datetime import datetime
 
 from api.models import Event, TicketInfo, TicketInfo, Reservation
+from api.tasks import provision_tickets
 
 
 def create_sample_event(name='Event One', date=datetime.now()):
@@ -87,6 +90,16 @@ class EventTests(TestCase):
         self.assertEqual(event.get_unpaid_valid_reservations_count(), 0)
 
 
+    def test_get_reservations_summary(self):
+        """ Test getting all reservations statistics at once. """
+        event = Event.objects.create(name='Event', date=timezone.now())
+        ticket_info = TicketInfo.objects.create(kind='Ticket', price=50.99, quantity=10, event=event)
+        create_sample_reservation(ticket=ticket_info.tickets.first(), ticket_info=ticket_info, is_paid=True)
+        create_sample_reservation(ticket_info=ticket_info)
+        expected = {'total': 2, 'valid': 1, 'invalid': 1, 'paid': 1, 'unpaid': 0}
+        self.assertEqual(event.get_reservations_summary(), expected)
+
+
 class TicketInfoTests(TestCase):
 
     def setUp(self):
@@ -118,6 +131,94 @@ class TicketInfoTests(TestCase):
         self.assertEqual(ticket_info.get_available_tickets_count(), 10)
 
 
+    def test_available_counter(self):
+        """ Test available tickets counter follows tickets creation. """
+        ticket_info = TicketInfo.objects.create(kind='Ticket', price=50.99, quantity=10, event=self.event)
+        self.assertEqual(ticket_info.available, 10)
+        ticket_info.quantity = 15
+        ticket_info.save()
+        self.assertEqual(ticket_info.available, 15)
+
+
+    def test_save_does_not_overwrite_available_counter(self):
+        """ Test saving stale object keeps available tickets counter. """
+        ticket_info = TicketInfo.objects.create(kind='Ticket', price=50.99, quantity=10, event=self.event)
+        TicketInfo.objects.change_available({ticket_info.pk: -3})
+        ticket_info.kind = 'VIP'
+        ticket_info.save()
+        ticket_info.refresh_from_db()
+        self.assertEqual(ticket_info.available, 7)
+
+
+    def test_save_without_quantity_change(self):
+        """ Test saving ticket info without changing quantity does not count tickets. """
+        ticket_info = TicketInfo.objects.create(kind='Ticket', price=50.99, quantity=10, event=self.event)
+        ticket_info = TicketInfo.objects.get(pk=ticket_info.pk)
+        ticket_info.price = 60
+        with self.assertNumQueries(1):
+            ticket_info.save()
+
+
+    @override_settings(TICKETS_BATCH_SIZE=3)
+    def test_create_tickets_in_batches(self):
+        """ Test tickets are created in batches of limited size. """
+        with CaptureQueriesContext(connection) as queries:
+            ticket_info = TicketInfo.objects.create(kind='Ticket', price=50.99, quantity=10, event=self.event)
+        inserts = [query for query in queries if query['sql'].startswith('INSERT INTO "api_ticket" ')]
+        self.assertEqual(len(inserts), 4)
+        self.assertEqual(ticket_info.tickets.count(), 10)
+        self.assertEqual(ticket_info.available, 10)
+        self.assertEqual(ticket_info.provisioning_status, TicketInfo.ProvisioningStatus.READY)
+
+
+    @override_settings(TICKETS_BATCH_SIZE=3)
+    def test_reduce_quantity_deletes_free_tickets(self):
+        """ Test reducing quantity deletes only tickets which are not reserved. """
+        ticket_info = TicketInfo.objects.create(kind='Ticket', price=50.99, quantity=10, event=self.event)
+        reserved = [ticket_info.tickets.order_by('-pk')[0], ticket_info.tickets.order_by('pk')[0]]
+        for ticket in reserved:
+            create_sample_reservation(ticket=ticket, ticket_info=ticket_info)
+        TicketInfo.objects.change_available({ticket_info.pk: -2})
+        ticket_info.quantity = 4
+        ticket_info.save()
+        self.assertEqual(ticket_info.tickets.count(), 4)
+        self.assertEqual(ticket_info.available, 2)
+        self.assertEqual(Reservation.objects.filter(ticket__in=reserved).count(), 2)
+
+
+    def test_reduce_counter_inventory_quantity(self):
+        """ Test reducing quantity of counter inventory decreases its counter. """
+        ticket_info = TicketInfo.objects.create(kind='Ticket', price=50.99, quantity=10, event=self.event, inventory_mode='counter')
+        ticket_info.quantity = 6
+        ticket_info.save()
+        self.assertEqual(ticket_info.available, 6)
+
+
+    @override_settings(TICKETS_PROVISIONING_MODE='queue')
+    def test_queued_provisioning(self):
+        """ Test ticket kind in queue provisioning mode is provisioned by task. """
+        ticket_info = TicketInfo.objects.create(kind='Ticket', price=50.99, quantity=10, event=self.event)
+        self.assertEqual(ticket_info.provisioning_status, TicketInfo.ProvisioningStatus.PROVISIONING)
+        self.assertEqual(ticket_info.tickets.count(), 0)
+        provision_tickets(ticket_info.pk)
+        ticket_info.refresh_from_db()
+        self.assertEqual(ticket_info.provisioning_status, TicketInfo.ProvisioningStatus.READY)
+        self.assertEqual(ticket_info.tickets.count(), 10)
+        self.assertEqual(ticket_info.available, 10)
+
+
+    def test_create_counter_inventory(self):
+        """ Test creating ticket info with counter inventory creates no tickets. """
+        ticket_info = TicketInfo.objects.create(kind='Ticket', price=50.99, quantity=10, event=self.event, inventory_mode='counter')
+        self.assertEqual(ticket_info.tickets.count(), 0)
+        self.assertEqual(ticket_info.available, 10)
+        self.assertEqual(ticket_info.get_total_tickets_count(), 10)
+        self.assertEqual(ticket_info.get_available_tickets_count(), 10)
+        ticket_info.quantity = 12
+        ticket_info.save()
+        self.assertEqual(ticket_info.available, 12)
+
+
     def test_get_total_reservations_count(self):
         """ Test getting total number of reservations. """
         ticket_info = TicketInfo.objects.create(kind='Ticket', price=50.99, quantity=10, event=self.event)
@@ -148,6 +249,13 @@ class TicketInfoTests(TestCase):
         self.assertEqual(ticket_info.get_unpaid_valid_reservations_count(), 0)
 
 
+    def test_get_reservations_summary(self):
+        """ Test getting all reservations statistics at once. """
+        ticket_info = TicketInfo.objects.create(kind='Ticket', price=50.99, quantity=10, event=self.event)
+        expected = {'total': 0, 'valid': 0, 'invalid': 0, 'paid': 0, 'unpaid': 0}
+        self.assertEqual(ticket_info.get_reservations_summary(), expected)
+
+
 class ReservationTests(TestCase):
 
     def setUp(self):
@@ -196,3 +304,19 @@ class ReservationTests(TestCase):
         reservation = Reservation.objects.create(create_time=create_time, expire_time=expire_time, ticket_info=self.ticket_info, ticket=self.ticket)
         self.assertEqual(reservation.get_ticket_kind(), 'Ticket')
 
+
+    def test_delete_valid_reservation(self):
+        """ Test deleting valid reservation releases its ticket. """
+        reservation = Reservation.objects.create(ticket_info=self.ticket_info, ticket=self.ticket)
+        TicketInfo.objects.change_available({self.ticket_info.pk: -1})
+        reservation.delete()
+        self.ticket_info.refresh_from_db()
+        self.assertEqual(self.ticket_info.available, 10)
+
+
+    def test_delete_ticket(self):
+        """ Test deleting free ticket decreases available tickets. """
+        self.ticket.delete()
+        self.ticket_info.refresh_from_db()
+        self.assertEqual(self.ticket_info.available, 9)
+
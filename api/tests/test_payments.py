@@ -0,0 +1,223 @@
+from unittest import mock
+
+from django.conf import settings
+from django.urls import reverse
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from api.tests.test_models import create_sample_event, create_sample_ticket_info
+from api.models import Reservation, Payment, TicketInfoStats
+from api.payment_gateway import PaymentGateway, GatewayClient, PaymentError, GatewayTimeout, get_gateway_client
+from api.reservations import reserve_ticket
+from api.tasks import charge_payment, release_expired_reservations
+
+
+def reservation_pay_url(id_):
+    """ Returns reservation pay URL. """
+    return reverse('reservation-pay', args=[id_])
+
+
+class GatewayClientTests(TestCase):
+
+    def test_charge_retries_payment_error(self):
+        """ Test transient payment error is retried with the same idempotency key. """
+        client = GatewayClient(backoff=0)
+        with mock.patch.object(PaymentGateway, 'charge', side_effect=[PaymentError(), 'result']) as charge:
+            self.assertEqual(client.charge(10, 'token', idempotency_key='key'), 'result')
+        self.assertEqual(charge.call_count, 2)
+        self.assertEqual(charge.call_args.kwargs['idempotency_key'], 'key')
+
+
+    def test_charge_gives_up_after_retries(self):
+        """ Test payment error is raised when retries run out. """
+        client = GatewayClient(retries=2, backoff=0)
+        with self.assertRaises(PaymentError):
+            client.charge(10, 'payment_error')
+
+
+    def test_charge_reuses_connection(self):
+        """ Test sequential charges share single pooled connection. """
+        client = GatewayClient()
+        with mock.patch.object(client, 'connect', wraps=client.connect) as connect:
+            client.charge(10, 'token')
+            client.charge(10, 'token')
+        connect.assert_called_once_with()
+
+
+    def test_exhausted_pool_times_out(self):
+        """ Test waiting for pooled connection is bounded by timeout. """
+        client = GatewayClient(pool_size=1, timeout=0.01, retries=0)
+        with client.connection():
+            with self.assertRaises(GatewayTimeout):
+                client.charge(10, 'token')
+
+
+    def test_slow_gateway_times_out(self):
+        """ Test charge taking longer than timeout raises retryable error. """
+        client = GatewayClient(timeout=0.01, retries=0, latency=1)
+        with self.assertRaises(GatewayTimeout):
+            client.charge(10, 'token')
+
+
+    def test_repeated_charge_is_not_billed_twice(self):
+        """ Test charge repeated with the same idempotency key returns the first one. """
+        gateway = PaymentGateway()
+        first = gateway.charge(10, 'token', idempotency_key='repeated')
+        second = gateway.charge(20, 'token', idempotency_key='repeated')
+        self.assertIs(first, second)
+
+
+@override_settings(PAYMENT_GATEWAY_BACKOFF=0)
+class PayReservationTests(TestCase):
+
+    def setUp(self):
+        get_gateway_client.cache_clear()
+        self.client = APIClient()
+        self.ticket_info = create_sample_ticket_info(event=create_sample_event(), quantity=2)
+        self.reservation = reserve_ticket(self.ticket_info)
+
+
+    def tearDown(self):
+        get_gateway_client.cache_clear()
+
+
+    def test_pay_reservation(self):
+        """ Test paying reservation with decimal price. """
+        payload = {'amount': '55.55', 'token': 'token'}
+        response = self.client.post(reservation_pay_url(self.reservation.id), payload)
+        self.reservation.refresh_from_db()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(self.reservation.is_paid)
+        self.assertEqual(self.reservation.payments.get().status, Payment.Status.SUCCEEDED)
+
+
+    def test_pay_reservation_declined(self):
+        """ Test declined card fails payment and leaves reservation unpaid. """
+        payload = {'amount': '55.55', 'token': 'card_error'}
+        response = self.client.post(reservation_pay_url(self.reservation.id), payload)
+        self.reservation.refresh_from_db()
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['message'], "Your card has been declined")
+        self.assertFalse(self.reservation.is_paid)
+        self.assertEqual(self.reservation.payments.get().status, Payment.Status.FAILED)
+
+
+    def test_pay_reservation_wrong_amount(self):
+        """ Test amount different than ticket price is rejected before charging. """
+        response = self.client.post(reservation_pay_url(self.reservation.id), {'amount': 10})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Payment.objects.exists())
+
+
+    def test_pay_reservation_in_progress(self):
+        """ Test reservation with pending payment can not be paid again. """
+        Payment.objects.create(reservation=self.reservation, amount=self.ticket_info.price)
+        response = self.client.post(reservation_pay_url(self.reservation.id), {'amount': '55.55'})
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+
+
+    def test_pending_payment_blocks_release(self):
+        """ Test expired reservation is not released while its payment is pending. """
+        Payment.objects.create(reservation=self.reservation, amount=self.ticket_info.price)
+        Reservation.objects.filter(pk=self.reservation.pk).update(expire_time=timezone.now())
+        self.assertEqual(Reservation.objects.filter(pk=self.reservation.pk).release(), 0)
+
+
+    def test_stale_pending_payment_is_released(self):
+        """ Test pending payment past its deadline is marked failed by periodic
+        release, which releases its expired reservation. """
+        payment = Payment.objects.create(reservation=self.reservation, amount=self.ticket_info.price)
+        Payment.objects.filter(pk=payment.pk).update(update_time=timezone.now() - timezone.timedelta(minutes=settings.PAYMENT_PENDING_TIMEOUT + 1))
+        Reservation.objects.filter(pk=self.reservation.pk).update(expire_time=timezone.now())
+        metrics = release_expired_reservations()
+        payment.refresh_from_db()
+        self.reservation.refresh_from_db()
+        self.assertEqual(metrics['timed_out_payments'], 1)
+        self.assertEqual(payment.status, Payment.Status.FAILED)
+        self.assertFalse(self.reservation.check_is_valid())
+
+
+    def test_stale_pending_payment_is_not_charged(self):
+        """ Test late task of payment past its deadline fails it instead of charging. """
+        payment = Payment.objects.create(reservation=self.reservation, amount=self.ticket_info.price)
+        Payment.objects.filter(pk=payment.pk).update(update_time=timezone.now() - timezone.timedelta(minutes=settings.PAYMENT_PENDING_TIMEOUT + 1))
+        with mock.patch.object(GatewayClient, 'charge') as charge:
+            self.assertEqual(charge_payment(payment.pk), Payment.Status.FAILED)
+        charge.assert_not_called()
+        response = self.client.post(reservation_pay_url(self.reservation.id), {'amount': '55.55'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+    def test_reservation_released_during_charge_is_refunded(self):
+        """ Test charge completing after periodic task failed its payment and released
+        reservation is refunded, leaving payment failed and reservation unpaid. """
+        payment = Payment.objects.create(reservation=self.reservation, amount=self.ticket_info.price)
+        Reservation.objects.filter(pk=self.reservation.pk).update(expire_time=timezone.now())
+        charge = GatewayClient.charge
+
+        def charge_while_released(client, *args, **kwargs):
+            result = charge(client, *args, **kwargs)
+            Payment.objects.filter(pk=payment.pk).update(update_time=timezone.now() - timezone.timedelta(minutes=settings.PAYMENT_PENDING_TIMEOUT + 1))
+            release_expired_reservations()
+            return result
+
+        with mock.patch.object(GatewayClient, 'charge', charge_while_released):
+            self.assertEqual(charge_payment(payment.pk), Payment.Status.FAILED)
+        payment.refresh_from_db()
+        self.reservation.refresh_from_db()
+        self.assertEqual(payment.status, Payment.Status.FAILED)
+        self.assertIn("refunded", payment.error)
+        self.assertFalse(self.reservation.is_paid)
+        self.assertNotIn(str(payment.idempotency_key), PaymentGateway.charges)
+        self.assertEqual(TicketInfoStats.objects.get(pk=self.ticket_info.pk).paid, 0)
+
+
+    def test_charge_refreshes_deadline(self):
+        """ Test payment close to its deadline gets full timeout for its charge. """
+        payment = Payment.objects.create(reservation=self.reservation, amount=self.ticket_info.price)
+        Payment.objects.filter(pk=payment.pk).update(update_time=timezone.now() - timezone.timedelta(minutes=settings.PAYMENT_PENDING_TIMEOUT - 1))
+
+        def charge_while_sweeping(client, *args, **kwargs):
+            self.assertEqual(Payment.objects.fail_stale(), 0)
+            return 'result'
+
+        with mock.patch.object(GatewayClient, 'charge', charge_while_sweeping):
+            self.assertEqual(charge_payment(payment.pk), Payment.Status.SUCCEEDED)
+
+
+    def test_failed_payment_releases_expired_reservation(self):
+        """ Test expired reservation is released once its payment fails. """
+        payment = Payment.objects.create(reservation=self.reservation, amount=self.ticket_info.price, token='card_error')
+        Reservation.objects.filter(pk=self.reservation.pk).update(expire_time=timezone.now())
+        self.assertEqual(charge_payment(payment.pk), Payment.Status.FAILED)
+        self.reservation.refresh_from_db()
+        self.assertFalse(self.reservation.check_is_valid())
+
+
+    def test_retried_charge_is_not_billed_twice(self):
+        """ Test task retried after its charge reached gateway gets the first
+        charge back, instead of billing the card, here declined, again. """
+        payment = Payment.objects.create(reservation=self.reservation, amount=self.ticket_info.price, token='card_error')
+        get_gateway_client().charge(payment.amount, 'token', idempotency_key=str(payment.idempotency_key))
+        self.assertEqual(charge_payment(payment.pk), Payment.Status.SUCCEEDED)
+
+
+@override_settings(PAYMENT_MODE='queue')
+class QueuedPaymentTests(TransactionTestCase):
+
+    def test_pay_reservation_enqueues_charge(self):
+        """ Test queued payment responds with status URL and enqueues charge. """
+        ticket_info = create_sample_ticket_info(event=create_sample_event())
+        reservation = reserve_ticket(ticket_info)
+        with mock.patch('api.payments.charge_payment.delay') as delay:
+            response = APIClient().post(reservation_pay_url(reservation.id), {'amount': '55.55'})
+        payment = reservation.payments.get()
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertTrue(response['Location'].endswith(reverse('payment-detail', args=[payment.pk])))
+        delay.assert_called_once_with(payment.pk)
+
+        charge_payment(payment.pk)
+        response = APIClient().get(response['Location'])
+        self.assertEqual(response.data['status'], Payment.Status.SUCCEEDED)
@@ -0,0 +1,73 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from api.tests.test_api import EVENT_URL, TICKET_INFO_URL, RESERVATION_URL
+from api.cache import get_cache
+from api.tests.test_models import create_sample_event, create_sample_ticket_info, create_sample_reservation
+
+
+AVAILABLE_URL = f'{TICKET_INFO_URL}available/'
+
+
+class ListQueriesTests(TestCase):
+    """ Regression tests asserting list endpoints run constant number
+    of queries, independent of number of listed rows. """
+
+    def setUp(self):
+        get_cache().clear()
+        self.client = APIClient()
+
+
+    def create_rows(self, count):
+        """ Creates events, each with ticket kind and reservation. """
+        for index in range(count):
+            event = create_sample_event(name=f'Event {index}')
+            ticket_info = create_sample_ticket_info(event=event, quantity=2)
+            create_sample_reservation(ticket=ticket_info.tickets.first(), ticket_info=ticket_info)
+
+
+    def count_queries(self, url, params=None):
+        """ Returns number of queries run by GET request. """
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries)
+
+
+    def assertConstantQueries(self, url, expected, params=None):
+        """ Asserts request runs expected number of queries for few and many rows. """
+        self.create_rows(1)
+        self.assertEqual(self.count_queries(url, params), expected)
+        self.create_rows(10)
+        self.assertEqual(self.count_queries(url, params), expected)
+
+
+    def test_list_events(self):
+        """ Test listing events with their ticket kinds, after validators query. """
+        self.assertConstantQueries(EVENT_URL, 3)
+
+
+    def test_list_tickets(self):
+        """ Test listing ticket kinds with their events, after validators query. """
+        self.assertConstantQueries(TICKET_INFO_URL, 2)
+
+
+    def test_list_available_tickets(self):
+        """ Test listing available ticket kinds. """
+        self.assertConstantQueries(AVAILABLE_URL, 1)
+
+
+    def test_list_reservations(self):
+        """ Test listing reservations with their ticket kinds and events. """
+        self.assertConstantQueries(RESERVATION_URL, 1)
+
+
+    def test_list_reservations_of_ticket(self):
+        """ Test listing reservations of single ticket kind. """
+        event = create_sample_event(name='Filtered')
+        ticket_info = create_sample_ticket_info(event=event)
+        for ticket in ticket_info.tickets.all()[:5]:
+            create_sample_reservation(ticket=ticket, ticket_info=ticket_info)
+        self.assertEqual(self.count_queries(RESERVATION_URL, {'ticket': ticket_info.id}), 2)
@@ -0,0 +1,150 @@
+import logging
+import threading
+import time
+
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+
+from api.tests.test_models import create_sample_event, create_sample_ticket_info
+from api.models import TicketInfo, Reservation
+from api.reservations import reserve_ticket, reserve_tickets, NoTicketsAvailable, ReservationConflict
+
+
+logger = logging.getLogger(__name__)
+
+
+class ReserveTicketTests(TestCase):
+
+    def setUp(self):
+        self.event = create_sample_event()
+        self.ticket_info = create_sample_ticket_info(event=self.event, quantity=2)
+
+
+    def test_reserve_ticket(self):
+        """ Test reserving ticket creates valid reservation. """
+        reservation = reserve_ticket(self.ticket_info)
+        self.assertTrue(reservation.check_is_valid())
+        self.assertEqual(reservation.ticket.ticket_info, self.ticket_info)
+        self.assertGreater(reservation.expire_time, reservation.create_time)
+        self.ticket_info.refresh_from_db()
+        self.assertEqual(self.ticket_info.available, 1)
+
+
+    def test_reserve_ticket_claims_distinct_tickets(self):
+        """ Test reserving tickets never claims one ticket twice. """
+        first = reserve_ticket(self.ticket_info)
+        second = reserve_ticket(self.ticket_info)
+        self.assertNotEqual(first.ticket_id, second.ticket_id)
+
+
+    def test_reserve_ticket_sold_out(self):
+        """ Test reserving ticket when there are no available tickets. """
+        reserve_ticket(self.ticket_info)
+        reserve_ticket(self.ticket_info)
+        with self.assertRaises(NoTicketsAvailable):
+            reserve_ticket(self.ticket_info)
+
+
+class CounterInventoryTests(TestCase):
+
+    def setUp(self):
+        self.event = create_sample_event()
+        self.ticket_info = TicketInfo.objects.create(kind='Normal', price=10, quantity=2, event=self.event, inventory_mode='counter')
+
+
+    def test_reserve_ticket_creates_ticket(self):
+        """ Test reserving ticket of counter inventory creates ticket object. """
+        reservation = reserve_ticket(self.ticket_info)
+        self.ticket_info.refresh_from_db()
+        self.assertTrue(reservation.check_is_valid())
+        self.assertEqual(self.ticket_info.tickets.count(), 1)
+        self.assertEqual(self.ticket_info.available, 1)
+
+
+    def test_reserve_tickets_sold_out(self):
+        """ Test reserving more tickets of counter inventory than available. """
+        with self.assertRaises(NoTicketsAvailable):
+            reserve_tickets({self.ticket_info: 3})
+        self.assertEqual(len(reserve_tickets({self.ticket_info: 2})), 2)
+        with self.assertRaises(NoTicketsAvailable):
+            reserve_ticket(self.ticket_info)
+
+
+    def test_release_deletes_ticket(self):
+        """ Test releasing reservation of counter inventory deletes its ticket. """
+        reservation = reserve_ticket(self.ticket_info)
+        released = Reservation.objects.filter(pk=reservation.pk).release()
+        self.ticket_info.refresh_from_db()
+        self.assertEqual(released, 1)
+        self.assertEqual(self.ticket_info.tickets.count(), 0)
+        self.assertEqual(self.ticket_info.available, 2)
+
+
+class ReserveTicketsTests(TestCase):
+
+    def setUp(self):
+        self.event = create_sample_event()
+        self.normal = create_sample_ticket_info(event=self.event, quantity=5)
+        self.vip = create_sample_ticket_info(kind='VIP', event=self.event, quantity=2)
+
+
+    def test_reserve_tickets(self):
+        """ Test reserving many tickets of different kinds at once. """
+        reservations = reserve_tickets({self.normal: 3, self.vip: 2})
+        self.assertEqual(len(reservations), 5)
+        self.assertEqual(len({reservation.ticket_id for reservation in reservations}), 5)
+        self.assertEqual(sum(reservation.ticket_info == self.vip for reservation in reservations), 2)
+
+
+    def test_reserve_tickets_all_or_nothing(self):
+        """ Test reserving tickets creates no reservation when any kind is sold out. """
+        with self.assertRaises(NoTicketsAvailable):
+            reserve_tickets({self.normal: 3, self.vip: 3})
+        self.normal.refresh_from_db()
+        self.assertFalse(Reservation.objects.exists())
+        self.assertEqual(self.normal.available, 5)
+
+
+class ReserveTicketConcurrencyTests(TransactionTestCase):
+
+    threads = 8
+    quantity = 40
+
+    def test_concurrent_reservations_do_not_oversell(self):
+        """ Test many threads reserving the same ticket kind at once
+        never reserve more tickets than available. """
+        event = create_sample_event()
+        ticket_info = create_sample_ticket_info(event=event, quantity=self.quantity)
+        reserved = []
+        conflicts = []
+        barrier = threading.Barrier(self.threads)
+
+        def client():
+            barrier.wait()
+            try:
+                while True:
+                    try:
+                        reserved.append(reserve_ticket(ticket_info).ticket_id)
+                    except ReservationConflict:
+                        conflicts.append(1)
+                    except NoTicketsAvailable:
+                        return
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=client) for _ in range(self.threads)]
+        start = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - start
+
+        logger.info("Reserved %d tickets in %.3fs (%.1f/s), %d conflicts",
+                    len(reserved), elapsed, len(reserved) / elapsed, len(conflicts))
+        self.assertEqual(len(reserved), self.quantity)
+        self.assertEqual(len(set(reserved)), self.quantity)
+        self.assertEqual(Reservation.objects.filter(ticket__isnull=False).count(), self.quantity)
+        self.assertEqual(ticket_info.get_available_tickets_count(), 0)
+        ticket_info.refresh_from_db()
+        self.assertEqual(ticket_info.available, 0)
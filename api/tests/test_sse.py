@@ -0,0 +1,118 @@
+import asyncio
+import json
+
+from django.test import TransactionTestCase, override_settings
+
+from api import sse
+from api.tests.test_models import create_sample_event, create_sample_ticket_info
+from api.reservations import reserve_ticket
+from project.asgi import application
+
+
+class StreamClient:
+    """ ASGI client collecting server-sent events of stream. """
+    def __init__(self, query_string=b''):
+        self.scope = {'type': 'http', 'method': 'GET', 'path': '/api/stream/availability/', 'query_string': query_string, 'headers': []}
+        self.requests = asyncio.Queue()
+        self.requests.put_nowait({'type': 'http.request', 'body': b'', 'more_body': False})
+        self.messages = []
+        self.task = asyncio.ensure_future(application(self.scope, self.requests.get, self.send))
+
+    async def send(self, message):
+        self.messages.append(message)
+
+    @property
+    def status(self):
+        return self.messages[0]['status']
+
+    @property
+    def events(self):
+        """ Function which returns names and data of events received so far. """
+        body = b''.join(message.get('body', b'') for message in self.messages[1:]).decode()
+        events = []
+        for block in body.split('\n\n'):
+            lines = dict(line.split(': ', 1) for line in block.splitlines() if not line.startswith(':'))
+            if 'event' in lines:
+                events.append((lines['event'], json.loads(lines['data'])))
+        return events
+
+    async def wait_events(self, count, timeout=5):
+        """ Function which waits until given number of events is received. """
+        for _ in range(int(timeout / 0.01)):
+            if len(self.events) >= count:
+                return self.events
+            await asyncio.sleep(0.01)
+        raise AssertionError(f"Received {len(self.events)} of {count} events")
+
+    async def disconnect(self):
+        await self.requests.put({'type': 'http.disconnect'})
+        await asyncio.wait_for(self.task, timeout=5)
+
+
+def run_sync(function, *args):
+    return asyncio.get_event_loop().run_in_executor(None, function, *args)
+
+
+@override_settings(SSE_POLL_INTERVAL=0.05, SSE_DEBOUNCE=0.3, SSE_HEARTBEAT=0.2)
+class AvailabilityStreamTests(TransactionTestCase):
+    """ Stream reads data by its own database connections,
+    so data must be committed to be visible there. """
+
+    def setUp(self):
+        self.event = create_sample_event()
+        self.normal = create_sample_ticket_info(event=self.event, quantity=5)
+        self.vip = create_sample_ticket_info(kind='VIP', event=self.event, quantity=2)
+
+
+    async def test_snapshot(self):
+        """ Test stream starts with numbers of tickets left of requested ticket kinds. """
+        client = StreamClient(f'tickets={self.vip.id}'.encode())
+        events = await client.wait_events(1)
+        await client.disconnect()
+        self.assertEqual(client.status, 200)
+        self.assertIn((b'content-type', b'text/event-stream'), client.messages[0]['headers'])
+        self.assertEqual(events[0], ('snapshot', {"tickets": [{"id": self.vip.id, "left": 2}]}))
+
+
+    async def test_invalid_tickets(self):
+        """ Test stream of ticket kinds given by non integer ids. """
+        client = StreamClient(b'tickets=first')
+        await asyncio.wait_for(client.task, timeout=5)
+        self.assertEqual(client.status, 400)
+
+
+    async def test_changes_are_coalesced(self):
+        """ Test burst of reservations reaches stream as single event
+        holding final number of tickets left and change since snapshot. """
+        client = StreamClient(f'tickets={self.normal.id}'.encode())
+        await client.wait_events(1)
+        await asyncio.sleep(0.1)
+        for _ in range(3):
+            await run_sync(reserve_ticket, self.normal)
+        await run_sync(reserve_ticket, self.vip)
+        events = await client.wait_events(2)
+        await asyncio.sleep(0.5)
+        await client.disconnect()
+        self.assertEqual(client.events, events)
+        self.assertEqual(events[1], ('availability', {"tickets": [{"id": self.normal.id, "left": 2, "delta": -3}]}))
+
+
+    async def test_heartbeat(self):
+        """ Test idle stream gets heartbeat comments. """
+        client = StreamClient()
+        await client.wait_events(1)
+        await asyncio.sleep(0.5)
+        await client.disconnect()
+        self.assertIn(b': heartbeat\n\n', [message.get('body') for message in client.messages])
+        self.assertEqual(len(client.events), 1)
+
+
+    async def test_disconnect_unsubscribes(self):
+        """ Test disconnected stream stops receiving changes and poll stops with last stream. """
+        client = StreamClient()
+        await client.wait_events(1)
+        self.assertEqual(len(sse.broadcaster.subscribers), 1)
+        await client.disconnect()
+        await asyncio.sleep(0.2)
+        self.assertFalse(sse.broadcaster.subscribers)
+        self.assertIsNone(sse.broadcaster.task)
@@ -0,0 +1,102 @@
+from decimal import Decimal
+from io import StringIO
+
+from django.core.management import call_command
+from django.urls import reverse
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from api import stats
+from api.tests.test_models import create_sample_event, create_sample_ticket_info
+from api.models import STATS_FIELDS, Event, TicketInfo, Reservation, Payment, EventStats, TicketInfoStats
+from api.reservations import reserve_ticket, reserve_tickets
+from api.tasks import charge_payment
+
+
+def get_stored_stats(model, pk):
+    """ Returns maintained statistics of object. """
+    return model.objects.filter(pk=pk).values(*STATS_FIELDS).get()
+
+
+def get_computed_stats(queryset, pk):
+    """ Returns statistics of object computed from reservations. """
+    row = queryset.filter(pk=pk).summarize_stats().get()
+    row.pop('pk')
+    return row
+
+
+class StatsTests(TestCase):
+
+    def setUp(self):
+        self.event = create_sample_event()
+        self.normal = create_sample_ticket_info(event=self.event, price=10, quantity=5)
+        self.vip = create_sample_ticket_info(kind='VIP', event=self.event, price=25.5, quantity=5)
+
+
+    def assertStatsConsistent(self):
+        for ticket_info in (self.normal, self.vip):
+            self.assertEqual(get_stored_stats(TicketInfoStats, ticket_info.pk),
+                             get_computed_stats(TicketInfo.objects, ticket_info.pk))
+        self.assertEqual(get_stored_stats(EventStats, self.event.pk), get_computed_stats(Event.objects, self.event.pk))
+
+
+    def test_stats_created_with_objects(self):
+        """ Test creating event and ticket kind creates their empty statistics. """
+        self.assertEqual(get_stored_stats(EventStats, self.event.pk)['total'], 0)
+        self.assertEqual(get_stored_stats(TicketInfoStats, self.vip.pk)['revenue'], 0)
+
+
+    def test_stats_follow_reservations(self):
+        """ Test statistics follow reserving, paying, releasing and deleting reservations. """
+        reservation = reserve_ticket(self.normal)
+        reserve_tickets({self.normal: 2, self.vip: 3})
+        self.assertStatsConsistent()
+
+        reservation.is_paid = True
+        reservation.save()
+        vip_reservation = Reservation.objects.filter(ticket_info=self.vip).first()
+        payment = Payment.objects.create(reservation=vip_reservation, amount=self.vip.price)
+        charge_payment(payment.pk)
+        self.assertStatsConsistent()
+
+        Reservation.objects.filter(is_paid=False).update(expire_time=timezone.now())
+        self.assertEqual(Reservation.objects.release(), 4)
+        Reservation.objects.filter(ticket_info=self.normal, ticket__isnull=True).first().delete()
+        self.assertStatsConsistent()
+        self.assertEqual(get_stored_stats(EventStats, self.event.pk)['revenue'], Decimal('35.50'))
+
+
+    def test_summary_returns_revenue(self):
+        """ Test summary endpoints return revenue of paid reservations. """
+        reserve_ticket(self.vip).delete()
+        reservation = reserve_ticket(self.vip)
+        reservation.is_paid = True
+        reservation.save()
+        client = APIClient()
+        response = client.get(reverse('event-summary', args=[self.event.pk]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['revenue'], '25.50')
+        self.assertEqual(response.data['reservations']['paid'], 1)
+        response = client.get(reverse('ticketinfo-summary', args=[self.normal.pk]))
+        self.assertEqual(response.data['revenue'], '0.00')
+
+
+    def test_summary_without_stats(self):
+        """ Test summary of event without statistics is computed from reservations. """
+        reserve_tickets({self.normal: 2})
+        EventStats.objects.all().delete()
+        summaries = stats.get_event_summaries([self.event.pk])
+        self.assertEqual(summaries[self.event.pk]['reservations']['unpaid'], 2)
+
+
+    def test_rebuild_stats(self):
+        """ Test rebuild command fixes drifted statistics. """
+        reserve_tickets({self.normal: 2, self.vip: 1})
+        TicketInfoStats.objects.filter(pk=self.vip.pk).update(total=100)
+        EventStats.objects.all().delete()
+        call_command('rebuild_stats', '--dry-run', stdout=StringIO())
+        self.assertEqual(get_stored_stats(TicketInfoStats, self.vip.pk)['total'], 100)
+        call_command('rebuild_stats', stdout=StringIO())
+        self.assertStatsConsistent()
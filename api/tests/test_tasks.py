@@ -0,0 +1,159 @@
+from unittest import mock
+
+from django.conf import settings
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from api.tests.test_models import create_sample_event, create_sample_ticket_info
+from api.models import Reservation, SweeperCheckpoint
+from api.reservations import reserve_ticket
+from api.tasks import release_expired_reservations, release_reservation, cancel_reservation_release
+
+
+class ReleaseExpiredReservationsTests(TestCase):
+
+    def setUp(self):
+        self.event = create_sample_event()
+        self.ticket_info = create_sample_ticket_info(event=self.event, quantity=5)
+
+
+    def expire(self, reservation):
+        """ Moves reservation expire time to the past. """
+        reservation.expire_time = timezone.now() - timezone.timedelta(minutes=1)
+        reservation.save()
+
+
+    def test_release_expired_reservations(self):
+        """ Test releasing expired, unpaid reservations. """
+        expired = reserve_ticket(self.ticket_info)
+        self.expire(expired)
+        active = reserve_ticket(self.ticket_info)
+        release_expired_reservations()
+        expired.refresh_from_db()
+        active.refresh_from_db()
+        self.ticket_info.refresh_from_db()
+        self.assertFalse(expired.check_is_valid())
+        self.assertTrue(active.check_is_valid())
+        self.assertEqual(self.ticket_info.available, 4)
+
+
+    def test_release_skips_paid_reservations(self):
+        """ Test paid reservations are never released. """
+        paid = reserve_ticket(self.ticket_info)
+        paid.is_paid = True
+        self.expire(paid)
+        release_expired_reservations()
+        paid.refresh_from_db()
+        self.assertTrue(paid.check_is_valid())
+
+
+    def test_release_in_batches(self):
+        """ Test releasing reservations in bounded batches and reporting metrics. """
+        for _ in range(5):
+            self.expire(reserve_ticket(self.ticket_info))
+        metrics = release_expired_reservations(batch_size=2)
+        self.assertEqual(metrics['released'], 5)
+        self.assertEqual(metrics['batches'], 3)
+        self.assertFalse(Reservation.objects.filter(ticket__isnull=False).exists())
+
+
+    def test_release_limits_batches_per_run(self):
+        """ Test single run releases at most given number of batches. """
+        for _ in range(5):
+            self.expire(reserve_ticket(self.ticket_info))
+        metrics = release_expired_reservations(batch_size=2, max_batches=1)
+        self.assertEqual(metrics['released'], 2)
+        self.assertEqual(Reservation.objects.filter(ticket__isnull=False).count(), 3)
+
+
+    def test_release_persists_high_water_mark(self):
+        """ Test run starts from expire time reached by previous run. """
+        old = reserve_ticket(self.ticket_info)
+        self.expire(old)
+        release_expired_reservations()
+        checkpoint = SweeperCheckpoint.objects.get(name='release_expired_reservations')
+        self.assertEqual(checkpoint.position, Reservation.objects.get(pk=old.pk).expire_time)
+
+        older = reserve_ticket(self.ticket_info)
+        older.expire_time = checkpoint.position - timezone.timedelta(minutes=settings.RESERVATION_SWEEP_LOOKBACK + 1)
+        older.save()
+        self.assertEqual(release_expired_reservations()['released'], 0)
+        self.assertEqual(release_expired_reservations(full=True)['released'], 1)
+
+
+    def test_release_retries_reservations_behind_mark(self):
+        """ Test run releases reservations skipped by previous runs within lookback window. """
+        self.expire(reserve_ticket(self.ticket_info))
+        release_expired_reservations()
+        checkpoint = SweeperCheckpoint.objects.get(name='release_expired_reservations')
+        skipped = reserve_ticket(self.ticket_info)
+        skipped.expire_time = checkpoint.position - timezone.timedelta(minutes=settings.RESERVATION_SWEEP_LOOKBACK - 1)
+        skipped.save()
+        self.assertEqual(release_expired_reservations()['released'], 1)
+
+
+    def test_full_release_keeps_high_water_mark(self):
+        """ Test full run neither clears nor moves back the high-water mark. """
+        self.expire(reserve_ticket(self.ticket_info))
+        release_expired_reservations()
+        position = SweeperCheckpoint.objects.get(name='release_expired_reservations').position
+        release_expired_reservations(full=True)
+        self.assertEqual(SweeperCheckpoint.objects.get(name='release_expired_reservations').position, position)
+
+        older = reserve_ticket(self.ticket_info)
+        older.expire_time = position - timezone.timedelta(minutes=settings.RESERVATION_SWEEP_LOOKBACK + 1)
+        older.save()
+        release_expired_reservations(full=True)
+        self.assertEqual(SweeperCheckpoint.objects.get(name='release_expired_reservations').position, position)
+
+
+class ReleaseReservationTests(TestCase):
+
+    def setUp(self):
+        self.event = create_sample_event()
+        self.ticket_info = create_sample_ticket_info(event=self.event, quantity=2)
+        self.reservation = reserve_ticket(self.ticket_info)
+
+
+    def test_release_expired_reservation(self):
+        """ Test releasing single reservation at its expire time. """
+        self.reservation.expire_time = timezone.now()
+        self.reservation.save()
+        self.assertTrue(release_reservation(self.reservation.pk))
+        self.ticket_info.refresh_from_db()
+        self.assertEqual(self.ticket_info.available, 2)
+
+
+    def test_release_skips_not_expired_reservation(self):
+        """ Test reservation is not released before its expire time. """
+        self.assertFalse(release_reservation(self.reservation.pk))
+
+
+    def test_release_skips_paid_reservation(self):
+        """ Test paid reservation is not released. """
+        self.reservation.expire_time = timezone.now()
+        self.reservation.is_paid = True
+        self.reservation.save()
+        self.assertFalse(release_reservation(self.reservation.pk))
+
+
+    @override_settings(RESERVATION_EXPIRY_MODE='eta')
+    def test_cancel_reservation_release(self):
+        """ Test cancelling scheduled release of paid reservation. """
+        with mock.patch('api.tasks.release_reservation.AsyncResult') as async_result:
+            cancel_reservation_release(self.reservation)
+        async_result.assert_called_once_with(f"release-reservation-{self.reservation.pk}")
+        async_result.return_value.revoke.assert_called_once_with()
+
+
+class ScheduleReservationReleaseTests(TransactionTestCase):
+
+    @override_settings(RESERVATION_EXPIRY_MODE='eta')
+    def test_reserve_schedules_release(self):
+        """ Test committed reservation schedules its release at expire time. """
+        ticket_info = create_sample_ticket_info(event=create_sample_event())
+        with mock.patch('api.tasks.release_reservation.apply_async') as apply_async:
+            reservation = reserve_ticket(ticket_info)
+        apply_async.assert_called_once_with(
+            args=[reservation.pk], eta=reservation.expire_time, task_id=f"release-reservation-{reservation.pk}"
+        )
@@ -0,0 +1,102 @@
+import asyncio
+from unittest import mock
+
+from django.core.cache import cache
+from django.urls import reverse
+from django.test import TestCase, TransactionTestCase, AsyncClient, override_settings
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from api import metrics
+from api.tests.test_models import create_sample_event, create_sample_ticket_info
+from api.throttling import local_store, parse_rate
+
+
+@override_settings(THROTTLE_RATES={'reserve': {'burst': 2, 'sustained': '60/min'}})
+class TokenBucketThrottleTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        metrics.reset()
+        self.client = APIClient()
+        ticket_info = create_sample_ticket_info(event=create_sample_event())
+        self.url = reverse('ticketinfo-reserve', args=[ticket_info.id])
+        self.now = 1000.0
+        patcher = mock.patch('api.throttling.time.time', side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+    def test_parse_rate(self):
+        """ Test parsing rates to requests per second. """
+        self.assertEqual(parse_rate('60/min'), 1)
+        self.assertEqual(parse_rate('10/s'), 10)
+        self.assertEqual(parse_rate('7200/hour'), 2)
+
+
+    def test_burst_then_sustained_rate(self):
+        """ Test client may send burst of requests, then requests at sustained rate. """
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_201_CREATED)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(response['Retry-After'], '1')
+
+        self.now += 1
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn('api_throttled_requests_total{scope="reserve",store="shared"} 2', metrics.render())
+
+
+    def test_clients_have_separate_buckets(self):
+        """ Test requests of one client do not use up bucket of another. """
+        for _ in range(3):
+            self.client.get(self.url)
+        response = self.client.get(self.url, REMOTE_ADDR='10.0.0.2')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+
+    def test_forwarded_address_is_ignored(self):
+        """ Test client can't get new bucket by sending 'X-Forwarded-For' header,
+        as no proxy adds it. """
+        statuses = [self.client.get(self.url, HTTP_X_FORWARDED_FOR=f'10.0.0.{number}').status_code for number in range(3)]
+        self.assertEqual(statuses[2], status.HTTP_429_TOO_MANY_REQUESTS)
+
+
+    def test_fallback_to_local_store(self):
+        """ Test buckets are kept in process memory while cache is unavailable. """
+        local_store.values.clear()
+        with mock.patch('django.core.cache.backends.locmem.LocMemCache.get', side_effect=ConnectionError), \
+                self.assertLogs('api.throttling', 'WARNING'):
+            statuses = [self.client.get(self.url).status_code for _ in range(3)]
+        self.assertEqual(statuses[2], status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn('api_throttled_requests_total{scope="reserve",store="local"} 1', metrics.render())
+
+
+@override_settings(THROTTLE_RATES={'reserve': {'burst': 1, 'sustained': '1/min'}, 'pay': {'burst': 1, 'sustained': '1/min'}})
+class AsyncViewsThrottleTests(TransactionTestCase):
+    """ Async views run in thread pool with their own database connections,
+    so data must be committed to be visible there. """
+
+    def setUp(self):
+        cache.clear()
+        self.client = AsyncClient()
+        self.ticket_info = create_sample_ticket_info(event=create_sample_event())
+
+
+    async def test_async_reserve_is_throttled(self):
+        """ Test async variant of reserve endpoint shares throttle of sync one. """
+        url = reverse('async-ticketinfo-reserve', args=[self.ticket_info.id])
+        codes = [(await self.client.get(url)).status_code for _ in range(2)]
+        self.assertEqual(codes, [status.HTTP_201_CREATED, status.HTTP_429_TOO_MANY_REQUESTS])
+        response = await asyncio.get_event_loop().run_in_executor(
+            None, APIClient().get, reverse('ticketinfo-reserve', args=[self.ticket_info.id]))
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+
+    async def test_async_pay_is_throttled(self):
+        """ Test async variant of pay endpoint is throttled. """
+        url = reverse('async-reservation-pay', args=[1])
+        codes = [(await self.client.post(url)).status_code for _ in range(2)]
+        self.assertNotEqual(codes[0], status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(codes[1], status.HTTP_429_TOO_MANY_REQUESTS)
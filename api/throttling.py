@@ -0,0 +1,102 @@
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.throttling import BaseThrottle
+
+from api import metrics
+
+
+logger = logging.getLogger(__name__)
+
+BUCKET_KEY = 'throttle:{scope}:{ident}'
+
+DURATIONS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_rate(rate):
+    """ Function which returns number of requests per second of rate
+    given as '<requests>/<period>', e.g. '60/min'. """
+    requests, period = rate.split('/')
+    return int(requests) / DURATIONS[period[0]]
+
+
+class LocalStore:
+    """ In-process store of buckets, used when shared cache is unavailable. """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def get(self, key, default=None):
+        with self.lock:
+            value, expire_time = self.values.get(key, (default, None))
+            if expire_time is not None and expire_time < time.time():
+                del self.values[key]
+                return default
+            return value
+
+    def set(self, key, value, timeout):
+        with self.lock:
+            self.values[key] = (value, time.time() + timeout)
+
+
+local_store = LocalStore()
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """ Throttle holding bucket of 'burst' requests for every client of scope,
+    refilled at 'sustained' rate, as configured by THROTTLE_RATES. Clients are
+    told apart by authenticated user, otherwise by IP address. Bucket is kept
+    as its theoretical arrival time (GCRA), so every request costs one cache
+    read and write. Concurrent requests of the same client may slightly exceed
+    the limit, as cache offers no atomic update of the time. """
+    scope = None
+
+    def __init__(self):
+        config = settings.THROTTLE_RATES.get(self.scope)
+        self.burst = config['burst'] if config else None
+        self.interval = 1 / parse_rate(config['sustained']) if config else None
+        self.wait_time = None
+
+    def allow_request(self, request, view):
+        if not self.burst:
+            return True
+        if request.user and request.user.is_authenticated:
+            ident = f'user-{request.user.pk}'
+        else:
+            ident = self.get_ident(request)
+        key = BUCKET_KEY.format(scope=self.scope, ident=ident)
+
+        try:
+            store, store_name = caches[settings.THROTTLE_CACHE], 'shared'
+            arrival_time = store.get(key)
+        except Exception as error:
+            logger.warning("Throttle cache unavailable, falling back to in-process buckets: %r", error)
+            store, store_name = local_store, 'local'
+            arrival_time = store.get(key)
+
+        now = time.time()
+        arrival_time = max(arrival_time or now, now) + self.interval
+        # Bucket holds 'burst' requests, i.e. arrival time may run ahead of now by burst intervals.
+        self.wait_time = arrival_time - now - self.burst * self.interval
+        if self.wait_time > 0:
+            metrics.throttled_requests.increase((self.scope, store_name))
+            return False
+        try:
+            store.set(key, arrival_time, int(self.burst * self.interval) + 1)
+        except Exception as error:
+            logger.warning("Throttle cache unavailable, request is not counted: %r", error)
+        return True
+
+    def wait(self):
+        return self.wait_time
+
+
+class ReserveThrottle(TokenBucketThrottle):
+    scope = 'reserve'
+
+
+class PaymentThrottle(TokenBucketThrottle):
+    scope = 'pay'
@@ -2,14 +2,26 @@ from rest_framework.routers import DefaultRouter
 
 from django.urls import path, include
 
-from .views import EventViewSet, TicketInfoViewSet, ReservationViewSet
+from . import async_views
+from .views import EventViewSet, TicketInfoViewSet, ReservationViewSet, PaymentViewSet, metrics
 
 
 router = DefaultRouter()
 router.register(r'events', EventViewSet)
 router.register(r'tickets', TicketInfoViewSet)
 router.register(r'reservations', ReservationViewSet)
+router.register(r'payments', PaymentViewSet)
+
+async_urlpatterns = [
+    path('events/summary/', async_views.event_bulk_summary, name='async-event-summary-bulk'),
+    path('events/<pk>/summary/', async_views.event_summary, name='async-event-summary'),
+    path('tickets/<pk>/summary/', async_views.ticket_info_summary, name='async-ticketinfo-summary'),
+    path('tickets/<pk>/reserve/', async_views.ticket_info_reserve, name='async-ticketinfo-reserve'),
+    path('reservations/<pk>/pay/', async_views.reservation_pay, name='async-reservation-pay'),
+]
 
 urlpatterns = [
     path('', include(router.urls)),
-]
\ No newline at end of file
+    path('async/', include(async_urlpatterns)),
+    path('metrics/', metrics, name='metrics'),
+]
@@ -1,51 +1,120 @@
-from django.utils import timezone
-from django.db.models import Count, F
+from functools import wraps
+
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
+from django.urls import reverse
 from rest_framework import viewsets, status, mixins
 from rest_framework.response import Response
 from rest_framework.decorators import action
 from rest_framework.exceptions import NotFound 
 
-from api.models import Event, TicketInfo, Ticket, Reservation
-from api.serializers import EventSerializer, TicketInfoSerializer, ReservationSerializer, PaymentSerializer
-from api.payment_gateway import PaymentGateway
+from api import admission, cache as availability_cache, metrics as request_metrics
+from api.allocator import get_allocator, is_pending, AllocatorUnavailable
+from api.http_cache import ConditionalGetMixin
+from api.idempotency import idempotent
+from api.models import Event, TicketInfo, Reservation, Payment
+from api.serializers import EventSerializer, TicketInfoSerializer, ReservationSerializer, BulkReservationSerializer, PaymentSerializer, PaymentStatusSerializer
+from api.renderers import CSVRenderer, NDJSONRenderer
+from api.pagination import EventPagination, TicketInfoPagination, ReservationPagination
+from api.payments import pay_reservation, PaymentRejected, PaymentInProgress
+from api.stats import get_event_summaries, get_ticket_info_summaries
+from api.throttling import ReserveThrottle, PaymentThrottle
+from api.reservations import reserve_ticket, reserve_tickets, NoTicketsAvailable, ReservationConflict
+
+
+def check_admission(request, ticket_info_ids):
+    """ Function which uses up admission tokens passed in comma separated
+    'Admission-Token' header for reserving given ticket kinds. Returns
+    response rejecting the request, or None when it is admitted. """
+    tokens = [token.strip() for token in request.headers.get('Admission-Token', '').split(',') if token.strip()]
+    try:
+        request.admission_uses = admission.admit(tokens, ticket_info_ids)
+    except admission.NotAdmitted as error:
+        data = {"error": "Unable to create reservation", "message": "Not admitted yet", **error.status}
+        return Response(data=data, status=status.HTTP_429_TOO_MANY_REQUESTS, headers={'Retry-After': str(max(error.status["eta"], 1))})
+    except admission.InvalidToken:
+        data = {"error": "Unable to create reservation", "message": "Missing, invalid or used admission token"}
+        return Response(data=data, status=status.HTTP_403_FORBIDDEN)
+    return None
+
+
+def allocator_unavailable():
+    """ Function which returns response rejecting reservation, while inventory
+    is owned by allocator of other process. """
+    data = {"error": "Unable to create reservation", "message": "Reservations are served by other process"}
+    return Response(data=data, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+
+def accepted_reservation_data(request, reservation):
+    """ Function which serializes reservation handed out by allocator. One not
+    persisted yet gets token and URL of its status, as it may still fail. """
+    data = ReservationSerializer(reservation).data
+    if reservation.pk is None:
+        data['token'] = reservation.token
+        data['status'] = request.build_absolute_uri(reverse('reservation-pending', args=[reservation.token]))
+    return data
 
 
-class EventViewSet(viewsets.ModelViewSet):
+def restores_admission(view):
+    """ Decorator of reserving actions, which makes admission tokens used up by
+    check_admission usable again unless reservation succeeds, so client retrying
+    e.g. conflicting reservation keeps its place in queue. """
+    @wraps(view)
+    def wrapper(self, request, *args, **kwargs):
+        try:
+            response = view(self, request, *args, **kwargs)
+        except Exception:
+            admission.restore(getattr(request, 'admission_uses', None))
+            raise
+        if not status.is_success(response.status_code):
+            admission.restore(getattr(request, 'admission_uses', None))
+        return response
+    return wrapper
+
+
+class EventViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     """ Viewsets for manage events. """
     serializer_class = EventSerializer
-    queryset = Event.objects.all()  
+    pagination_class = EventPagination
+    queryset = Event.objects.prefetch_related('tickets_info')
+    cache_control = {'public': True, 'max_age': settings.EVENTS_CACHE_MAX_AGE}
 
   
     @action(detail=True)
     def summary(self, request, pk=None):
         """ Endpoint function which returns summary of reservations 
         for specific event. """
-        try:
-            event = Event.objects.get(pk=pk)
-        except Event.DoesNotExist:
+        summaries = get_event_summaries([pk])
+        if not summaries:
             return Response(status=status.HTTP_404_NOT_FOUND)
-        
-        total = event.get_total_reservations_count()
-        valid = event.get_valid_reservations_count()
-        invalid = event.get_invalid_reservations_count()
-        paid = event.get_paid_reservations_count()
-        unpaid = event.get_unpaid_valid_reservations_count()
+
+        return Response(summaries.popitem()[1])
+
+
+    @action(detail=False, url_path='summary', url_name='summary-bulk')
+    def bulk_summary(self, request):
+        """ Endpoint function which returns summaries of reservations
+        for many events, passed as comma separated 'ids' parameter. """
+        try:
+            ids = list(dict.fromkeys(int(id_) for id_ in request.query_params.get('ids', '').split(',') if id_))
+        except ValueError:
+            data = {"error": "Unable to create summary", "message": "Parameter 'ids' must be a list of integers"}
+            return Response(data=data, status=status.HTTP_400_BAD_REQUEST)
+
+        summaries = get_event_summaries(ids)
         data = {
-            "reservations": {
-                "total": total,
-                "valid": valid,
-                "invalid": invalid,
-                "paid": paid,
-                "unpaid": unpaid
-            }   
+            "events": [{"id": id_, **summaries[id_]} for id_ in ids if id_ in summaries]
         }
         return Response(data)
 
 
-class TicketInfoViewSet(viewsets.ModelViewSet):
+class TicketInfoViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     """ Viewsets for manage tickets. """
     serializer_class = TicketInfoSerializer
+    pagination_class = TicketInfoPagination
     queryset = TicketInfo.objects.all()
+    # Numbers of tickets left change with every reservation, so caches revalidate them.
+    cache_control = {'public': True, 'no_cache': True}
 
 
     def get_queryset(self):
@@ -57,67 +126,138 @@ class TicketInfoViewSet(viewsets.ModelViewSet):
             except Event.DoesNotExist:
                 raise NotFound()
             
-            return TicketInfo.objects.filter(event=event)
+            return TicketInfo.objects.filter(event=event).select_related('event')
 
-        return TicketInfo.objects.all()
+        return TicketInfo.objects.select_related('event')
 
 
     @action(detail=True)
     def summary(self, request, pk=None):
         """ Endpoint function which returns reservations 
         statistics for specific ticket kind. """
-        try:
-            ticket_info = TicketInfo.objects.get(pk=pk)
-        except TicketInfo.DoesNotExist:
+        summaries = get_ticket_info_summaries([pk])
+        if not summaries:
             return Response(status=status.HTTP_404_NOT_FOUND)
-        
-        total = ticket_info.get_total_reservations_count()
-        valid = ticket_info.get_valid_reservations_count()
-        invalid = ticket_info.get_invalid_reservations_count()
-        paid = ticket_info.get_paid_reservations_count()
-        unpaid = ticket_info.get_unpaid_valid_reservations_count()
-        data = {
-            "reservations": {
-                "total": total,
-                "valid": valid,
-                "invalid": invalid,
-                "paid": paid,
-                "unpaid": unpaid
-            }   
-        }
-        return Response(data)
+
+        return Response(summaries.popitem()[1])
 
 
     @action(detail=False)
     def available(self, request):
         """ Endpoint function which returns list of only available tickets. """
-        tickets = TicketInfo.objects.annotate(reserved_tickets=Count('tickets__reservation')).filter(reserved_tickets__lt=F('quantity')).order_by('event', 'kind')
-        serializer = self.get_serializer(tickets, many=True)
-        return Response(serializer.data)
+        def render():
+            tickets = self.paginate_queryset(TicketInfo.objects.filter(available__gt=0).select_related('event'))
+            serializer = self.get_serializer(tickets, many=True)
+            return self.get_paginated_response(serializer.data).data
+
+        return Response(availability_cache.get_available_list(request.build_absolute_uri(), render))
 
 
     @action(detail=True)
+    def left(self, request, pk=None):
+        """ Endpoint function which returns number of tickets left of specific kind. """
+        try:
+            left = availability_cache.get_left(pk)
+        except (TicketInfo.DoesNotExist, ValueError):
+            return Response(status=status.HTTP_404_NOT_FOUND)
+
+        return Response({"left": left})
+
+
+    @action(detail=False, url_path='cache-stats')
+    def cache_stats(self, request):
+        """ Endpoint function which returns availability cache hits and misses. """
+        return Response(availability_cache.get_stats())
+
+
+    @action(detail=True, methods=['GET', 'POST'])
+    def queue(self, request, pk=None):
+        """ Endpoint function which queues client for reservation of ticket kind
+        and returns its admission token (POST), or returns queue position and
+        estimated seconds of waiting of token passed as 'token' parameter (GET). """
+        if request.method == 'POST':
+            try:
+                left = availability_cache.get_left(pk)
+            except (TicketInfo.DoesNotExist, ValueError):
+                return Response(status=status.HTTP_404_NOT_FOUND)
+            if not left:
+                data = {"error": "Unable to join queue", "message": "No available tickets"}
+                return Response(data=data, status=status.HTTP_400_BAD_REQUEST)
+
+            token, queue_status = admission.join(pk)
+            return Response({"token": token, **queue_status}, status=status.HTTP_201_CREATED)
+
+        try:
+            ticket_info_pk, position = admission.read_token(request.query_params.get('token', ''))
+        except admission.InvalidToken:
+            ticket_info_pk = None
+        if str(ticket_info_pk) != pk:
+            data = {"error": "Unable to check queue", "message": "Invalid admission token"}
+            return Response(data=data, status=status.HTTP_400_BAD_REQUEST)
+        return Response(admission.get_status(ticket_info_pk, position))
+
+
+    @action(detail=True, throttle_classes=[ReserveThrottle])
+    @idempotent
+    @restores_admission
     def reserve(self, request, pk=None):
         """ Endpoint function which handles ticket reservation. """
+        if settings.ADMISSION_ENABLED:
+            try:
+                rejection = check_admission(request, [int(pk)])
+            except ValueError:
+                return Response(status=status.HTTP_404_NOT_FOUND)
+            if rejection:
+                return rejection
+
+        if settings.RESERVATION_ALLOCATOR:
+            return self.reserve_from_allocator(pk)
+
         try:
             ticket_info = TicketInfo.objects.get(pk=pk)
         except TicketInfo.DoesNotExist:
             return Response(status=status.HTTP_404_NOT_FOUND)
 
-        ticket = Ticket.objects.filter(ticket_info=ticket_info, reservation__isnull=True).first()
-        if ticket:
-            reservation = Reservation(ticket=ticket, ticket_info=ticket_info, create_time=timezone.now(), expire_time=timezone.now()+timezone.timedelta(minutes=15))
-            reservation.save()
-            serializer = ReservationSerializer(reservation)
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
-        else:
+        try:
+            reservation = reserve_ticket(ticket_info)
+        except NoTicketsAvailable:
             data = {"error": "Unable to create reservation", "message": "No available tickets"}
             return Response(data=data, status=status.HTTP_400_BAD_REQUEST)
+        except ReservationConflict:
+            data = {"error": "Unable to create reservation", "message": "Too many concurrent reservations, try again"}
+            return Response(data=data, status=status.HTTP_409_CONFLICT)
+
+        serializer = ReservationSerializer(reservation)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+
+    def reserve_from_allocator(self, pk):
+        """ Function which reserves ticket from in-memory pool of allocator.
+        Reservation is persisted shortly after, so request is only accepted. """
+        try:
+            reservation = get_allocator().reserve(int(pk))
+        except (TicketInfo.DoesNotExist, ValueError):
+            return Response(status=status.HTTP_404_NOT_FOUND)
+        except AllocatorUnavailable:
+            return allocator_unavailable()
+        except NoTicketsAvailable:
+            data = {"error": "Unable to create reservation", "message": "No available tickets"}
+            return Response(data=data, status=status.HTTP_400_BAD_REQUEST)
+        except ReservationConflict:
+            data = {"error": "Unable to create reservation", "message": "Too many concurrent reservations, try again"}
+            return Response(data=data, status=status.HTTP_409_CONFLICT)
+
+        data = accepted_reservation_data(self.request, reservation)
+        # Counter inventory is reserved in database at once.
+        if reservation.pk is None:
+            return Response(data, status=status.HTTP_202_ACCEPTED, headers={'Location': data['status']})
+        return Response(data, status=status.HTTP_201_CREATED)
 
 
 class ReservationViewSet(viewsets.GenericViewSet, mixins.ListModelMixin, mixins.RetrieveModelMixin):
     """ List and retrive viewsets for reservations. """
     serializer_class = ReservationSerializer
+    pagination_class = ReservationPagination
     queryset = Reservation.objects.all()
 
 
@@ -131,17 +271,129 @@ class ReservationViewSet(viewsets.GenericViewSet, mixins.ListModelMixin, mixins.
             except TicketInfo.DoesNotExist:
                 raise NotFound()
             
-            return Reservation.objects.filter(ticket_info=ticket_info)
+            return Reservation.objects.filter(ticket_info=ticket_info).select_related('ticket_info__event')
+
+        return Reservation.objects.select_related('ticket_info__event')
+
+
+    @action(detail=False, renderer_classes=[CSVRenderer, NDJSONRenderer])
+    def export(self, request):
+        """ Endpoint function which streams reservations as CSV or NDJSON,
+        chosen by 'format' parameter, optionally only for given 'event'. """
+        reservations = self.get_queryset()
+        event_pk = request.query_params.get('event')
+
+        if event_pk:
+            try:
+                event = Event.objects.get(pk=int(event_pk))
+            except (Event.DoesNotExist, ValueError):
+                raise NotFound()
+
+            reservations = reservations.filter(ticket_info__event=event)
+
+        columns = ('id', 'event', 'kind', 'price', 'create_time', 'expire_time', 'is_paid', 'is_valid')
+        rows = reservations.order_by('create_time', 'pk').values_list(
+            'pk', 'ticket_info__event__name', 'ticket_info__kind', 'ticket_info__price',
+            'create_time', 'expire_time', 'is_paid', 'ticket_id'
+        ).iterator(chunk_size=settings.RESERVATION_EXPORT_CHUNK_SIZE)
+
+        def export_rows():
+            for pk, event, kind, price, create_time, expire_time, is_paid, ticket_id in rows:
+                yield (
+                    pk, event, kind, str(price), create_time.isoformat(),
+                    expire_time.isoformat() if expire_time else None, is_paid, ticket_id is not None
+                )
 
-        return Reservation.objects.all()
+        renderer = request.accepted_renderer
+        response = StreamingHttpResponse(renderer.stream(columns, export_rows()), content_type=renderer.media_type)
+        response['Content-Disposition'] = f'attachment; filename="reservations.{renderer.format}"'
+        return response
 
 
-    @action(detail=True, methods=['POST'])
+    @action(detail=False, methods=['POST'], throttle_classes=[ReserveThrottle])
+    @idempotent
+    @restores_admission
+    def bulk(self, request):
+        """ Endpoint function which handles reservation of many tickets,
+        possibly of different kinds, at once. """
+        serializer = BulkReservationSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        quantities = serializer.validated_data['tickets']
+        if settings.ADMISSION_ENABLED:
+            rejection = check_admission(request, list(quantities))
+            if rejection:
+                return rejection
+
+        if settings.RESERVATION_ALLOCATOR:
+            return self.bulk_from_allocator(quantities)
+
+        tickets_info = TicketInfo.objects.in_bulk(quantities)
+        if len(tickets_info) < len(quantities):
+            data = {"error": "Unable to create reservation", "message": "Ticket does not exist"}
+            return Response(data=data, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            reservations = reserve_tickets({tickets_info[pk]: quantity for pk, quantity in quantities.items()})
+        except NoTicketsAvailable:
+            data = {"error": "Unable to create reservation", "message": "Not enough available tickets"}
+            return Response(data=data, status=status.HTTP_400_BAD_REQUEST)
+        except ReservationConflict:
+            data = {"error": "Unable to create reservation", "message": "Too many concurrent reservations, try again"}
+            return Response(data=data, status=status.HTTP_409_CONFLICT)
+
+        serializer = ReservationSerializer(reservations, many=True)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+
+    def bulk_from_allocator(self, quantities):
+        """ Function which reserves tickets of many kinds from in-memory pools
+        of allocator. Reservations are persisted shortly after, so request is
+        only accepted, unless all of them are of counter inventory. """
+        try:
+            reservations = get_allocator().reserve_many(quantities)
+        except TicketInfo.DoesNotExist:
+            data = {"error": "Unable to create reservation", "message": "Ticket does not exist"}
+            return Response(data=data, status=status.HTTP_400_BAD_REQUEST)
+        except AllocatorUnavailable:
+            return allocator_unavailable()
+        except NoTicketsAvailable:
+            data = {"error": "Unable to create reservation", "message": "Not enough available tickets"}
+            return Response(data=data, status=status.HTTP_400_BAD_REQUEST)
+        except ReservationConflict:
+            data = {"error": "Unable to create reservation", "message": "Too many concurrent reservations, try again"}
+            return Response(data=data, status=status.HTTP_409_CONFLICT)
+
+        data = [accepted_reservation_data(self.request, reservation) for reservation in reservations]
+        is_persisted = all(reservation.pk is not None for reservation in reservations)
+        return Response(data, status=status.HTTP_201_CREATED if is_persisted else status.HTTP_202_ACCEPTED)
+
+
+    @action(detail=False, url_path=r'pending/(?P<token>[^/]+)')
+    def pending(self, request, token=None):
+        """ Endpoint function which tells outcome of reservation accepted by allocator,
+        by its token. Reservation whose ticket was taken meanwhile is persisted
+        released, so it is not valid. """
+        reservation = Reservation.objects.filter(token=token).select_related('ticket_info__event').first()
+        if reservation is None:
+            if is_pending(token):
+                return Response(data={"message": "PENDING"}, status=status.HTTP_202_ACCEPTED, headers={'Retry-After': '1'})
+            raise NotFound()
+
+        data = ReservationSerializer(reservation).data
+        data['reservation'] = request.build_absolute_uri(reverse('reservation-detail', args=[reservation.pk]))
+        return Response(data=data, status=status.HTTP_200_OK)
+
+
+    @action(detail=True, methods=['POST'], throttle_classes=[PaymentThrottle])
+    @idempotent
     def pay(self, request, pk=None):
         """ Endpoint function which handles payment for reservation 
-        and updates object status in database. """
+        and updates object status in database. In 'queue' payment mode
+        responds at once with URL of payment status. """
         try:
-            reservation = Reservation.objects.get(pk=pk)
+            reservation = Reservation.objects.select_related('ticket_info').get(pk=pk)
         except Reservation.DoesNotExist:
             return Response(status=status.HTTP_404_NOT_FOUND)
 
@@ -149,26 +401,52 @@ class ReservationViewSet(viewsets.GenericViewSet, mixins.ListModelMixin, mixins.
             data = {"error": "Unable to pay reservation", "message": "Reservation is already paid"}
             return Response(data=data, status=status.HTTP_400_BAD_REQUEST)
 
-        elif reservation.ticket:
-            serializer = PaymentSerializer(data=request.data)
-
-            if serializer.is_valid():
-                amount = serializer.data.get('amount')
-                currency = serializer.data.get('currency')
-                token = serializer.data.get('token')
-                payment = PaymentGateway()
-                result = payment.charge(amount, token, currency)
+        elif not reservation.check_is_valid():
+            data = {"error": "Unable to pay reservation", "message": "Reservation is not longer valid"}
+            return Response(data=data, status=status.HTTP_400_BAD_REQUEST)
 
-                if result.amount == reservation.ticket.ticket_info.price:    
-                    reservation.is_paid=True
-                    reservation.save()
-                    return Response(data={"message": "SUCCESS"}, status=status.HTTP_200_OK)
+        serializer = PaymentSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-                data = {"error": "Unable to pay reservation", "message": "Amount must be equal ticket price"}
-                return Response(data=data, status=status.HTTP_400_BAD_REQUEST)
+        amount = serializer.validated_data.get('amount')
+        if amount != reservation.ticket_info.price:
+            data = {"error": "Unable to pay reservation", "message": "Amount must be equal ticket price"}
+            return Response(data=data, status=status.HTTP_400_BAD_REQUEST)
 
-            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-           
-        else:
-            data = {"error": "Unable to pay reservation", "message": "Reservation is not longer valid"}
+        try:
+            payment = pay_reservation(
+                reservation, amount, serializer.validated_data.get('currency'), serializer.validated_data.get('token')
+            )
+        except PaymentInProgress as error:
+            data = {"error": "Unable to pay reservation", "message": str(error)}
+            return Response(data=data, status=status.HTTP_409_CONFLICT)
+        except PaymentRejected as error:
+            data = {"error": "Unable to pay reservation", "message": str(error)}
             return Response(data=data, status=status.HTTP_400_BAD_REQUEST)
+
+        if payment.status == Payment.Status.PENDING:
+            url = request.build_absolute_uri(reverse('payment-detail', args=[payment.pk]))
+            return Response(data={"message": "PENDING", "payment": url}, status=status.HTTP_202_ACCEPTED, headers={'Location': url})
+        elif payment.status == Payment.Status.SUCCEEDED:
+            return Response(data={"message": "SUCCESS"}, status=status.HTTP_200_OK)
+
+        data = {"error": "Unable to pay reservation", "message": payment.error}
+        return Response(data=data, status=status.HTTP_400_BAD_REQUEST)
+
+
+class PaymentViewSet(viewsets.GenericViewSet, mixins.RetrieveModelMixin):
+    """ Retrive viewset for payments status. """
+    serializer_class = PaymentStatusSerializer
+    queryset = Payment.objects.all()
+
+
+def metrics(request):
+    """ View function which returns request metrics and availability
+    cache statistics in Prometheus text format. """
+    cache_stats = availability_cache.get_stats()
+    data = request_metrics.render([
+        ('api_availability_cache_hits_total', 'Availability cache hits.', cache_stats['hits']),
+        ('api_availability_cache_misses_total', 'Availability cache misses.', cache_stats['misses']),
+    ])
+    return HttpResponse(data, content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -13,4 +13,19 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'project.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported once Django is set up, as it uses models.
+from api.sse import availability_stream  # noqa: E402
+
+# Server-sent events streams are held open for long, so they are served apart
+# from Django's request handling, which would run every stream in a thread.
+STREAM_ROUTES = {
+    '/api/stream/availability/': availability_stream,
+}
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'http' and scope['path'] in STREAM_ROUTES:
+        return await STREAM_ROUTES[scope['path']](scope, receive, send)
+    return await django_application(scope, receive, send)
@@ -15,6 +15,19 @@ app.conf.beat_schedule = {
     'every-15-seconds': {
         'task': 'api.tasks.release_expired_reservations',
         'schedule': 15
+    },
+    'every-hour': {
+        'task': 'api.tasks.release_expired_reservations',
+        'schedule': 3600,
+        'kwargs': {'full': True}
+    },
+    'every-hour-idempotency-keys': {
+        'task': 'api.tasks.delete_expired_idempotency_keys',
+        'schedule': 3600
+    },
+    'every-hour-admission-token-uses': {
+        'task': 'api.tasks.delete_expired_admission_token_uses',
+        'schedule': 3600
     }
 }
 
@@ -44,6 +44,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -84,6 +85,19 @@ DATABASES = {
     }
 }
 
+# Pragmas executed on every new SQLite connection, e.g. {'journal_mode': 'WAL'}.
+SQLITE_PRAGMAS = {}
+
+
+# Cache
+# https://docs.djangoproject.com/en/3.1/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.1/ref/settings/#auth-password-validators
@@ -123,5 +137,162 @@ USE_TZ = True
 
 STATIC_URL = '/static/'
 
+REST_FRAMEWORK = {
+    'DEFAULT_PAGINATION_CLASS': 'api.pagination.KeysetPagination',
+    'PAGE_SIZE': 50,
+    # Number of proxies in front of the application. Clients are told apart by
+    # address added to 'X-Forwarded-For' header by the last of them, with no
+    # proxies by connection address, as the header is set by clients at will.
+    'NUM_PROXIES': 0,
+}
+
 CELERY_RESULT_BACKEND = 'django-db'
-CELERY_CHACHE_BACKEND = 'django-cache'
\ No newline at end of file
+CELERY_CHACHE_BACKEND = 'django-cache'
+
+# Throttling
+
+# Token bucket throttles of endpoints by scope, e.g. {'reserve': {'burst': 10,
+# 'sustained': '60/min'}}. Every client may send 'burst' requests at once,
+# then requests at 'sustained' rate. Buckets are kept in THROTTLE_CACHE,
+# or in process memory while it is unavailable.
+THROTTLE_RATES = {}
+
+THROTTLE_CACHE = 'default'
+
+# Request metrics
+
+# Opt-in recording of wall time, queries and rendering time of requests by
+# view, exposed at /api/metrics/. Metrics are kept by every process on its own.
+REQUEST_METRICS_ENABLED = False
+
+# Requests taking at least that many milliseconds are logged.
+REQUEST_METRICS_SLOW_MS = 500
+
+# Reservations
+
+RESERVATION_EXPIRE_MINUTES = 15
+
+RESERVATION_CLAIM_RETRIES = 5
+
+# 'poll' releases expired reservations only by periodic task, 'eta' schedules
+# release of every reservation at its expire time, keeping the periodic task
+# as a safety net.
+RESERVATION_EXPIRY_MODE = 'poll'
+
+RESERVATION_BULK_LIMIT = 50
+
+RESERVATION_EXPORT_CHUNK_SIZE = 2000
+
+RESERVATION_SWEEP_BATCH_SIZE = 500
+
+RESERVATION_SWEEP_MAX_BATCHES = 20
+
+# Minutes before high-water mark of previous run the periodic release starts
+# from, retrying reservations it skipped, e.g. locked by other transaction.
+# Has to exceed PAYMENT_PENDING_TIMEOUT, so reservations held back by lost
+# payments are released by the run marking them failed.
+RESERVATION_SWEEP_LOOKBACK = 15
+
+# Idempotency keys
+
+# Hours for which responses of requests sent with 'Idempotency-Key' header
+# are replayed to their retries.
+IDEMPOTENCY_KEY_TTL_HOURS = 24
+
+# Seconds after which request still processed under 'Idempotency-Key' is
+# considered abandoned, e.g. by crashed worker, and its retry runs again.
+IDEMPOTENCY_LOCK_TIMEOUT = 60
+
+# Reservation allocator
+
+# When enabled, reservations are handed out from in-memory free tickets pools
+# of the process and persisted in batches every ALLOCATOR_FLUSH_INTERVAL
+# seconds, or once ALLOCATOR_FLUSH_SIZE of them wait. Allocator must own
+# inventory, so it holds lease of every ticket kind it reserves, renewed every
+# third of ALLOCATOR_LEASE_TTL seconds, and other processes reject reservations
+# of the kind with 503.
+RESERVATION_ALLOCATOR = False
+
+ALLOCATOR_FLUSH_INTERVAL = 0.05
+
+ALLOCATOR_FLUSH_SIZE = 500
+
+# Number of free tickets loaded into pool at once.
+ALLOCATOR_REFILL_SIZE = 10000
+
+ALLOCATOR_LEASE_TTL = 10
+
+# Tickets provisioning
+
+# Tickets of ticket kind are created and deleted in batches of TICKETS_BATCH_SIZE,
+# each in its own transaction. 'inline' provisions them within request, 'queue'
+# enqueues Celery task and responds at once with 'provisioning' status.
+TICKETS_PROVISIONING_MODE = 'inline'
+
+TICKETS_BATCH_SIZE = 1000
+
+# Caching
+
+# Cache alias and seconds for which available tickets listings and numbers
+# of tickets left are cached. Local memory cache is not invalidated by other
+# processes, so use shared backend when running many of them.
+AVAILABILITY_CACHE = 'default'
+
+AVAILABILITY_CACHE_TTL = 60
+
+# Seconds for which clients and shared caches may reuse events listings
+# and details without revalidating them.
+EVENTS_CACHE_MAX_AGE = 60
+
+# Admission queue
+
+# When enabled, clients join queue of ticket kind and reserve only once
+# admitted, ADMISSION_RATE of them per second, with single use token valid
+# for ADMISSION_TOKEN_TTL seconds since joining. Queues are kept in database,
+# so they survive restarts and are shared by all processes.
+ADMISSION_ENABLED = False
+
+ADMISSION_RATE = 50
+
+ADMISSION_TOKEN_TTL = 3600
+
+# Async views
+
+# Number of threads running async variants of views, bounding database
+# connections they use.
+ASYNC_VIEWS_THREADS = 8
+
+# Availability stream
+
+# Ticket kinds modified within last SSE_POLL_OVERLAP seconds are polled every
+# SSE_POLL_INTERVAL seconds, changes are sent to every stream at most once in
+# SSE_DEBOUNCE seconds and idle streams get heartbeat comment every
+# SSE_HEARTBEAT seconds.
+SSE_POLL_INTERVAL = 0.5
+SSE_POLL_OVERLAP = 2
+SSE_DEBOUNCE = 1.0
+SSE_HEARTBEAT = 15
+
+# Payments
+
+# 'inline' charges payment within request, 'queue' enqueues the charge
+# as Celery task and responds at once with status URL of the payment.
+PAYMENT_MODE = 'inline'
+
+# Minutes after which pending payment, e.g. one whose task was lost, is marked
+# failed, releasing reservation it held back. Has to exceed time of retried charge.
+PAYMENT_PENDING_TIMEOUT = 10
+
+# Payment gateway client is shared by process and reuses at most
+# PAYMENT_GATEWAY_POOL_SIZE connections. Failed charges are retried
+# PAYMENT_GATEWAY_RETRIES times, waiting exponentially growing backoff.
+PAYMENT_GATEWAY_POOL_SIZE = 10
+
+PAYMENT_GATEWAY_TIMEOUT = 5
+
+PAYMENT_GATEWAY_RETRIES = 3
+
+PAYMENT_GATEWAY_BACKOFF = 0.1
+
+# Seconds every charge of fake payment gateway takes.
+PAYMENT_GATEWAY_LATENCY = 0
@@ -0,0 +1,109 @@
+"""
+Production settings of the project, selected with
+DJANGO_SETTINGS_MODULE=project.settings_production.
+
+Secrets and hosts are read from environment. Database is SQLite tuned for
+concurrent writers, unless DATABASE_ENGINE=postgresql selects PostgreSQL.
+Cache shared by all processes is kept in database, unless CACHE_BACKEND=memcached
+selects Memcached.
+"""
+
+import os
+
+from project.settings import *  # noqa
+
+
+SECRET_KEY = os.environ['DJANGO_SECRET_KEY']
+
+DEBUG = False
+
+ALLOWED_HOSTS = os.environ.get('DJANGO_ALLOWED_HOSTS', '').split(',')
+
+
+# Database
+# Connections are kept open for CONN_MAX_AGE seconds and reused by following
+# requests of the same thread, instead of reconnecting on every request.
+
+CONN_MAX_AGE = int(os.environ.get('DATABASE_CONN_MAX_AGE', 60))
+
+if os.environ.get('DATABASE_ENGINE') == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('DATABASE_NAME', 'tickets'),
+            'USER': os.environ.get('DATABASE_USER', 'tickets'),
+            'PASSWORD': os.environ.get('DATABASE_PASSWORD', ''),
+            'HOST': os.environ.get('DATABASE_HOST', 'localhost'),
+            'PORT': os.environ.get('DATABASE_PORT', '5432'),
+            'CONN_MAX_AGE': CONN_MAX_AGE,
+            'OPTIONS': {
+                'connect_timeout': 5,
+            },
+        }
+    }
+    # Behind PgBouncer in transaction pooling mode, which pools connections of all
+    # processes, persistent connections and server side cursors must be disabled.
+    if os.environ.get('DATABASE_POOLER') == 'pgbouncer':
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['DISABLE_SERVER_SIDE_CURSORS'] = True
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('DATABASE_NAME', BASE_DIR / 'db.sqlite3'),
+            'CONN_MAX_AGE': CONN_MAX_AGE,
+            'OPTIONS': {
+                # Seconds writer waits for database lock before failing.
+                'timeout': 20,
+            },
+        }
+    }
+
+# Write-ahead log lets readers run alongside single writer, which commits
+# without syncing every transaction, and busy writers wait for the lock.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 20000,
+}
+
+
+# Cache
+# Throttle buckets and cached availability have to be shared
+# by all processes. Database cache needs its table created with
+# 'python manage.py createcachetable'. Set CACHE_BACKEND=memcached and
+# CACHE_LOCATION to comma separated servers to use Memcached instead
+# (requires 'pip install python-memcached').
+
+if os.environ.get('CACHE_BACKEND') == 'memcached':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.memcached.MemcachedCache',
+            'LOCATION': os.environ.get('CACHE_LOCATION', '127.0.0.1:11211').split(','),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'api_cache',
+            'OPTIONS': {
+                'MAX_ENTRIES': int(os.environ.get('CACHE_MAX_ENTRIES', 100000)),
+            },
+        }
+    }
+
+THROTTLE_CACHE = AVAILABILITY_CACHE = 'default'
+
+
+# Throttling
+
+# Limit requests of every client, told apart by IP address, to reserve and pay.
+# Set DJANGO_NUM_PROXIES to number of proxies, e.g. load balancer, adding client
+# address to 'X-Forwarded-For' header.
+REST_FRAMEWORK = {**REST_FRAMEWORK, 'NUM_PROXIES': int(os.environ.get('DJANGO_NUM_PROXIES', 0))}
+
+THROTTLE_RATES = {
+    'reserve': {'burst': 10, 'sustained': '60/min'},
+    'pay': {'burst': 5, 'sustained': '20/min'},
+}